@@ -107,6 +107,21 @@ DATABASES = {
     }
 }
 
+# Cache
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+# dipakai untuk version stamp data referensi; gunakan cache bersama (redis/memcached)
+# jika aplikasi berjalan dengan lebih dari satu proses
+
+CACHES = {
+    'default': env.cache('CACHE_URL', default='locmemcache://'),
+}
+
+# interval (detik) pengecekan version stamp data referensi di setiap worker
+REFERENCE_DATA_CHECK_INTERVAL = env.float('REFERENCE_DATA_CHECK_INTERVAL', default=5)
+# masa simpan (detik) response API produk di cache; data lama otomatis tidak terpakai
+# begitu version katalog berubah
+RESPONSE_CACHE_TIMEOUT = env.int('RESPONSE_CACHE_TIMEOUT', default=300)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
@@ -174,6 +189,14 @@ SIMPLE_JWT = {
 RAJAONGKIR_API_URL = env.str('RAJAONGKIR_API_URL')
 RAJAONGKIR_API_KEY = env.str('RAJAONGKIR_API_KEY')
 RAJAONGKIR_ACCOUNT_PLAN = env.str('RAJAONGKIR_ACCOUNT_PLAN')
+# cache ongkir di memori proses (detik); setelah TTL habis, hasil lama masih
+# dipakai selama STALE_TTL sambil di-refresh di background
+SHIPPING_COST_CACHE_TTL = env.int('SHIPPING_COST_CACHE_TTL', default=600)
+SHIPPING_COST_CACHE_STALE_TTL = env.int('SHIPPING_COST_CACHE_STALE_TTL', default=3600)
+SHIPPING_COST_CACHE_MAX_ENTRIES = env.int('SHIPPING_COST_CACHE_MAX_ENTRIES', default=2048)
+# batas waktu (detik) untuk request ongkir, termasuk mode semua kurir sekaligus
+SHIPPING_COST_DEADLINE = env.float('SHIPPING_COST_DEADLINE', default=5)
+SHIPPING_COST_WORKERS = env.int('SHIPPING_COST_WORKERS', default=12)
 
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 EMAIL_USE_TLS = env.bool('EMAIL_USE_TLS')
@@ -184,10 +207,35 @@ EMAIL_PORT = env.int('EMAIL_PORT')
 
 ADMIN_EMAIL = env.str('ADMIN_EMAIL')
 
+EMAIL_OUTBOX_MAX_ATTEMPTS = env.int('EMAIL_OUTBOX_MAX_ATTEMPTS', default=8)
+EMAIL_OUTBOX_RETRY_DELAY = env.int('EMAIL_OUTBOX_RETRY_DELAY', default=60)
+
 MIDTRANS_API_URL = env.str('MIDTRANS_API_URL')
 MIDTRANS_SERVER_KEY = env.str('MIDTRANS_SERVER_KEY')
 MIDTRANS_CLIENT_KEY = env.str('MIDTRANS_CLIENT_KEY')
 MIDTRANS_IS_PRODUCTION = env.bool('MIDTRANS_IS_PRODUCTION')
+# opsional, mengganti base URL Snap API (misalnya fake server lokal untuk testing)
+MIDTRANS_SNAP_BASE_URL = env.str('MIDTRANS_SNAP_BASE_URL', default='')
+
+# jumlah thread untuk pekerjaan background di dalam proses web
+BACKGROUND_WORKERS = env.int('BACKGROUND_WORKERS', default=4)
+
+PAYMENT_TOKEN_MAX_ATTEMPTS = env.int('PAYMENT_TOKEN_MAX_ATTEMPTS', default=5)
+PAYMENT_TOKEN_RETRY_DELAY = env.int('PAYMENT_TOKEN_RETRY_DELAY', default=30)
+
+# lama (detik) stok produk ditahan untuk sebuah baris cart
+STOCK_HOLD_TTL = env.int('STOCK_HOLD_TTL', default=15 * 60)
+
+# batas ukuran (byte) upload bukti pembayaran mode multipart
+PAYMENT_PROOF_MAX_UPLOAD_SIZE = env.int('PAYMENT_PROOF_MAX_UPLOAD_SIZE', default=10 * 1024 * 1024)
+# bukti pembayaran yang lebih besar dari ukuran ini (pixel) diperkecil sebelum disimpan, 0 untuk menonaktifkan
+PAYMENT_PROOF_MAX_DIMENSION = env.int('PAYMENT_PROOF_MAX_DIMENSION', default=2048)
+# batas jumlah pixel bukti pembayaran selain JPEG (di-decode penuh saat diperkecil), 4096x4096 ~ 64 MB RGBA
+PAYMENT_PROOF_MAX_PIXELS = env.int('PAYMENT_PROOF_MAX_PIXELS', default=4096 * 4096)
+
+# di atas jumlah baris ini changelist admin memakai estimasi dari statistik tabel
+# (MySQL/PostgreSQL) untuk jumlah data, bukan COUNT(*)
+ADMIN_ESTIMATED_COUNT_THRESHOLD = env.int('ADMIN_ESTIMATED_COUNT_THRESHOLD', default=100000)
 
 CORS_ALLOW_ALL_ORIGINS = env.bool('CORS_ALLOW_ALL_ORIGINS')
 CORS_ALLOWED_ORIGINS = env.list('CORS_ALLOWED_ORIGINS')
@@ -1,13 +1,65 @@
-from django.contrib import admin
+import re
+
+from django.conf import settings
+from django.contrib import admin, messages
+from django.contrib.admin.options import IS_POPUP_VAR
+from django.contrib.admin.utils import model_ngettext
+from django.core.exceptions import PermissionDenied, ValidationError
+from django.core.paginator import Paginator
+from django.db import connections, router, transaction
+from django.db.models import F
+from django.db.models.functions import Round
+from django.http import HttpResponseRedirect
+from django.utils import timezone
 from django.utils.safestring import mark_safe
-from django.utils.translation import gettext
+from django.utils.text import capfirst
+from django.utils.functional import cached_property
+from django.utils.translation import gettext, ngettext, override as translation_override
 from django.urls import path
 from functools import update_wrapper
 
-from .forms import ShopAdminForm
+from .cache import CATALOG_VERSION, bump_version
+from .forms import ShopAdminForm, ProductActionForm
 from .models import Category, Shop, Product, Order, OrderProduct
 
 
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator untuk tabel besar: jumlah baris queryset tanpa filter diambil dari
+    statistik tabel (MySQL/PostgreSQL) jika di atas ADMIN_ESTIMATED_COUNT_THRESHOLD,
+    bukan COUNT(*) yang memindai seluruh tabel. Queryset yang difilter dan
+    database lain tetap memakai COUNT(*).
+    """
+
+    @cached_property
+    def count(self):
+        query = self.object_list.query
+        if not query.where:
+            estimate = self.estimated_count(self.object_list)
+            if estimate is not None and estimate > settings.ADMIN_ESTIMATED_COUNT_THRESHOLD:
+                return estimate
+
+        return super().count
+
+    @staticmethod
+    def estimated_count(queryset):
+        connection = connections[queryset.db]
+        table = queryset.model._meta.db_table
+
+        if connection.vendor == 'mysql':
+            sql = 'SELECT TABLE_ROWS FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s'
+        elif connection.vendor == 'postgresql':
+            sql = 'SELECT reltuples::bigint FROM pg_class WHERE relname = %s'
+        else:
+            return None
+
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [table])
+            row = cursor.fetchone()
+
+        return int(row[0]) if row and row[0] is not None and row[0] >= 0 else None
+
+
 class CategoryAdmin(admin.ModelAdmin):
     list_display = ('name',)
     search_fields = ('name',)
@@ -41,11 +93,15 @@ class ProductAdmin(admin.ModelAdmin):
     list_display_links = ('custom_image', 'name',)
     list_editable = ('price', 'stock',)
     fields = ('name', 'price', 'stock', 'weight', 'description', 'image', 'categories',)
+    actions = ('adjust_price', 'mark_out_of_stock',)
+    action_form = ProductActionForm
 
     def custom_image(self, obj):
-        if obj.image:
+        # thumbnail jika sudah dibuat, agar changelist tidak memuat gambar resolusi penuh
+        image = obj.image_thumbnail_jpeg or obj.image
+        if image:
             return mark_safe('<img src="{url}" width={width} />'.format(
-                url=obj.image.url,
+                url=image.url,
                 width='120'
                 )
             )
@@ -57,10 +113,175 @@ class ProductAdmin(admin.ModelAdmin):
             )
     custom_image.short_description = gettext('image')
 
+    def get_changelist_formset(self, request, **kwargs):
+        formset = super().get_changelist_formset(request, **kwargs)
+        # stok saat halaman dibuka ikut dikirim (hidden input), untuk mendeteksi stok yang
+        # berubah oleh checkout selama halaman dibuka
+        formset.form.base_fields['stock'].show_hidden_initial = True
+        return formset
+
+    def changelist_view(self, request, extra_context=None):
+        if request.method == 'POST' and '_save' in request.POST and self.list_editable \
+                and IS_POPUP_VAR not in request.GET:
+            response = self.save_changelist(request)
+            if response is not None:
+                return response
+
+        return super().changelist_view(request, extra_context)
+
+    def save_changelist(self, request):
+        """
+        Menyimpan perubahan list_editable (harga, stok) semua baris dalam satu UPDATE
+        dan satu transaksi, bukan Product.save() per baris. Jika stok salah satu
+        produk sudah berubah sejak halaman dibuka, tidak ada yang disimpan.
+        Mengembalikan None jika formset tidak valid, agar error ditampilkan oleh
+        changelist_view bawaan.
+        """
+        if not self.has_change_permission(request):
+            raise PermissionDenied
+
+        FormSet = self.get_changelist_formset(request)
+        modified_objects = self.get_submitted_queryset(request, FormSet.get_default_prefix())
+        formset = FormSet(request.POST, request.FILES, queryset=modified_objects)
+        if not formset.is_valid():
+            return None
+
+        changed_forms = [form for form in formset.forms if form.has_changed()]
+        changes = {
+            form.instance.pk: {name: form.cleaned_data[name] for name in form.changed_data}
+            for form in changed_forms
+        }
+        expected_stock = {
+            form.instance.pk: self.get_initial_stock(form)
+            for form in changed_forms if 'stock' in form.changed_data
+        }
+
+        with transaction.atomic(using=router.db_for_write(self.model)):
+            # baris dikunci agar checkout tidak mengubah stok di antara pengecekan dan UPDATE
+            current_stock = dict(
+                Product.objects.select_for_update().filter(pk__in=expected_stock).values_list('pk', 'stock')
+            )
+            conflicts = [
+                form.instance for form in changed_forms
+                if form.instance.pk in expected_stock
+                and current_stock.get(form.instance.pk) != expected_stock[form.instance.pk]
+            ]
+
+            # UPDATE tetap memeriksa stok, untuk database tanpa row lock (SQLite)
+            if conflicts or not Product.objects.bulk_update_fields(changes, expected_stock):
+                transaction.set_rollback(True)
+                self.message_user(request, gettext(
+                    'Stock changed while you were editing (%(products)s). No changes were saved, '
+                    'please review the current stock and try again.'
+                ) % {'products': ', '.join(product.name for product in conflicts) or '-'}, messages.ERROR)
+                return HttpResponseRedirect(request.get_full_path())
+
+            for form in changed_forms:
+                self.log_change(request, form.instance, self.construct_change_message(request, form, None))
+
+            if changes:
+                transaction.on_commit(lambda: bump_version(CATALOG_VERSION))
+
+        if changes:
+            self.message_user(request, ngettext(
+                '%(count)s %(name)s was changed successfully.',
+                '%(count)s %(name)s were changed successfully.',
+                len(changes)
+            ) % {'count': len(changes), 'name': model_ngettext(self.opts, len(changes))}, messages.SUCCESS)
+
+        return HttpResponseRedirect(request.get_full_path())
+
+    def get_submitted_queryset(self, request, prefix):
+        """
+        Produk yang pk-nya dikirim oleh formset changelist (`<prefix>-<n>-id`), sama seperti
+        ModelAdmin._get_list_editable_queryset bawaan Django tetapi tanpa API private.
+        pk yang tidak valid menghasilkan queryset kosong sehingga formset tidak valid.
+        """
+        pk = self.opts.pk
+        pattern = re.compile(r'^{}-\d+-{}$'.format(re.escape(prefix), re.escape(pk.name)))
+        object_pks = [value for key, value in request.POST.items() if pattern.match(key)]
+        queryset = self.get_queryset(request)
+
+        try:
+            for value in object_pks:
+                pk.to_python(value)
+        except ValidationError:
+            return queryset.none()
+
+        return queryset.filter(pk__in=object_pks)
+
+    def get_initial_stock(self, form):
+        field = form.fields['stock']
+        try:
+            return field.to_python(field.hidden_widget().value_from_datadict(
+                form.data, form.files, form.add_initial_prefix('stock')
+            ))
+        except ValidationError:
+            # hidden input tidak valid, dianggap konflik
+            return None
+
+    def update_and_log(self, request, queryset, **values):
+        """
+        Satu UPDATE untuk semua produk di `queryset`, lalu LogEntry per produk seperti
+        edit lewat form. Mengembalikan jumlah produk yang diubah.
+        """
+        # label field disimpan tanpa terjemahan, seperti construct_change_message bawaan
+        with translation_override(None):
+            fields = [str(capfirst(self.opts.get_field(name).verbose_name)) for name in values]
+        message = [{'changed': {'fields': fields}}]
+
+        with transaction.atomic(using=router.db_for_write(self.model)):
+            # produk dibaca sebelum UPDATE, filter changelist bisa saja memakai field yang diubah
+            products = list(queryset.select_for_update().only('pk', 'name'))
+            updated = Product.objects.filter(pk__in=[product.pk for product in products]).update(
+                updated_at=timezone.now(), **values
+            )
+            for product in products:
+                self.log_change(request, product, message)
+
+            transaction.on_commit(lambda: bump_version(CATALOG_VERSION))
+
+        return updated
+
+    @admin.action(description=gettext('Adjust price of selected products by percent'))
+    def adjust_price(self, request, queryset):
+        percent = None
+        form = self.action_form(request.POST)
+        form.fields['action'].choices = self.get_action_choices(request)
+        if form.is_valid():
+            percent = form.cleaned_data['percent']
+
+        if percent is None:
+            self.message_user(request, gettext('Enter a valid percent to adjust the price.'), messages.ERROR)
+            return
+
+        # satu UPDATE untuk semua produk terpilih, harga dibulatkan ke rupiah
+        factor = 1 + float(percent) / 100
+        updated = self.update_and_log(request, queryset, price=Round(F('price') * factor))
+
+        self.message_user(request, ngettext(
+            'Price of %(count)s product adjusted by %(percent)s%%.',
+            'Price of %(count)s products adjusted by %(percent)s%%.',
+            updated
+        ) % {'count': updated, 'percent': percent}, messages.SUCCESS)
+
+    @admin.action(description=gettext('Mark selected products as out of stock'))
+    def mark_out_of_stock(self, request, queryset):
+        updated = self.update_and_log(request, queryset, stock=0)
+
+        self.message_user(request, ngettext(
+            '%(count)s product marked as out of stock.',
+            '%(count)s products marked as out of stock.',
+            updated
+        ) % {'count': updated}, messages.SUCCESS)
+
 
 admin.site.register(Product, ProductAdmin)
 
 
+INVOICE_NUMBER_RE = re.compile(r'^INV\d+$', re.IGNORECASE)
+
+
 class OrderProductAdminInline(admin.TabularInline):
     model = OrderProduct
     fields = ('product', 'quantity', 'price', 'weight', 'total',)
@@ -71,7 +292,13 @@ class OrderAdmin(admin.ModelAdmin):
                     'shipping_courier', 'sub_total', 'total_shipping', 'total',)
     list_filter = ('status', 'payment_method', 'shipping_courier',)
     list_editable = ('status', 'shipping_tracking_number',)
-    search_fields = ('invoice_number', 'customer_name',)
+    # lihat get_search_results: nomor invoice dicari exact, nama customer dengan prefix
+    search_fields = ('=invoice_number', '^customer_name',)
+    # tidak ada kolom foreign key di list_display
+    list_select_related = False
+    paginator = EstimatedCountPaginator
+    # tanpa COUNT(*) kedua untuk total data tanpa filter
+    show_full_result_count = False
     fields = (
         'invoice_number', 'purchased_at', 'status', 'customer_name', 'customer_phone', 'customer_address',
         'customer_city',
@@ -84,11 +311,23 @@ class OrderAdmin(admin.ModelAdmin):
 
     custom_invoice_number.short_description = gettext('invoice number')
 
+    def get_search_results(self, request, queryset, search_term):
+        # satu kondisi yang bisa memakai index, bukan icontains/OR di beberapa kolom
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+
+        if INVOICE_NUMBER_RE.match(search_term):
+            return queryset.filter(invoice_number=search_term.upper()), False
+
+        return queryset.filter(customer_name__istartswith=search_term), False
+
     def has_add_permission(self, request):
         return False
 
     def has_change_permission(self, request, obj=None):
-        if getattr(self, '__detail_view', None):
+        # flag disimpan di request, bukan di instance OrderAdmin yang dipakai bersama antar thread
+        if getattr(request, 'order_detail_view', False):
             return False
         return super().has_change_permission(request, obj)
 
@@ -96,12 +335,9 @@ class OrderAdmin(admin.ModelAdmin):
         return False
 
     def detail_view(self, request, object_id, form_url='', extra_context=None):
-        setattr(self, '__detail_view', True)
-        # Custom template for detail view
-        self.change_form_template = self.change_form_template
-        ret = self.changeform_view(request, object_id, form_url, extra_context)
-        delattr(self, '__detail_view')
-        return ret
+        # change form read-only
+        request.order_detail_view = True
+        return self.changeform_view(request, object_id, form_url, extra_context)
 
     def get_urls(self):
         urls = super().get_urls()
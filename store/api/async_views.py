@@ -0,0 +1,159 @@
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
+from django.db.models import F, Sum
+from django.http import JsonResponse
+from django.utils.translation import gettext
+from rest_framework.exceptions import AuthenticationFailed, NotAuthenticated, ValidationError
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from store.helpers import async_get_all_courier_shipping_costs, async_get_shipping_cost
+from store.models import Cart, Order
+from store.tasks import async_fetch_payment_token
+
+from .serializers import (
+    ShippingCostFormSerializer,
+    ShippingCostListSerializer,
+    CourierShippingCostListSerializer,
+    OrderFormSerializer
+)
+
+# View async (bukan DRF) untuk endpoint yang banyak menunggu API eksternal.
+# Dijalankan lewat ASGI (app/asgi.py), request ke RajaOngkir dan Midtrans
+# memakai httpx sehingga tidak menahan thread. Query ORM tetap sync dan
+# dijalankan lewat sync_to_async. Format request/response sama dengan
+# ShippingCostView dan OrderView.
+
+# referensi task background agar tidak dibuang garbage collector sebelum selesai
+_background_tasks = set()
+
+
+def _authenticate(request):
+    # authentication class yang sama dengan view DRF (REST_FRAMEWORK['DEFAULT_AUTHENTICATION_CLASSES'])
+    drf_request = Request(request, authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES])
+
+    try:
+        user = drf_request.user
+    except AuthenticationFailed as e:
+        return None, unauthorized_response(drf_request, e)
+
+    if not user or not user.is_authenticated:
+        return None, unauthorized_response(drf_request, NotAuthenticated())
+
+    return user, None
+
+
+def unauthorized_response(drf_request, exc):
+    # sama dengan APIView.permission_denied/handle_exception: 401 dengan header WWW-Authenticate
+    response = JsonResponse({'detail': str(exc.detail)}, status=401)
+    if drf_request.authenticators:
+        header = drf_request.authenticators[0].authenticate_header(drf_request)
+        if header:
+            response['WWW-Authenticate'] = header
+
+    return response
+
+
+async def authenticate(request):
+    """Mengembalikan tuple (user, None) atau (None, response 401)."""
+    return await sync_to_async(_authenticate)(request)
+
+
+def parse_body(request):
+    if request.content_type == 'application/json':
+        try:
+            return json.loads(request.body or b'{}')
+        except ValueError:
+            return None
+
+    return request.POST
+
+
+def cart_total_weight(user):
+    return Cart.objects.filter(user=user.id).aggregate(total=Sum(F('product__weight') * F('quantity')))['total']
+
+
+async def shipping_cost_view(request):
+    if request.method != 'POST':
+        return JsonResponse({'detail': gettext('Method not allowed.')}, status=405)
+
+    user, error = await authenticate(request)
+    if error:
+        return error
+
+    data = parse_body(request)
+    if data is None:
+        return JsonResponse({'detail': gettext('JSON parse error.')}, status=400)
+
+    serializerForm = ShippingCostFormSerializer(data=data)
+
+    if not serializerForm.is_valid():
+        return JsonResponse({'message': gettext('Failed get shipping cost.')}, status=422)
+
+    # origin dibaca dari reference data cache, query hanya terjadi jika cache belum terisi
+    serializerFormData = await sync_to_async(lambda: serializerForm.data)()
+    origin = serializerFormData['origin']
+    destination = serializerFormData['destination']
+    courier = serializerFormData['courier']
+    weight = await sync_to_async(cart_total_weight)(user)
+
+    if weight is None:
+        return JsonResponse({'message': gettext('Your cart is empty.')}, status=422)
+
+    if courier == ShippingCostFormSerializer.ALL_COURIERS:
+        costs, missing = await async_get_all_courier_shipping_costs(Order.SHIPPING_COURIER_CHOICES, origin=origin,
+                                                                    destination=destination, weight=weight)
+
+        if not costs:
+            return JsonResponse({'message': gettext('Failed get shipping cost.')}, status=422)
+
+        result = CourierShippingCostListSerializer(costs, many=True)
+
+        return JsonResponse({"results": result.data, "missing": missing})
+
+    costs = await async_get_shipping_cost(courier=courier, origin=origin, destination=destination, weight=weight)
+    result = ShippingCostListSerializer(costs, many=True)
+
+    return JsonResponse({"results": result.data})
+
+
+async def order_create_view(request):
+    if request.method != 'POST':
+        return JsonResponse({'detail': gettext('Method not allowed.')}, status=405)
+
+    user, error = await authenticate(request)
+    if error:
+        return error
+
+    request.user = user
+    data = parse_body(request)
+    if data is None:
+        return JsonResponse({'detail': gettext('JSON parse error.')}, status=400)
+
+    def create_order():
+        serializer = OrderFormSerializer(data=data, context={'request': request, 'defer_payment_token': True})
+        serializer.is_valid(raise_exception=True)
+        order = serializer.save()
+
+        return order, serializer.data
+
+    try:
+        order, result = await sync_to_async(create_order)()
+    except ValidationError as e:
+        return JsonResponse(e.detail, status=400, safe=False)
+
+    # token Midtrans diambil di event loop setelah response dikirim; jika gagal
+    # atau proses mati, order tetap PENDING dan diambil ulang oleh `process_payment_tokens`
+    if order.payment_token_status == Order.PAYMENT_TOKEN_PENDING:
+        task = asyncio.ensure_future(async_fetch_payment_token(order.pk))
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
+
+    return JsonResponse(result, status=201)
+
+
+# view ini memakai JWT (header Authorization), bukan session
+shipping_cost_view.csrf_exempt = True
+order_create_view.csrf_exempt = True
@@ -1,6 +1,11 @@
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import OuterRef, Subquery
+from django.utils.translation import gettext
 from django_filters import FilterSet, ModelMultipleChoiceFilter, RangeFilter
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import OrderingFilter, SearchFilter
 
-from store.models import Category, Product
+from store.models import Category, Product, ProductSearchToken
 
 
 class ProductListFilter(FilterSet):
@@ -10,3 +15,90 @@ class ProductListFilter(FilterSet):
     class Meta:
         model = Product
         fields = ['categories', 'price']
+
+
+class ProductSearchFilter(SearchFilter):
+    """
+    Pencarian produk menggunakan inverted index `ProductSearchToken`
+    (nama dan deskripsi) sebagai pengganti `icontains`. Hasil diurutkan
+    berdasarkan relevansi, kecuali jika client mengirim parameter `ordering`.
+
+    Urutan relevansi tidak bisa dipakai sebagai keyset, sehingga pencarian
+    dengan `?pagination=cursor` wajib disertai `ordering`.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '')
+        ranked = ProductSearchToken.objects.search(query)
+
+        if ranked is None:
+            return queryset
+
+        use_keyset_pagination = getattr(view, 'use_keyset_pagination', None)
+        if use_keyset_pagination and use_keyset_pagination() \
+                and not OrderingFilter().get_ordering(request, queryset, view):
+            raise ValidationError({
+                self.search_param: [gettext('Search results ordered by relevance cannot be paginated by cursor, '
+                                            'add an ordering parameter.')]
+            })
+
+        score = ranked.filter(product=OuterRef('pk')).order_by().values('score')
+
+        return queryset.filter(pk__in=ranked.values('product')) \
+            .annotate(search_rank=Subquery(score)) \
+            .order_by('-search_rank', 'pk')
+
+
+# Filter backend untuk view yang datanya berasal dari reference data cache
+# (list objek di memori, bukan queryset). Perilakunya mengikuti backend aslinya.
+
+class InMemorySearchFilter(SearchFilter):
+
+    def filter_queryset(self, request, queryset, view):
+        search_fields = self.get_search_fields(view, request)
+        search_terms = [term.lower() for term in self.get_search_terms(request)]
+
+        if not search_fields or not search_terms:
+            return queryset
+
+        return [
+            item for item in queryset
+            if all(
+                any(term in str(getattr(item, field)).lower() for field in search_fields)
+                for term in search_terms
+            )
+        ]
+
+
+class InMemoryOrderingFilter(OrderingFilter):
+
+    def filter_queryset(self, request, queryset, view):
+        ordering = self.get_ordering(request, queryset, view)
+
+        if not ordering:
+            return queryset
+
+        items = list(queryset)
+        for field in reversed(ordering):
+            items.sort(key=lambda item: getattr(item, field.lstrip('-')), reverse=field.startswith('-'))
+        return items
+
+
+class InMemoryFieldFilter:
+    """Filter exact untuk `filterset_fields` milik view, misalnya `?state=1`."""
+
+    def filter_queryset(self, request, queryset, view):
+        model = view.serializer_class.Meta.model
+
+        for name in getattr(view, 'filterset_fields', []):
+            value = request.query_params.get(name)
+            if value:
+                field = model._meta.get_field(name)
+                # nilai divalidasi sesuai tipe field seperti DjangoFilterBackend (400, bukan list kosong)
+                try:
+                    value = field.to_python(value)
+                except DjangoValidationError as e:
+                    raise ValidationError({name: e.messages})
+
+                queryset = [item for item in queryset if getattr(item, field.attname) == value]
+        return queryset
@@ -0,0 +1,126 @@
+import hashlib
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+from rest_framework.response import Response
+
+from store.cache import get_version
+
+
+class ConditionalGetMixin:
+    """
+    Conditional GET (ETag / Last-Modified) untuk view read-only.
+
+    View cukup meng-override `get_validators()` dengan query yang murah
+    (misalnya MAX(updated_at) atau version stamp). Jika client mengirim
+    `If-None-Match` / `If-Modified-Since` yang masih cocok, response 304
+    dikembalikan tanpa menjalankan query utama maupun serializer.
+    """
+    # argumen untuk patch_cache_control, misalnya {'public': True, 'max_age': 60}
+    cache_control = {}
+
+    def get_validators(self, request):
+        """Mengembalikan tuple (etag, last_modified); None jika tidak tersedia."""
+        return None, None
+
+    def make_etag(self, *parts):
+        # representasi response juga bergantung pada host (URL absolut),
+        # query string dan format renderer
+        request = self.request
+        variant = (request.scheme, request.get_host(), request.get_full_path(), request.accepted_renderer.format)
+
+        return hashlib.md5(repr(parts + variant).encode('utf-8')).hexdigest()
+
+    def get(self, request, *args, **kwargs):
+        etag, last_modified = self.get_validators(request)
+        if etag is not None:
+            etag = quote_etag(etag)
+        last_modified = int(last_modified.timestamp()) if last_modified else None
+
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = super().get(request, *args, **kwargs)
+
+        if response.status_code in (200, 304):
+            if etag is not None and not response.has_header('ETag'):
+                response['ETag'] = etag
+            if last_modified is not None and not response.has_header('Last-Modified'):
+                response['Last-Modified'] = http_date(last_modified)
+            if self.cache_control:
+                patch_cache_control(response, **self.cache_control)
+
+        return response
+
+
+_response_cache_stats = Counter()
+_response_cache_stats_lock = threading.Lock()
+
+
+def response_cache_stats():
+    """Jumlah hit/miss response cache per view sejak proses berjalan, {view: {'hit': n, 'miss': n}}."""
+    stats = {}
+    with _response_cache_stats_lock:
+        for (view, status), count in _response_cache_stats.items():
+            stats.setdefault(view, {'hit': 0, 'miss': 0})[status] = count
+
+    return stats
+
+
+class ResponseCacheMixin:
+    """
+    Menyimpan `response.data` hasil GET di cache framework Django.
+
+    Key cache terdiri dari version stamp `response_cache_version`, host,
+    path dan query parameter yang dinormalisasi (urutan parameter diabaikan,
+    parameter kosong dibuang). Cache tidak perlu dihapus satu per satu;
+    begitu version di-bump semua key lama otomatis tidak terpakai lagi.
+    Response hanya boleh berisi data yang sama untuk semua user.
+    """
+    response_cache_version = None
+    # parameter yang urutan nilainya tidak berpengaruh, misalnya ?categories=1&categories=2
+    response_cache_unordered_params = ()
+
+    def get_response_cache_key(self, request):
+        params = []
+        for key in sorted(request.query_params):
+            values = [value for value in request.query_params.getlist(key) if value != '']
+            if key in self.response_cache_unordered_params:
+                values = sorted(values)
+            if values:
+                params.append((key, values))
+
+        digest = hashlib.md5(repr((request.scheme, request.get_host(), request.path, params)).encode('utf-8'))
+
+        return 'store:response:{}:{}:{}'.format(
+            self.__class__.__name__, get_version(self.response_cache_version), digest.hexdigest()
+        )
+
+    def get(self, request, *args, **kwargs):
+        started_at = time.perf_counter()
+        key = self.get_response_cache_key(request)
+        data = cache.get(key)
+
+        if data is not None:
+            status = 'HIT'
+            response = Response(data)
+        else:
+            status = 'MISS'
+            response = super().get(request, *args, **kwargs)
+            if response.status_code == 200:
+                cache.set(key, response.data, settings.RESPONSE_CACHE_TIMEOUT)
+
+        with _response_cache_stats_lock:
+            _response_cache_stats[(self.__class__.__name__, status.lower())] += 1
+
+        response['X-Cache'] = status
+        # durasi di sisi aplikasi, untuk membandingkan latency HIT dan MISS
+        response['Server-Timing'] = 'app;desc="{}";dur={:.2f}'.format(
+            status, (time.perf_counter() - started_at) * 1000
+        )
+
+        return response
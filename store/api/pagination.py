@@ -0,0 +1,202 @@
+import json
+from base64 import b64decode, b64encode
+from functools import reduce
+from operator import or_
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Pagination berbasis keyset (seek method).
+
+    Posisi cursor berisi nilai semua field ordering ditambah `pk` sebagai
+    tie-breaker, sehingga halaman berikutnya cukup difilter dengan
+    perbandingan tuple `(field, pk) > (nilai, id)` tanpa OFFSET dan tanpa
+    COUNT(*). Biaya halaman ke-N sama dengan halaman pertama.
+    """
+    tie_breaker = 'pk'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.model = queryset.model
+        self.ordering = self.get_ordering(request, queryset, view)
+
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is None:
+            reverse, current_position = False, None
+        else:
+            reverse, current_position = self.cursor
+
+        if reverse:
+            queryset = queryset.order_by(*self._reverse(self.ordering))
+        else:
+            queryset = queryset.order_by(*self.ordering)
+
+        if current_position is not None:
+            queryset = queryset.filter(self._seek_filter(current_position, reverse))
+
+        results = list(queryset[:self.page_size + 1])
+        self.page = results[:self.page_size]
+        has_more = len(results) > len(self.page)
+
+        if reverse:
+            self.page = list(reversed(self.page))
+            self.has_next = current_position is not None
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = current_position is not None
+
+        if self.page:
+            self.next_position = self._get_position_from_instance(self.page[-1], self.ordering)
+            self.previous_position = self._get_position_from_instance(self.page[0], self.ordering)
+        else:
+            self.next_position = self.previous_position = current_position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+
+        return self.encode_cursor((False, self.next_position))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+
+        return self.encode_cursor((True, self.previous_position))
+
+    def get_ordering(self, request, queryset, view):
+        ordering = None
+        ordering_filters = [
+            filter_cls for filter_cls in getattr(view, 'filter_backends', [])
+            if hasattr(filter_cls, 'get_ordering')
+        ]
+
+        if ordering_filters:
+            ordering = ordering_filters[0]().get_ordering(request, queryset, view)
+
+        if not ordering:
+            ordering = getattr(view, 'ordering', None) or queryset.model._meta.ordering
+
+        if isinstance(ordering, str):
+            ordering = (ordering,)
+
+        assert all('__' not in field for field in ordering), (
+            'Keyset pagination does not support double underscore lookups for orderings.'
+        )
+
+        # pk sebagai tie-breaker mengikuti arah field terakhir, sehingga
+        # index komposit (field, id) bisa dipakai untuk seek dan scan.
+        direction = '-' if ordering and ordering[-1].startswith('-') else ''
+        return tuple(ordering) + (direction + self.tie_breaker,)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+
+        try:
+            tokens = json.loads(b64decode(encoded.encode('ascii')).decode('utf-8'))
+            reverse = bool(tokens['r'])
+            position = tokens['p']
+            if not isinstance(position, list) or len(position) != len(self.ordering):
+                raise ValueError()
+            # nilai cursor berasal dari client, tipe-nya divalidasi sebelum dipakai di filter
+            position = [self._to_python(field, value) for field, value in zip(self.ordering, position)]
+        except (TypeError, ValueError, KeyError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+        return reverse, position
+
+    def encode_cursor(self, cursor):
+        reverse, position = cursor
+        tokens = json.dumps({'r': int(reverse), 'p': position}, separators=(',', ':'))
+        encoded = b64encode(tokens.encode('utf-8')).decode('ascii')
+
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def _get_position_from_instance(self, instance, ordering):
+        position = []
+        for field in ordering:
+            field_name = field.lstrip('-')
+            if isinstance(instance, dict):
+                attr = instance[field_name]
+            else:
+                attr = getattr(instance, field_name)
+            position.append(attr if isinstance(attr, (int, float)) else str(attr))
+        return position
+
+    def _to_python(self, field, value):
+        if value is None:
+            raise ValueError()
+
+        field_name = field.lstrip('-')
+        try:
+            model_field = self.model._meta.pk if field_name == 'pk' else self.model._meta.get_field(field_name)
+        except FieldDoesNotExist:
+            # field hasil annotate, tidak ada tipe yang bisa dipakai untuk validasi
+            if not isinstance(value, (str, int, float)):
+                raise ValueError()
+            return value
+
+        return model_field.to_python(value)
+
+    def _seek_filter(self, position, reverse):
+        # (a, b, c) > (x, y, z) setara dengan
+        # a > x OR (a = x AND b > y) OR (a = x AND b = y AND c > z)
+        clauses = []
+        for index, field in enumerate(self.ordering):
+            field_name = field.lstrip('-')
+            descending = field.startswith('-') != reverse
+            lookup = '{}__{}'.format(field_name, 'lt' if descending else 'gt')
+            equals = {
+                prefix.lstrip('-'): value for prefix, value in zip(self.ordering[:index], position[:index])
+            }
+            clauses.append(Q(**equals) & Q(**{lookup: position[index]}))
+
+        return reduce(or_, clauses)
+
+    @staticmethod
+    def _reverse(ordering):
+        return tuple(field[1:] if field.startswith('-') else '-' + field for field in ordering)
+
+
+class KeysetPaginationMixin:
+    """
+    Mode pagination keyset yang opsional. Aktif jika request membawa
+    `?pagination=cursor` atau parameter `cursor`; selain itu view tetap
+    menggunakan `DEFAULT_PAGINATION_CLASS`.
+    """
+    keyset_pagination_class = KeysetPagination
+    pagination_mode_query_param = 'pagination'
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            if self.use_keyset_pagination():
+                self._paginator = self.keyset_pagination_class()
+            elif self.pagination_class is None:
+                self._paginator = None
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
+
+    def use_keyset_pagination(self):
+        params = self.request.query_params
+
+        return (params.get(self.pagination_mode_query_param) == 'cursor'
+                or self.keyset_pagination_class.cursor_query_param in params)
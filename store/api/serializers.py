@@ -4,10 +4,20 @@ from rest_framework.validators import UniqueValidator
 from django.contrib.auth.models import User
 from django.utils.translation import gettext
 from django.db import transaction
+from django.core.files.storage import default_storage
+from django.db.models import F
+from django.utils import timezone
 from drf_extra_fields.fields import Base64ImageField
 
-from store.models import Category, Product, Cart, State, City, Shop, Order, OrderProduct, new_order_signal
-from store.helpers import rupiah_formatting, generate_invoice_number, generate_payment_token
+from store.models import (
+    Category, Product, Cart, State, City, Order, OrderProduct, StockHold, EmailOutbox, new_order_signal
+)
+from store.helpers import rupiah_formatting, generate_invoice_number
+from store.images import PRODUCT_IMAGE_WIDTHS, downscale_payment_proof, image_variants, payment_proof_size_allowed
+from store.reference_data import get_shop
+from store.tasks import submit_on_commit, fetch_payment_token, send_queued_emails
+
+from .uploads import ImageHeaderField
 
 
 class ExampleSerializer(serializers.ModelSerializer):
@@ -22,7 +32,43 @@ class CategoryListSerializer(serializers.ModelSerializer):
         fields = ('id', 'name',)
 
 
-class ProductListSerializer(serializers.ModelSerializer):
+def build_media_url(name, request):
+    if not name:
+        return None
+
+    url = default_storage.url(name)
+
+    return request.build_absolute_uri(url) if request else url
+
+
+def build_srcset(variants, request):
+    # format atribut srcset HTML: "url 160w, url 480w"
+    if not variants:
+        return None
+
+    return ', '.join('{} {}w'.format(build_media_url(name, request), width) for name, width in variants)
+
+
+class ProductImageVariantsMixin(serializers.Serializer):
+    """
+    `image` berisi thumbnail JPEG (gambar asli jika varian belum dibuat),
+    `image_srcset` dan `image_srcset_webp` berisi semua ukuran varian.
+    """
+    image = serializers.SerializerMethodField(read_only=True)
+    image_srcset = serializers.SerializerMethodField(read_only=True)
+    image_srcset_webp = serializers.SerializerMethodField(read_only=True)
+
+    def get_image(self, obj):
+        return build_media_url(obj.image_thumbnail_jpeg or obj.image, self.context.get('request'))
+
+    def get_image_srcset(self, obj):
+        return build_srcset(image_variants(obj, 'jpeg'), self.context.get('request'))
+
+    def get_image_srcset_webp(self, obj):
+        return build_srcset(image_variants(obj, 'webp'), self.context.get('request'))
+
+
+class ProductListSerializer(ProductImageVariantsMixin, serializers.ModelSerializer):
     price = serializers.SerializerMethodField(read_only=True)
 
     def get_price(self, obj):
@@ -32,7 +78,7 @@ class ProductListSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Product
-        fields = ('id', 'name', 'slug', 'image', 'price',)
+        fields = ('id', 'name', 'slug', 'image', 'image_srcset', 'image_srcset_webp', 'price',)
 
 
 class ProductDetailSerializer(serializers.ModelSerializer):
@@ -84,8 +130,9 @@ class RegisterSerializer(serializers.ModelSerializer):
         return user
 
 
-class CartProductSerializer(serializers.ModelSerializer):
+class CartProductSerializer(ProductImageVariantsMixin, serializers.ModelSerializer):
     price = serializers.SerializerMethodField(read_only=True)
+    price_value = serializers.FloatField(source='price', read_only=True)
 
     def get_price(self, obj):
         formatted_price = rupiah_formatting(obj.price)
@@ -94,7 +141,7 @@ class CartProductSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Product
-        fields = ('id', 'name', 'image', 'price', 'weight',)
+        fields = ('id', 'name', 'image', 'image_srcset', 'image_srcset_webp', 'price', 'price_value', 'weight',)
 
 
 class CartSerializer(serializers.ModelSerializer):
@@ -108,18 +155,23 @@ class CartSerializer(serializers.ModelSerializer):
         depth = 1
 
     def create(self, validated_data):
-        try:
-            cart = Cart.objects.get(product=validated_data['product_id'], user=self.context['request'].user)
-
-            cart.quantity = cart.quantity + validated_data['quantity']
-            cart.save()
-        except Cart.DoesNotExist:
-            cart = Cart.objects.create(
+        with transaction.atomic():
+            # (user, product) unik, sehingga produk yang sama cukup menambah quantity
+            cart, created = Cart.objects.get_or_create(
                 product=validated_data['product_id'],
-                quantity=validated_data['quantity'],
-                user=validated_data['user']
+                user=validated_data['user'],
+                defaults={'quantity': validated_data['quantity']}
             )
 
+            if not created:
+                Cart.objects.filter(pk=cart.pk).update(
+                    quantity=F('quantity') + validated_data['quantity'],
+                    updated_at=timezone.now()
+                )
+                cart.refresh_from_db(fields=['quantity', 'updated_at'])
+
+            self.hold_stock(cart)
+
         return cart
 
     def validate(self, attrs):
@@ -131,10 +183,13 @@ class CartSerializer(serializers.ModelSerializer):
         else:
             product = attrs['product_id']
 
-        if product.stock <= 0:
+        # stok yang sedang ditahan di cart user lain tidak bisa dipakai
+        available_stock = StockHold.objects.available_stock(product, exclude_user=request.user)
+
+        if available_stock <= 0:
             raise serializers.ValidationError(gettext("Product out of stock."))
 
-        if product.stock < attrs['quantity']:
+        if available_stock < attrs['quantity']:
             raise serializers.ValidationError(gettext("Product doesn't have enough stock."))
 
         return attrs
@@ -143,7 +198,15 @@ class CartSerializer(serializers.ModelSerializer):
         if 'product_id' in validated_data:
             validated_data.pop('product_id', None)
 
-        return super(CartSerializer, self).update(instance, validated_data)
+        with transaction.atomic():
+            cart = super(CartSerializer, self).update(instance, validated_data)
+            self.hold_stock(cart)
+
+        return cart
+
+    def hold_stock(self, cart):
+        if not StockHold.objects.hold(cart):
+            raise serializers.ValidationError(gettext("Product doesn't have enough stock."))
 
     def get_fields(self, *args, **kwargs):
         fields = super(CartSerializer, self).get_fields(*args, **kwargs)
@@ -167,14 +230,18 @@ class CityListSerializer(serializers.ModelSerializer):
 
 
 class ShippingCostFormSerializer(serializers.Serializer):
+    # courier "all" mengambil ongkir semua kurir sekaligus
+    ALL_COURIERS = 'all'
+
     origin = serializers.SerializerMethodField(read_only=True)
     destination = serializers.IntegerField(required=True)
-    courier = serializers.ChoiceField(required=True, choices=Order.SHIPPING_COURIER_CHOICES)
+    courier = serializers.ChoiceField(required=True,
+                                      choices=Order.SHIPPING_COURIER_CHOICES + [(ALL_COURIERS, 'All')])
 
     def get_origin(self, obj):
-        shop = Shop.objects.first()
+        shop = get_shop()
 
-        return shop.city.id
+        return shop.city_id
 
 
 class ShippingCostListSerializer(serializers.Serializer):
@@ -183,6 +250,12 @@ class ShippingCostListSerializer(serializers.Serializer):
     cost = serializers.DictField()
 
 
+class CourierShippingCostListSerializer(serializers.Serializer):
+    courier = serializers.CharField()
+    name = serializers.CharField()
+    costs = ShippingCostListSerializer(many=True)
+
+
 class OrderFormSerializer(serializers.ModelSerializer):
     user = serializers.HiddenField(write_only=True, default=serializers.CurrentUserDefault())
 
@@ -209,9 +282,10 @@ class OrderFormSerializer(serializers.ModelSerializer):
         }
 
     def create(self, validated_data):
-        carts = Cart.objects.filter(user=self.context['request'].user)
+        user = self.context['request'].user
+        carts = list(Cart.objects.select_related('product').filter(user=user, product__isnull=False))
 
-        if not carts.exists():
+        if not carts:
             raise serializers.ValidationError("Your cart is empty.")
 
         sub_total = sum([(cart.quantity * cart.product.price) for cart in carts])
@@ -219,39 +293,58 @@ class OrderFormSerializer(serializers.ModelSerializer):
         validated_data['sub_total'] = sub_total
         validated_data['total'] = total
 
+        # token Midtrans dibuat oleh worker setelah commit, bukan di dalam transaksi checkout
+        if validated_data['payment_method'] == Order.ONLINE_PAYMENT:
+            validated_data['payment_token_status'] = Order.PAYMENT_TOKEN_PENDING
+            validated_data['payment_token_retry_at'] = timezone.now()
+
+        quantities = {}
+        for cart in carts:
+            quantities[cart.product_id] = quantities.get(cart.product_id, 0) + cart.quantity
+
         with transaction.atomic():
+            # kurangi stok semua produk dalam satu query, batal jika ada stok yang tidak cukup.
+            # hold milik user ini ikut terhapus bersama cart di bawah
+            if not Product.objects.decrement_stock(quantities, user=user):
+                raise serializers.ValidationError(gettext("Product doesn't have enough stock."))
+
             order = Order.objects.create(**validated_data)
 
-            if order:
-                # simpan data detail order di table order_products
-                for cart in carts:
-                    order.orderproduct_set.create(
-                        quantity=cart.quantity,
-                        weight=cart.product.weight,
-                        price=cart.product.price,
-                        total=(float(cart.quantity) * cart.product.price),
-                        product=cart.product
-                    )
-                    cart.product.stock = cart.product.stock - cart.quantity
-                    cart.product.save()
+            # simpan data detail order di table order_products
+            OrderProduct.objects.bulk_create([
+                OrderProduct(
+                    order=order,
+                    quantity=cart.quantity,
+                    weight=cart.product.weight,
+                    price=cart.product.price,
+                    total=(float(cart.quantity) * cart.product.price),
+                    product=cart.product
+                )
+                for cart in carts
+            ])
 
-                # menggenerate invoice number
-                order.invoice_number = generate_invoice_number(order)
+            # menggenerate invoice number
+            order.invoice_number = generate_invoice_number(order)
+            Order.objects.filter(pk=order.pk).update(invoice_number=order.invoice_number)
 
-                # jika metode pembayarannya adala "online payment",
-                # maka itu akan menggenerate token pembayaran dari payment gatewat Midtrans
-                if order.payment_method == Order.ONLINE_PAYMENT:
-                    order.payment_token = generate_payment_token(order)
+            # jika metode pembayarannya adala "online payment",
+            # maka token pembayaran dari payment gateway Midtrans diambil di background setelah commit.
+            # View async mengambil token sendiri di event loop (context `defer_payment_token`)
+            if order.payment_token_status == Order.PAYMENT_TOKEN_PENDING \
+                    and not self.context.get('defer_payment_token'):
+                submit_on_commit(fetch_payment_token, order.pk)
 
-                order.save()
+            # hapus data cart berdasarkan user yang melakukan request
+            Cart.objects.filter(user=user).delete()
 
-                # hapus data cart berdasarkan user yang melakukan request
-                Cart.objects.filter(user=self.context['request'].user).delete()
+            # email tagihan pesanan masuk ke outbox dalam transaksi yang sama,
+            # lalu dikirim oleh worker di luar request
+            outbox = EmailOutbox.objects.enqueue_order_invoice(order)
+            submit_on_commit(send_queued_emails, [outbox.pk])
 
-                # mengirim email tagihan pesanan
-                transaction.on_commit(lambda: new_order_signal.send(sender=None, order=order))
+            transaction.on_commit(lambda: new_order_signal.send(sender=None, order=order))
 
-                return order
+        return order
 
 
 class OrderListSerializer(serializers.ModelSerializer):
@@ -259,17 +352,18 @@ class OrderListSerializer(serializers.ModelSerializer):
     payment_method = serializers.CharField(source='get_payment_method_display', read_only=True)
     shipping_courier = serializers.CharField(source='get_shipping_courier_display', read_only=True)
     status = serializers.CharField(source='get_status_display', read_only=True)
-    # custom fields
-    image = serializers.ImageField(source='orderproduct_set.first.product.image')
-    total_item = serializers.IntegerField(source='orderproduct_set.count', read_only=True)
+    # custom fields, dihitung lewat anotasi queryset di OrderView
+    image = serializers.SerializerMethodField(read_only=True)
+    image_srcset = serializers.SerializerMethodField(read_only=True)
+    total_item = serializers.IntegerField(read_only=True)
     total_weight = serializers.SerializerMethodField(read_only=True)
 
     class Meta:
         model = Order
         fields = (
             'id', 'invoice_number', 'payment_method', 'shipping_courier', 'shipping_service',
-            'shipping_tracking_number', 'purchased_at', 'created_at', 'status', 'image', 'total', 'total_item',
-            'total_weight',)
+            'shipping_tracking_number', 'purchased_at', 'created_at', 'status', 'image', 'image_srcset', 'total',
+            'total_item', 'total_weight',)
         depth = 1
 
     def get_total(self, obj):
@@ -277,9 +371,18 @@ class OrderListSerializer(serializers.ModelSerializer):
 
         return result
 
+    def get_image(self, obj):
+        # thumbnail = gambar produk pertama pada pesanan
+        return build_media_url(obj.image_thumbnail or obj.image, self.context.get('request'))
+
+    def get_image_srcset(self, obj):
+        variants = [(obj.image_thumbnail, PRODUCT_IMAGE_WIDTHS['thumbnail']),
+                    (obj.image_medium, PRODUCT_IMAGE_WIDTHS['medium'])]
+
+        return build_srcset([variant for variant in variants if variant[0]], self.context.get('request'))
+
     def get_total_weight(self, obj):
-        itemWeights = [item.product.weight for item in obj.orderproduct_set.all()]
-        total_weight = sum(itemWeights) * 1000
+        total_weight = (obj.total_weight or 0) * 1000
         total_weight = str(int(total_weight)) + " gram"
 
         return total_weight
@@ -313,6 +416,7 @@ class OrderDetailSerializer(serializers.ModelSerializer):
     payment_method = serializers.CharField(source='get_payment_method_display', read_only=True)
     shipping_courier = serializers.CharField(source='get_shipping_courier_display', read_only=True)
     status = serializers.CharField(source='get_status_display', read_only=True)
+    payment_token_status = serializers.CharField(source='get_payment_token_status_display', read_only=True)
     products = OrderProductSerializer(many=True, source='orderproduct_set')
     customer_city = serializers.CharField(source='customer_city.name')
     customer_state = serializers.CharField(source='customer_state.name')
@@ -323,8 +427,8 @@ class OrderDetailSerializer(serializers.ModelSerializer):
         fields = (
             'id', 'invoice_number', 'payment_method', 'shipping_courier', 'shipping_service',
             'shipping_tracking_number', 'purchased_at', 'created_at', 'status', 'payment_proof', 'payment_token',
-            'customer_name', 'customer_phone', 'customer_address', 'customer_city', 'customer_state',
-            'customer_postal_code',
+            'payment_token_status', 'customer_name', 'customer_phone', 'customer_address', 'customer_city',
+            'customer_state', 'customer_postal_code',
             'sub_total', 'total_shipping', 'total', 'products',)
         depth = 1
 
@@ -344,9 +448,37 @@ class OrderDetailSerializer(serializers.ModelSerializer):
         return result
 
 
+class OrderPaymentTokenSerializer(serializers.ModelSerializer):
+    payment_token_status = serializers.CharField(source='get_payment_token_status_display', read_only=True)
+
+    class Meta:
+        model = Order
+        fields = ('id', 'payment_token_status', 'payment_token',)
+
+
 class OrderProofPaymentFormSerializer(serializers.ModelSerializer):
     payment_proof = Base64ImageField()
 
     class Meta:
         model = Order
         fields = ('id', 'payment_proof',)
+
+    def validate_payment_proof(self, value):
+        # dicek dari header sebelum gambar di-decode saat diperkecil
+        if not payment_proof_size_allowed(value):
+            raise serializers.ValidationError(gettext('Image dimensions are too large.'))
+
+        return value
+
+    def update(self, instance, validated_data):
+        # gambar yang terlalu besar diperkecil sebelum disimpan, file asli tidak pernah ditulis ke storage
+        downscaled = downscale_payment_proof(validated_data['payment_proof'])
+        if downscaled:
+            validated_data['payment_proof'] = downscaled
+
+        return super().update(instance, validated_data)
+
+
+class OrderProofPaymentUploadSerializer(OrderProofPaymentFormSerializer):
+    # mode multipart: file sudah berupa temp file, hanya header gambar yang divalidasi
+    payment_proof = ImageHeaderField()
@@ -0,0 +1,68 @@
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.utils.translation import gettext_lazy
+from PIL import Image
+from rest_framework import serializers, status
+from rest_framework.exceptions import APIException
+
+
+class PayloadTooLarge(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = gettext_lazy('Uploaded file is too large.')
+    default_code = 'payload_too_large'
+
+
+class CappedTemporaryFileUploadHandler(TemporaryFileUploadHandler):
+    """
+    Menulis file upload langsung ke temp file per chunk (tidak pernah ditahan
+    utuh di memori) dan menghentikan upload begitu ukurannya melebihi `max_size`
+    byte: dari header Content-Length jika ada, atau saat chunk diterima.
+    """
+
+    def __init__(self, request=None, max_size=None):
+        super().__init__(request)
+        self.max_size = max_size
+        self.received = 0
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        if self.max_size and content_length > self.max_size:
+            raise PayloadTooLarge()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+
+        if self.max_size and self.received > self.max_size:
+            self.file.close()
+            raise PayloadTooLarge()
+
+        return super().receive_data_chunk(raw_data, start)
+
+
+class ImageHeaderField(serializers.FileField):
+    """
+    File gambar yang divalidasi hanya dari header-nya (format dan dimensi)
+    tanpa men-decode seluruh pixel, berbeda dengan ImageField bawaan.
+    """
+    allowed_formats = ('JPEG', 'PNG', 'WEBP')
+
+    default_error_messages = {
+        'invalid_image': gettext_lazy(
+            'Upload a valid image. The file you uploaded was either not an image or a corrupted image.'
+        ),
+    }
+
+    def to_internal_value(self, data):
+        file = super().to_internal_value(data)
+
+        try:
+            # Image.open hanya membaca header; DecompressionBombError untuk dimensi yang tidak wajar
+            with Image.open(file) as image:
+                valid = image.format in self.allowed_formats
+        except Exception:
+            valid = False
+        finally:
+            file.seek(0)
+
+        if not valid:
+            self.fail('invalid_image')
+
+        return file
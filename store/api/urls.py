@@ -14,8 +14,11 @@ from .views import (
     ShippingCostView,
     OrderView,
     OrderDetailView,
-    OrderProofPaymentView
+    OrderPaymentTokenView,
+    OrderProofPaymentView,
+    CacheStatsView
 )
+from . import async_views
 
 urlpatterns = [
     # contoh url untuk API endpoint
@@ -41,6 +44,12 @@ urlpatterns = [
     # API Order
     path('order', OrderView.as_view(), name='api-order-list-create'),
     path('order/<int:pk>', OrderDetailView.as_view(), name='api-order-detail'),
+    path('order/<int:pk>/payment-token', OrderPaymentTokenView.as_view(), name='api-order-payment-token'),
     path('order/proof-payment/<int:pk>', OrderProofPaymentView.as_view(), name='api-order-proof-payment'),
+    # API statistik cache (khusus staff)
+    path('cache-stats', CacheStatsView.as_view(), name='api-cache-stats'),
+    # API async (ASGI), request ke RajaOngkir dan Midtrans tidak menahan thread
+    path('async/shipping-cost', async_views.shipping_cost_view, name='api-async-shipping-cost'),
+    path('async/order', async_views.order_create_view, name='api-async-order-create'),
 ]
 
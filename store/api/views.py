@@ -1,5 +1,8 @@
+import time
+
+from django.conf import settings
 from django.contrib.auth.models import User
-from django.db.models import Sum, F
+from django.db.models import Count, OuterRef, Prefetch, Subquery, Sum, F
 from django.utils.translation import gettext
 from rest_framework.generics import (
     ListAPIView,
@@ -9,13 +12,14 @@ from rest_framework.generics import (
     UpdateAPIView,
     RetrieveUpdateDestroyAPIView,
 )
+from rest_framework.views import APIView
 from rest_framework.filters import SearchFilter, OrderingFilter
 from rest_framework.authentication import BasicAuthentication
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.response import Response
 
-from store.models import Category, Product, Cart, State, City, Order
+from store.models import Category, Product, Cart, Order, OrderProduct
 
 from .serializers import (
     ExampleSerializer,
@@ -28,14 +32,35 @@ from .serializers import (
     CityListSerializer,
     ShippingCostFormSerializer,
     ShippingCostListSerializer,
+    CourierShippingCostListSerializer,
     OrderFormSerializer,
     OrderListSerializer,
     OrderDetailSerializer,
-    OrderProofPaymentFormSerializer
+    OrderPaymentTokenSerializer,
+    OrderProofPaymentFormSerializer,
+    OrderProofPaymentUploadSerializer
 )
 
-from .filters import ProductListFilter
-from store.helpers import convert_rupiah_to_float, rupiah_formatting, get_shipping_cost
+from .filters import (
+    ProductListFilter,
+    ProductSearchFilter,
+    InMemorySearchFilter,
+    InMemoryOrderingFilter,
+    InMemoryFieldFilter
+)
+from .mixins import ConditionalGetMixin, ResponseCacheMixin, response_cache_stats
+from .pagination import KeysetPaginationMixin
+from .uploads import CappedTemporaryFileUploadHandler
+from store.helpers import rupiah_formatting, get_shipping_cost, get_all_courier_shipping_costs, shipping_cost_cache
+from store.cache import CATALOG_VERSION, get_version
+from store.reference_data import (
+    CATEGORIES_VERSION,
+    LOCATIONS_VERSION,
+    get_categories,
+    get_cities,
+    get_city_list_json,
+    get_states
+)
 
 
 class ExampleListView(ListAPIView):
@@ -53,35 +78,59 @@ class ExampleListView(ListAPIView):
     permission_classes = [IsAuthenticated]
 
 
-class CategoryListView(ListAPIView):
+class CategoryListView(ConditionalGetMixin, ListAPIView):
     serializer_class = CategoryListSerializer
-    queryset = Category.objects.all()
+    cache_control = {'public': True, 'max_age': 300}
     search_fields = ['name']
     ordering_fields = ['name']
 
     filter_backends = (
-        SearchFilter,
-        OrderingFilter
+        InMemorySearchFilter,
+        InMemoryOrderingFilter
     )
 
+    def get_queryset(self):
+        return get_categories()
+
+    def get_validators(self, request):
+        return self.make_etag(get_version(CATEGORIES_VERSION)), None
+
 
-class ProductListView(ListAPIView):
+class ProductListView(ConditionalGetMixin, ResponseCacheMixin, KeysetPaginationMixin, ListAPIView):
     serializer_class = ProductListSerializer
     queryset = Product.objects.all()
     ordering_fields = ['price', 'created_at']
-    search_fields = ['name']
     filterset_class = ProductListFilter
+    cache_control = {'public': True, 'max_age': 60}
+    response_cache_version = CATALOG_VERSION
+    response_cache_unordered_params = ('categories',)
 
     filter_backends = (
         DjangoFilterBackend,
-        SearchFilter,
+        ProductSearchFilter,
         OrderingFilter,
     )
 
+    def get_validators(self, request):
+        # version katalog di-bump oleh setiap perubahan produk (save, delete, relasi kategori,
+        # edit admin, import), tanpa query ke tabel produk. Tidak ada Last-Modified karena
+        # produk yang dihapus tidak bisa memajukan tanggalnya.
+        return self.make_etag(get_version(CATALOG_VERSION)), None
 
-class ProductDetailView(RetrieveAPIView):
+
+class ProductDetailView(ConditionalGetMixin, ResponseCacheMixin, RetrieveAPIView):
     serializer_class = ProductDetailSerializer
     queryset = Product.objects.all()
+    cache_control = {'public': True, 'max_age': 60}
+    response_cache_version = CATALOG_VERSION
+
+    def get_validators(self, request):
+        last_modified = Product.objects.filter(pk=self.kwargs['pk']).values_list('updated_at', flat=True).first()
+
+        if last_modified is None:
+            return None, None
+
+        return self.make_etag(last_modified), last_modified
 
 
 class RegisterView(CreateAPIView):
@@ -97,26 +146,20 @@ class CartListCreateView(ListCreateAPIView):
 
     def list(self, request, *args, **kwargs):
         queryset = self.filter_queryset(self.get_queryset())
+        serializer = self.get_serializer(queryset, many=True)
 
-        if queryset.exists():
-            serializer = self.get_serializer(queryset, many=True)
-            
-            # mendapatkan total items/products and total amount
-            itemPrices = [(convert_rupiah_to_float(dict(item)['product']['price']) * dict(item)['quantity']) for item in
-                        serializer.data]
-            total_amount = sum(itemPrices)
-            total_item = len(itemPrices)
-
-            response = {"meta": {"amount": rupiah_formatting(total_amount), "item": total_item},
-                        "results": serializer.data}
-        else:
-            response = {"meta": {"amount": rupiah_formatting(0), "item": 0},
-                        "results": []}
+        # total items/products dan total amount dihitung langsung di database
+        summary = queryset.aggregate(amount=Sum(F('product__price') * F('quantity')), item=Count('id'))
+        total_amount = summary['amount'] or 0
+
+        response = {"meta": {"amount": rupiah_formatting(total_amount), "amount_value": total_amount,
+                             "item": summary['item']},
+                    "results": serializer.data}
 
         return Response(response)
 
     def get_queryset(self):
-        return Cart.objects.all().filter(user=self.request.user)
+        return Cart.objects.select_related('product').filter(user=self.request.user)
 
 
 class CartUpdateDestroyView(RetrieveUpdateDestroyAPIView):
@@ -125,29 +168,53 @@ class CartUpdateDestroyView(RetrieveUpdateDestroyAPIView):
     permission_classes = (IsAuthenticated,)
 
 
-class StateListView(ListAPIView):
+class StateListView(ConditionalGetMixin, ListAPIView):
     serializer_class = StateListSerializer
-    queryset = State.objects.all()
     permission_classes = (IsAuthenticated,)
+    cache_control = {'private': True, 'max_age': 3600}
     search_fields = ['name']
 
     filter_backends = (
-        SearchFilter,
+        InMemorySearchFilter,
     )
 
+    def get_queryset(self):
+        return get_states()
+
+    def get_validators(self, request):
+        return self.make_etag(get_version(LOCATIONS_VERSION)), None
+
 
-class CityListView(ListAPIView):
+class CityListView(ConditionalGetMixin, ListAPIView):
     serializer_class = CityListSerializer
-    queryset = City.objects.all()
     permission_classes = (IsAuthenticated,)
+    cache_control = {'private': True, 'max_age': 3600}
     search_fields = ['name']
     filterset_fields = ['state']
 
     filter_backends = (
-        SearchFilter,
-        DjangoFilterBackend
+        InMemorySearchFilter,
+        InMemoryFieldFilter
     )
 
+    def get(self, request, *args, **kwargs):
+        # ?pagination=none: semua kota (atau kota per `state`) dalam satu response dari
+        # JSON yang sudah disiapkan di memori, tanpa serializer
+        if request.query_params.get('pagination') == 'none' and not request.query_params.get('search'):
+            state_id = request.query_params.get('state') or None
+            # isdigit() juga menerima digit seperti "²" yang tidak bisa di-int(); nilai
+            # selain bilangan divalidasi InMemoryFieldFilter di bawah (400)
+            if state_id is None or state_id.isdecimal():
+                return get_city_list_json(state_id).response(request, cache_control=self.cache_control)
+
+        return super().get(request, *args, **kwargs)
+
+    def get_queryset(self):
+        return get_cities()
+
+    def get_validators(self, request):
+        return self.make_etag(get_version(LOCATIONS_VERSION)), None
+
 
 class ShippingCostView(CreateAPIView):
     permission_classes = (IsAuthenticated,)
@@ -168,6 +235,9 @@ class ShippingCostView(CreateAPIView):
             if weight is None:
                 return Response(data={'message': gettext('Your cart is empty.')}, status=422)
 
+            if courier == ShippingCostFormSerializer.ALL_COURIERS:
+                return self.all_couriers(origin=origin, destination=destination, weight=weight)
+
             costs = get_shipping_cost(courier=courier, origin=origin, destination=destination, weight=weight)
             result = ShippingCostListSerializer(costs, many=True)
 
@@ -175,8 +245,20 @@ class ShippingCostView(CreateAPIView):
         else:
             return Response(data={'message': gettext('Failed get shipping cost.')}, status=422)
 
+    def all_couriers(self, origin, destination, weight):
+        costs, missing = get_all_courier_shipping_costs(Order.SHIPPING_COURIER_CHOICES, origin=origin,
+                                                        destination=destination, weight=weight)
 
-class OrderView(ListCreateAPIView):
+        if not costs:
+            return Response(data={'message': gettext('Failed get shipping cost.')}, status=422)
+
+        result = CourierShippingCostListSerializer(costs, many=True)
+
+        # kurir yang gagal atau belum menjawab sampai deadline
+        return Response({"results": result.data, "missing": missing})
+
+
+class OrderView(KeysetPaginationMixin, ListCreateAPIView):
     serializer_class = OrderListSerializer
     queryset = Order.objects.all()
     permission_classes = (IsAuthenticated,)
@@ -187,16 +269,109 @@ class OrderView(ListCreateAPIView):
         return OrderListSerializer
 
     def get_queryset(self):
-        return Order.objects.all().filter(user=self.request.user)
+        # total item, total berat dan thumbnail dihitung di database agar jumlah query
+        # per halaman tetap, tidak bertambah mengikuti jumlah order dan item
+        first_product = OrderProduct.objects.filter(order=OuterRef('pk')).order_by('id')
+
+        return Order.objects.filter(user=self.request.user).annotate(
+            total_item=Count('orderproduct'),
+            total_weight=Sum('orderproduct__product__weight'),
+            image=Subquery(first_product.values('product__image')[:1]),
+            image_thumbnail=Subquery(first_product.values('product__image_thumbnail_jpeg')[:1]),
+            image_medium=Subquery(first_product.values('product__image_medium_jpeg')[:1])
+        ).order_by(*Order._meta.ordering)
 
 
 class OrderDetailView(RetrieveAPIView):
     serializer_class = OrderDetailSerializer
-    queryset = Order.objects.all()
     permission_classes = (IsAuthenticated,)
 
+    def get_queryset(self):
+        # hanya pesanan milik user; lokasi di-join dan item beserta produknya
+        # di-prefetch sehingga jumlah query tetap berapa pun jumlah item
+        lines = OrderProduct.objects.select_related('product')
+
+        return Order.objects.filter(user=self.request.user) \
+            .select_related('customer_city', 'customer_state') \
+            .prefetch_related(Prefetch('orderproduct_set', queryset=lines))
+
+
+class OrderPaymentTokenView(RetrieveAPIView):
+    """
+    Endpoint ringan untuk polling token pembayaran Midtrans. Dengan `?wait=N`
+    request menunggu maksimal N detik (dibatasi `max_wait`) sampai token siap.
+
+    Selama menunggu, satu worker WSGI tertahan, karena itu `max_wait` dibuat
+    pendek. Jika token belum siap, response membawa header `Retry-After`
+    sebagai jeda polling berikutnya.
+    """
+    serializer_class = OrderPaymentTokenSerializer
+    permission_classes = (IsAuthenticated,)
+    max_wait = 2
+    poll_interval = 0.5
+    retry_after = 2
+
+    def get_queryset(self):
+        return Order.objects.filter(user=self.request.user).only('id', 'payment_token', 'payment_token_status')
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+
+        try:
+            wait = min(float(request.query_params.get('wait', 0)), self.max_wait)
+        except ValueError:
+            wait = 0
+
+        deadline = time.monotonic() + wait
+        while instance.payment_token_status == Order.PAYMENT_TOKEN_PENDING and time.monotonic() < deadline:
+            time.sleep(self.poll_interval)
+            instance.refresh_from_db(fields=['payment_token', 'payment_token_status'])
+
+        response = Response(self.get_serializer(instance).data)
+        if instance.payment_token_status == Order.PAYMENT_TOKEN_PENDING:
+            response['Retry-After'] = str(self.retry_after)
+
+        return response
+
 
 class OrderProofPaymentView(UpdateAPIView):
-    serializer_class = OrderProofPaymentFormSerializer
-    queryset = Order.objects.all()
+    """
+    Menerima bukti pembayaran sebagai JSON base64 atau multipart/form-data.
+    Mode multipart menulis file ke temp file per chunk dengan batas
+    PAYMENT_PROOF_MAX_UPLOAD_SIZE, sehingga memori tidak mengikuti ukuran upload.
+    """
     permission_classes = (IsAuthenticated,)
+
+    def is_multipart(self):
+        return self.request.content_type.startswith('multipart/form-data')
+
+    def get_queryset(self):
+        return Order.objects.filter(user=self.request.user)
+
+    def get_serializer_class(self):
+        if self.is_multipart():
+            return OrderProofPaymentUploadSerializer
+        return OrderProofPaymentFormSerializer
+
+    def update(self, request, *args, **kwargs):
+        if self.is_multipart():
+            # harus diganti sebelum body dibaca (request.data)
+            request._request.upload_handlers = [
+                CappedTemporaryFileUploadHandler(request._request, max_size=settings.PAYMENT_PROOF_MAX_UPLOAD_SIZE)
+            ]
+
+        return super().update(request, *args, **kwargs)
+
+
+class CacheStatsView(APIView):
+    """
+    Statistik cache in-process milik worker yang melayani request ini.
+    Setiap proses (worker gunicorn/uvicorn) punya counter sendiri.
+    """
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request):
+        return Response({
+            'shipping_cost': shipping_cost_cache.stats(),
+            'response': response_cache_stats(),
+        })
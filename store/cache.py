@@ -0,0 +1,214 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+
+class TTLCache:
+    """
+    Cache in-process dengan batas jumlah entry (LRU) dan TTL.
+
+    - Entry yang umurnya di bawah `ttl` dikembalikan langsung (hit).
+    - Entry yang sudah lewat `ttl` tetapi masih di bawah `ttl + stale_ttl`
+      tetap dikembalikan (stale hit) sambil di-refresh di background.
+    - Miss untuk key yang sama pada saat bersamaan hanya memanggil loader
+      sekali (single-flight); request lain menunggu hasil yang sama.
+    """
+
+    def __init__(self, max_entries, ttl, stale_ttl=0, should_cache=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.should_cache = should_cache or (lambda value: True)
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.loads = 0
+
+    HIT = 'hit'
+    STALE = 'stale'
+    MISS = 'miss'
+
+    def lookup(self, key):
+        """
+        Membaca cache tanpa memanggil loader, untuk pemanggil yang memuat datanya
+        sendiri (misalnya kode async). Mengembalikan tuple (value, HIT/STALE/MISS).
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            age = time.monotonic() - entry[1] if entry is not None else None
+
+            if age is not None and age < self.ttl + self.stale_ttl:
+                self._entries.move_to_end(key)
+                if age < self.ttl:
+                    self.hits += 1
+                    return entry[0], self.HIT
+                self.stale_hits += 1
+                return entry[0], self.STALE
+
+            self.misses += 1
+            return None, self.MISS
+
+    def store(self, key, value):
+        with self._lock:
+            self._store(key, value)
+
+    def _store(self, key, value):
+        self.loads += 1
+        if self.should_cache(value):
+            self._entries[key] = (value, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_or_load(self, key, loader):
+        with self._lock:
+            entry = self._entries.get(key)
+            age = time.monotonic() - entry[1] if entry is not None else None
+
+            if age is not None and age < self.ttl:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return entry[0]
+
+            if age is not None and age < self.ttl + self.stale_ttl:
+                self.stale_hits += 1
+                self._entries.move_to_end(key)
+                refresh = None
+                if key not in self._inflight:
+                    refresh = self._inflight[key] = Future()
+            else:
+                self.misses += 1
+                future = self._inflight.get(key)
+                leader = future is None
+                if leader:
+                    future = self._inflight[key] = Future()
+
+        if age is not None and age < self.ttl + self.stale_ttl:
+            # nilai lama langsung dikembalikan, refresh cukup dijalankan satu thread
+            if refresh is not None:
+                threading.Thread(target=self._refresh, args=(key, loader, refresh), daemon=True).start()
+            return entry[0]
+
+        if not leader:
+            return future.result()
+
+        return self._load(key, loader, future)
+
+    def _load(self, key, loader, future):
+        try:
+            value = loader()
+        except BaseException as e:
+            with self._lock:
+                self._inflight.pop(key, None)
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            self._store(key, value)
+            self._inflight.pop(key, None)
+
+        future.set_result(value)
+        return value
+
+    def _refresh(self, key, loader, future):
+        try:
+            self._load(key, loader, future)
+        except Exception:
+            logger.exception('Gagal me-refresh cache untuk key %s.', key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.stale_hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'stale_hits': self.stale_hits,
+                'misses': self.misses,
+                'loads': self.loads,
+                'hit_ratio': (self.hits + self.stale_hits) / lookups if lookups else 0.0,
+            }
+
+
+# Version stamp
+# -------------
+# Disimpan di cache framework Django (CACHES['default']) sehingga bisa dibaca
+# semua proses/worker. Nilainya hanya dibandingkan, tidak pernah dihitung.
+
+VERSION_KEY_PREFIX = 'store:version:'
+# di-bump setiap produk atau relasi produk-kategori berubah
+CATALOG_VERSION = 'catalog'
+
+
+def get_version(name):
+    key = VERSION_KEY_PREFIX + name
+    version = cache.get(key)
+
+    if version is None:
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+
+    return version
+
+
+def bump_version(name):
+    version = time.time_ns()
+    cache.set(VERSION_KEY_PREFIX + name, version, None)
+
+    return version
+
+
+class VersionedCache:
+    """
+    Menyimpan hasil `loader()` di memori proses sampai version stamp `name`
+    berubah. Version stamp hanya dicek setiap `check_interval` detik, sehingga
+    pembacaan pada worker yang sudah warm tidak melakukan query apa pun.
+    """
+
+    def __init__(self, name, loader, check_interval=None):
+        self.name = name
+        self.loader = loader
+        self.check_interval = check_interval
+        self._data = None
+        self._version = None
+        self._checked_at = 0
+        self._lock = threading.Lock()
+
+    def get(self):
+        interval = self.check_interval
+        if interval is None:
+            interval = settings.REFERENCE_DATA_CHECK_INTERVAL
+
+        data = self._data
+        if data is not None and time.monotonic() - self._checked_at < interval:
+            return data
+
+        with self._lock:
+            version = get_version(self.name)
+
+            if self._data is None or version != self._version:
+                # version dibaca sebelum load, perubahan di tengah load akan memicu reload berikutnya
+                self._data = self.loader()
+                self._version = version
+
+            self._checked_at = time.monotonic()
+            return self._data
+
+    def invalidate(self):
+        """Membuang data lokal dan menandai data di proses lain sudah usang."""
+        with self._lock:
+            self._data = None
+        bump_version(self.name)
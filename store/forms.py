@@ -1,6 +1,9 @@
 from django import forms
+from django.contrib.admin.helpers import ActionForm
+from django.utils.translation import gettext
 
-from .models import City, State, Shop
+from .models import Shop
+from .reference_data import get_cities, get_states
 
 
 # Kustomisasi Shop Admin Form
@@ -14,18 +17,18 @@ class ShopAdminForm(forms.ModelForm):
         super(ShopAdminForm, self).__init__(*args, **kwargs)
 
         try:
-            self.initial['state'] = kwargs['instance'].state.id
+            self.initial['state'] = kwargs['instance'].state_id
         except:
             pass
 
-        state_list = [('', '---------')] + [(i.id, i.name) for i in State.objects.all()]
+        state_list = [('', '---------')] + [(i.id, i.name) for i in get_states()]
 
-        try:
-            self.initial['city'] = kwargs['instance'].city.id
-            city_init_form = [(i.id, i.name) for i in City.objects.filter(
-                state=kwargs['instance'].state
-            )]
-        except:
+        # get_cities(None) berisi semua kota, shop tanpa provinsi tidak punya pilihan kota
+        instance = kwargs.get('instance')
+        if instance is not None and instance.state_id is not None:
+            self.initial['city'] = instance.city_id
+            city_init_form = [(i.id, i.name) for i in get_cities(instance.state_id)]
+        else:
             city_init_form = [('', '---------')]
 
         self.fields['state'].widget = forms.Select(
@@ -43,3 +46,12 @@ class ShopAdminForm(forms.ModelForm):
             },
             choices=city_init_form
         )
+
+
+# Action form Product Admin, dengan input persen untuk action ubah harga
+class ProductActionForm(ActionForm):
+    percent = forms.DecimalField(
+        required=False, max_digits=6, decimal_places=2, min_value=-99, max_value=1000,
+        label=gettext('Percent:'),
+        widget=forms.NumberInput(attrs={'style': 'width:80px', 'step': 'any'})
+    )
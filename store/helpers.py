@@ -1,30 +1,173 @@
-import locale
+import asyncio
+import gzip
+import hashlib
 import http
 import json
+import logging
+import math
+import re
+import threading
+import weakref
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, wait
+from functools import lru_cache
 from django.conf import settings
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+import httpx
 import midtransclient
 
+from store.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+
+RUPIAH_FORMAT_CACHE_SIZE = 4096
+
+# Format angka id_ID: pemisah ribuan "." dan pemisah desimal ",".
+# Diimplementasikan tanpa locale.setlocale() karena locale bersifat global
+# per proses dan tidak thread-safe.
+_id_separators = str.maketrans({',': '.', '.': ','})
+
+
+def _format_id_number(amount, decimal):
+    return '{:,.{}f}'.format(amount, decimal).translate(_id_separators)
+
+
+_format_id_number_cached = lru_cache(maxsize=RUPIAH_FORMAT_CACHE_SIZE)(_format_id_number)
+
+
+def _format_rupiah_number(amount, decimal):
+    # 0 dan -0.0 dianggap key yang sama oleh cache, tetapi hasil formatnya berbeda
+    if not amount:
+        return _format_id_number(amount, decimal)
+    return _format_id_number_cached(amount, decimal)
+
 
 def rupiah_formatting(amount, with_prefix=True, decimal=0):
-    locale.setlocale(locale.LC_NUMERIC, 'id_ID.UTF-8')
-    result = locale.format_string("%.*f", (decimal, amount), True)
+    result = _format_rupiah_number(amount, decimal)
     if with_prefix:
         return "Rp. {}".format(result)
     return result
 
 
+def rupiah_formatting_many(amounts, with_prefix=True, decimal=0):
+    template = "Rp. {}" if with_prefix else "{}"
+
+    return [template.format(_format_rupiah_number(amount, decimal)) for amount in amounts]
+
+
 def convert_rupiah_to_float(amount_with_currency):
-    locale.setlocale(locale.LC_NUMERIC, 'id_ID.UTF-8')
-    amount = locale.atof(amount_with_currency.strip("Rp. "))
+    amount = amount_with_currency.strip("Rp. ").replace('.', '').replace(',', '.')
 
     return float(amount)
 
 
+SEARCH_TERM_MAX_LENGTH = 50
+SEARCH_NAME_WEIGHT = 3
+
+_search_token_re = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize_search_text(text):
+    if not text:
+        return []
+
+    return [token[:SEARCH_TERM_MAX_LENGTH] for token in _search_token_re.findall(text.lower())]
+
+
+def product_search_terms(name, description):
+    # bobot term = jumlah kemunculan, kemunculan di nama produk bernilai lebih tinggi
+    terms = Counter()
+    for token in tokenize_search_text(name):
+        terms[token] += SEARCH_NAME_WEIGHT
+    for token in tokenize_search_text(description):
+        terms[token] += 1
+
+    return terms
+
+
+# RajaOngkir menghitung ongkir per kelipatan 1 kg (berat dalam gram),
+# sehingga berat dibulatkan ke atas agar key cache lebih sering sama.
+SHIPPING_WEIGHT_STEP = 1000
+
+shipping_cost_cache = TTLCache(
+    max_entries=settings.SHIPPING_COST_CACHE_MAX_ENTRIES,
+    ttl=settings.SHIPPING_COST_CACHE_TTL,
+    stale_ttl=settings.SHIPPING_COST_CACHE_STALE_TTL,
+    # hasil kosong (error dari RajaOngkir) tidak disimpan
+    should_cache=bool
+)
+
+
+def normalize_shipping_weight(weight):
+    steps = math.ceil(round(float(weight), 3) / SHIPPING_WEIGHT_STEP)
+
+    return max(steps, 1) * SHIPPING_WEIGHT_STEP
+
+
 def get_shipping_cost(courier, origin, destination, weight):
+    """
+    Ongkos kirim dari RajaOngkir melalui cache read-through.
+    Hasilnya dipakai bersama antar request, jangan diubah oleh pemanggil.
+    """
+    weight = normalize_shipping_weight(weight)
+    key = (courier, str(origin), str(destination), weight)
+
+    return shipping_cost_cache.get_or_load(
+        key, lambda: fetch_shipping_cost(courier, origin, destination, weight)
+    )
+
+
+_shipping_cost_executor = None
+_shipping_cost_executor_lock = threading.Lock()
+
+
+def _get_shipping_cost_executor():
+    global _shipping_cost_executor
+
+    with _shipping_cost_executor_lock:
+        if _shipping_cost_executor is None:
+            _shipping_cost_executor = ThreadPoolExecutor(max_workers=settings.SHIPPING_COST_WORKERS,
+                                                         thread_name_prefix='shipping-cost')
+    return _shipping_cost_executor
+
+
+def get_shipping_costs(couriers, origin, destination, weight, timeout=None):
+    """
+    Ongkos kirim beberapa kurir sekaligus, request ke RajaOngkir dijalankan paralel
+    dan dibatasi satu deadline untuk keseluruhan. Mengembalikan tuple
+    (dict kurir -> costs, list kurir yang gagal atau belum menjawab sampai deadline).
+    """
+    if timeout is None:
+        timeout = settings.SHIPPING_COST_DEADLINE
+
+    executor = _get_shipping_cost_executor()
+    futures = [
+        (courier, executor.submit(get_shipping_cost, courier, origin, destination, weight))
+        for courier in couriers
+    ]
+    # request yang melewati deadline tetap berjalan dan hasilnya masuk cache
+    done, _ = wait([future for _, future in futures], timeout=timeout)
+
+    results, missing = {}, []
+    for courier, future in futures:
+        if future not in done:
+            missing.append(courier)
+        elif future.exception() is not None:
+            logger.error('Gagal mengambil ongkir kurir %s.', courier, exc_info=future.exception())
+            missing.append(courier)
+        else:
+            results[courier] = future.result()
+
+    return results, missing
+
+
+def _shipping_cost_request(courier, origin, destination, weight):
     if weight < 1:
         weight = 1
 
-    conn = http.client.HTTPSConnection(settings.RAJAONGKIR_API_URL)
+    path = "/{plan}/cost".format(plan=settings.RAJAONGKIR_ACCOUNT_PLAN)
 
     payload = "origin={origin}&destination={destination}&weight={weight}&courier={courier}".format(
         origin=origin,
@@ -37,28 +180,155 @@ def get_shipping_cost(courier, origin, destination, weight):
         'content-type': "application/x-www-form-urlencoded"
     }
 
-    conn.request("POST", "/{plan}/cost".format(plan=settings.RAJAONGKIR_ACCOUNT_PLAN), payload, headers)
-    res = conn.getresponse()
-    data = res.read()
-    result = json.loads(data.decode("utf-8"))
+    return path, payload, headers
+
+
+def _parse_shipping_cost(result):
     costs = []
 
     if result['rajaongkir']['status']['code'] == 200:
         responseCosts = result['rajaongkir']['results'][0]['costs']
 
-        for responseCost in responseCosts:
+        labels = rupiah_formatting_many([responseCost['cost'][0]['value'] for responseCost in responseCosts])
+
+        for responseCost, label in zip(responseCosts, labels):
             costs.append({
                 'service': responseCost['service'],
                 'description': responseCost['description'],
                 'cost': {
                     'value': responseCost['cost'][0]['value'],
-                    'label': rupiah_formatting(responseCost['cost'][0]['value'])
+                    'label': label
                 }
             })
 
     return costs
 
 
+def fetch_shipping_cost(courier, origin, destination, weight):
+    path, payload, headers = _shipping_cost_request(courier, origin, destination, weight)
+
+    conn = http.client.HTTPSConnection(settings.RAJAONGKIR_API_URL, timeout=settings.SHIPPING_COST_DEADLINE)
+    conn.request("POST", path, payload, headers)
+    res = conn.getresponse()
+    data = res.read()
+    result = json.loads(data.decode("utf-8"))
+
+    return _parse_shipping_cost(result)
+
+
+# Versi async untuk view ASGI (store/api/async_views.py), memakai httpx
+# sehingga request ke RajaOngkir tidak menahan thread selama menunggu jaringan.
+# Cache yang dipakai sama dengan versi sync.
+
+_async_http_clients = weakref.WeakKeyDictionary()
+_async_shipping_cost_tasks = {}
+
+
+def get_async_http_client():
+    """httpx.AsyncClient bersama (connection pool) untuk event loop yang sedang berjalan."""
+    loop = asyncio.get_running_loop()
+    client = _async_http_clients.get(loop)
+
+    if client is None:
+        client = _async_http_clients[loop] = httpx.AsyncClient(timeout=settings.SHIPPING_COST_DEADLINE)
+    return client
+
+
+async def async_fetch_shipping_cost(courier, origin, destination, weight):
+    path, payload, headers = _shipping_cost_request(courier, origin, destination, weight)
+
+    response = await get_async_http_client().post(
+        "https://" + settings.RAJAONGKIR_API_URL + path, content=payload, headers=headers
+    )
+
+    return _parse_shipping_cost(response.json())
+
+
+async def async_get_shipping_cost(courier, origin, destination, weight):
+    weight = normalize_shipping_weight(weight)
+    key = (courier, str(origin), str(destination), weight)
+    costs, state = shipping_cost_cache.lookup(key)
+
+    if state == TTLCache.HIT:
+        return costs
+
+    # single-flight per event loop: miss yang bersamaan menunggu task yang sama
+    loop = asyncio.get_running_loop()
+    task = _async_shipping_cost_tasks.get((loop, key))
+    if task is None:
+        task = loop.create_task(_async_load_shipping_cost(key, courier, origin, destination, weight))
+        _async_shipping_cost_tasks[(loop, key)] = task
+        task.add_done_callback(lambda _: _async_shipping_cost_tasks.pop((loop, key), None))
+
+    if state == TTLCache.STALE:
+        # nilai lama dikembalikan, task di atas me-refresh di background
+        return costs
+
+    return await asyncio.shield(task)
+
+
+async def _async_load_shipping_cost(key, courier, origin, destination, weight):
+    try:
+        costs = await async_fetch_shipping_cost(courier, origin, destination, weight)
+    except Exception:
+        logger.exception('Gagal mengambil ongkir kurir %s.', courier)
+        raise
+
+    shipping_cost_cache.store(key, costs)
+    return costs
+
+
+async def async_get_shipping_costs(couriers, origin, destination, weight, timeout=None):
+    """Versi async dari `get_shipping_costs`."""
+    if timeout is None:
+        timeout = settings.SHIPPING_COST_DEADLINE
+
+    tasks = [
+        (courier, asyncio.ensure_future(async_get_shipping_cost(courier, origin, destination, weight)))
+        for courier in couriers
+    ]
+    done, pending = await asyncio.wait([task for _, task in tasks], timeout=timeout)
+    for task in pending:
+        task.cancel()
+
+    results, missing = {}, []
+    for courier, task in tasks:
+        if task not in done or task.exception() is not None:
+            missing.append(courier)
+        else:
+            results[courier] = task.result()
+
+    return results, missing
+
+
+def _courier_shipping_costs(couriers, costs):
+    return [
+        {'courier': courier, 'name': couriers[courier], 'costs': courier_costs}
+        for courier, courier_costs in costs.items()
+    ]
+
+
+def get_all_courier_shipping_costs(courier_choices, origin, destination, weight):
+    """
+    Ongkos kirim semua kurir di `courier_choices` (Order.SHIPPING_COURIER_CHOICES) untuk
+    courier "all". Mengembalikan tuple (list {'courier', 'name', 'costs'} untuk
+    CourierShippingCostListSerializer, list kurir yang gagal atau belum menjawab sampai deadline).
+    """
+    couriers = dict(courier_choices)
+    costs, missing = get_shipping_costs(couriers=list(couriers), origin=origin, destination=destination, weight=weight)
+
+    return _courier_shipping_costs(couriers, costs), missing
+
+
+async def async_get_all_courier_shipping_costs(courier_choices, origin, destination, weight):
+    """Versi async dari `get_all_courier_shipping_costs`."""
+    couriers = dict(courier_choices)
+    costs, missing = await async_get_shipping_costs(couriers=list(couriers), origin=origin,
+                                                    destination=destination, weight=weight)
+
+    return _courier_shipping_costs(couriers, costs), missing
+
+
 def generate_invoice_number(order):
     prefix = 'INV'
 
@@ -71,13 +341,10 @@ def generate_invoice_number(order):
     return new_invoice_number
 
 
-def generate_payment_token(order):
-    if not order:
-        return False
-
+def build_payment_token_params(order):
     item_details = []
     # detail item produk dari tabel order_products
-    for item in order.orderproduct_set.all():
+    for item in order.orderproduct_set.select_related('product'):
         item_details.append({
             'price': int(item.price),
             'quantity': item.quantity,
@@ -99,14 +366,8 @@ def generate_payment_token(order):
         'phone': order.customer_phone
     }
 
-    # Membuat instance Snap API
-    snap = midtransclient.Snap(
-        is_production=settings.MIDTRANS_IS_PRODUCTION,
-        server_key=settings.MIDTRANS_SERVER_KEY,
-        client_key=settings.MIDTRANS_CLIENT_KEY
-    )
     # Menyiapkan API parameter
-    param = {
+    return {
         "transaction_details": {
             "order_id": "skbookstore-" + str(order.id),
             "gross_amount": int(order.total),
@@ -114,9 +375,77 @@ def generate_payment_token(order):
         "item_details": item_details,
         "customer_details": customer_details
     }
+
+
+def generate_payment_token(order):
+    if not order:
+        return False
+
+    param = build_payment_token_params(order)
+
+    # Membuat instance Snap API
+    snap = midtransclient.Snap(
+        is_production=settings.MIDTRANS_IS_PRODUCTION,
+        server_key=settings.MIDTRANS_SERVER_KEY,
+        client_key=settings.MIDTRANS_CLIENT_KEY
+    )
+    if settings.MIDTRANS_SNAP_BASE_URL:
+        snap.api_config.SNAP_SANDBOX_BASE_URL = settings.MIDTRANS_SNAP_BASE_URL
+        snap.api_config.SNAP_PRODUCTION_BASE_URL = settings.MIDTRANS_SNAP_BASE_URL
     # Memanggil API midtrans untuk membuat transaksi
     transaction = snap.create_transaction(param)
     # Jika sukses, API midtrans akan mengembalikan token di response
     transaction_token = transaction['token']
 
     return transaction_token
+
+
+async def async_generate_payment_token(param):
+    """Versi async dari `generate_payment_token`, `param` dari `build_payment_token_params`."""
+    snap_config = midtransclient.config.ApiConfig(is_production=settings.MIDTRANS_IS_PRODUCTION)
+    base_url = settings.MIDTRANS_SNAP_BASE_URL or snap_config.get_snap_base_url()
+
+    response = await get_async_http_client().post(
+        base_url + '/transactions',
+        json=param,
+        auth=(settings.MIDTRANS_SERVER_KEY, ''),
+        headers={'Accept': 'application/json'}
+    )
+    response.raise_for_status()
+
+    return response.json()['token']
+
+
+GZIP_ACCEPTED_RE = re.compile(r'\bgzip\b')
+
+
+class PrecompiledJSON:
+    """
+    Body JSON yang diserialisasi dan di-gzip sekali, untuk data yang jarang
+    berubah dan dikirim berulang kali. ETag dibedakan per encoding.
+    """
+
+    def __init__(self, data):
+        self.body = json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        self.gzip_body = gzip.compress(self.body, compresslevel=9, mtime=0)
+        digest = hashlib.md5(self.body).hexdigest()
+        self.etag = '"{}"'.format(digest)
+        self.gzip_etag = '"{}-gzip"'.format(digest)
+
+    def response(self, request, cache_control=None):
+        """HttpResponse dengan conditional GET (304) dan body gzip jika client menerimanya."""
+        use_gzip = bool(GZIP_ACCEPTED_RE.search(request.META.get('HTTP_ACCEPT_ENCODING', '')))
+        etag = self.gzip_etag if use_gzip else self.etag
+
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = HttpResponse(self.gzip_body if use_gzip else self.body, content_type='application/json')
+            if use_gzip:
+                response['Content-Encoding'] = 'gzip'
+
+        response['ETag'] = etag
+        patch_vary_headers(response, ('Accept-Encoding',))
+        if cache_control:
+            patch_cache_control(response, **cache_control)
+
+        return response
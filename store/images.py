@@ -0,0 +1,167 @@
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.utils import timezone
+from PIL import Image, ImageOps, features
+
+from store.cache import CATALOG_VERSION, bump_version
+from store.models import Product
+
+
+# Varian gambar produk: (nama, ukuran maksimal (lebar, tinggi)). Gambar diperkecil
+# dengan rasio tetap, tidak pernah diperbesar. Setiap ukuran disimpan dalam JPEG
+# dan WebP pada field Product.image_<nama>_<format>.
+PRODUCT_IMAGE_SIZES = (
+    ('thumbnail', (160, 240)),
+    ('medium', (480, 720)),
+)
+
+PRODUCT_IMAGE_WIDTHS = {size: dimension[0] for size, dimension in PRODUCT_IMAGE_SIZES}
+
+PRODUCT_IMAGE_FORMATS = (
+    # (format Pillow, ekstensi, suffix field, opsi save)
+    ('JPEG', 'jpg', 'jpeg', {'quality': 82, 'optimize': True, 'progressive': True}),
+    ('WEBP', 'webp', 'webp', {'quality': 80, 'method': 4}),
+)
+
+VARIANTS_UPLOAD_TO = 'images/variants'
+
+
+def image_variant_field(size, suffix):
+    return 'image_{}_{}'.format(size, suffix)
+
+
+def image_variants(product, suffix):
+    """List (nama file, lebar maksimal) varian yang sudah tersedia untuk format `suffix`."""
+    variants = []
+    for size, (width, _) in PRODUCT_IMAGE_SIZES:
+        name = getattr(product, image_variant_field(size, suffix))
+        if name:
+            variants.append((getattr(name, 'name', name), width))
+    return variants
+
+
+def _open_image(name, draft_size=None):
+    with default_storage.open(name) as f:
+        return _load_image(f, draft_size)
+
+
+def _load_image(f, draft_size=None):
+    image = Image.open(f)
+    if draft_size:
+        # JPEG bisa langsung di-decode pada skala lebih kecil, memori tidak mengikuti resolusi asli
+        image.draft('RGB', draft_size)
+    image.load()
+
+    # foto dari kamera sering menyimpan orientasi di EXIF
+    image = ImageOps.exif_transpose(image)
+
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if image.mode in ('LA', 'PA', 'P') else 'RGB')
+    return image
+
+
+def _encode(image, image_format, options):
+    if image_format == 'JPEG' and image.mode == 'RGBA':
+        # JPEG tidak mendukung transparansi, latar belakang dibuat putih
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.split()[-1])
+        image = background
+
+    buffer = BytesIO()
+    image.save(buffer, image_format, **options)
+
+    return buffer.getvalue()
+
+
+def render_image_variants(name):
+    """
+    Membuat semua varian dari file gambar `name` di default storage dan
+    mengembalikan {field: nama file varian}. Tidak menyentuh database,
+    sehingga bisa dijalankan di process pool.
+    """
+    image = _open_image(name)
+    stem = os.path.splitext(os.path.basename(name))[0]
+    variants = {}
+
+    for size, dimension in PRODUCT_IMAGE_SIZES:
+        resized = image.copy()
+        resized.thumbnail(dimension, Image.LANCZOS)
+
+        for image_format, extension, suffix, options in PRODUCT_IMAGE_FORMATS:
+            if image_format == 'WEBP' and not features.check('webp'):
+                continue
+
+            path = '{}/{}-{}.{}'.format(VARIANTS_UPLOAD_TO, stem, size, extension)
+            variants[image_variant_field(size, suffix)] = default_storage.save(
+                path, ContentFile(_encode(resized, image_format, options))
+            )
+
+    return variants
+
+
+def save_image_variants(product_id, image_name, variants):
+    # diabaikan jika gambar produk sudah diganti lagi selama varian dibuat
+    updated = Product.objects.filter(pk=product_id, image=image_name) \
+        .update(updated_at=timezone.now(), **variants)
+
+    if not updated:
+        for path in variants.values():
+            default_storage.delete(path)
+    return updated
+
+
+def update_product_image_variants(product_id):
+    image_name = Product.objects.filter(pk=product_id).values_list('image', flat=True).first()
+    if not image_name:
+        return False
+
+    updated = save_image_variants(product_id, image_name, render_image_variants(image_name))
+    if updated:
+        bump_version(CATALOG_VERSION)
+    return bool(updated)
+
+
+def payment_proof_size_allowed(f):
+    """
+    Memastikan bukti pembayaran bisa diperkecil dengan memori terbatas, hanya dari
+    header gambar. JPEG di-decode langsung pada skala kecil (draft), format lain
+    di-decode pada resolusi penuh sehingga jumlah pixel-nya dibatasi
+    PAYMENT_PROOF_MAX_PIXELS.
+    """
+    try:
+        f.seek(0)
+        with Image.open(f) as image:
+            image_format, (width, height) = image.format, image.size
+    except (OSError, Image.DecompressionBombError):
+        return False
+    finally:
+        f.seek(0)
+
+    return image_format == 'JPEG' or width * height <= settings.PAYMENT_PROOF_MAX_PIXELS
+
+
+def downscale_payment_proof(f):
+    """
+    Memperkecil file upload bukti pembayaran yang melebihi PAYMENT_PROOF_MAX_DIMENSION
+    pixel menjadi JPEG. Mengembalikan ContentFile baru, atau None jika tidak perlu diperkecil.
+    Dipanggil sebelum file disimpan sehingga URL pada response langsung menunjuk ke file akhir.
+    """
+    max_dimension = settings.PAYMENT_PROOF_MAX_DIMENSION
+    if not max_dimension:
+        return None
+
+    f.seek(0)
+    with Image.open(f) as image:
+        if max(image.size) <= max_dimension:
+            return None
+
+    f.seek(0)
+    image = _load_image(f, draft_size=(max_dimension, max_dimension))
+    image.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+
+    stem = os.path.splitext(os.path.basename(f.name))[0]
+    return ContentFile(_encode(image, 'JPEG', {'quality': 85, 'optimize': True}), name='{}.jpg'.format(stem))
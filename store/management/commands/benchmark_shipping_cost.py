@@ -0,0 +1,71 @@
+import asyncio
+import time
+from collections import Counter
+
+import httpx
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark endpoint ongkir sync (WSGI) dan async (ASGI) pada server yang sedang berjalan, '
+        'dengan banyak request bersamaan. Contoh: jalankan `gunicorn app.wsgi -w 1` di port 8000 dan '
+        '`uvicorn app.asgi:application` di port 8001, lalu\n'
+        '  manage.py benchmark_shipping_cost --token <JWT> '
+        '--sync-url http://127.0.0.1:8000/api/shipping-cost '
+        '--async-url http://127.0.0.1:8001/api/async/shipping-cost\n'
+        'User pemilik token harus punya isi cart. Setiap request memakai destination berbeda '
+        '(mulai dari --destination) agar tidak dilayani dari cache ongkir.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--token', required=True, help='Access token JWT (POST /api/login).')
+        parser.add_argument('--sync-url', help='URL endpoint sync, misalnya http://127.0.0.1:8000/api/shipping-cost.')
+        parser.add_argument('--async-url', help='URL endpoint async, misalnya http://127.0.0.1:8001/api/async/shipping-cost.')
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--concurrency', type=int, default=50)
+        parser.add_argument('--courier', default='jne')
+        parser.add_argument('--destination', type=int, default=1, help='Id kota tujuan pertama.')
+        parser.add_argument('--timeout', type=float, default=60)
+
+    def handle(self, *args, **options):
+        urls = [('sync', options['sync_url']), ('async', options['async_url'])]
+        urls = [(label, url) for label, url in urls if url]
+        if not urls:
+            raise CommandError('Isi --sync-url dan/atau --async-url.')
+
+        for label, url in urls:
+            elapsed, latencies, statuses = asyncio.run(self.benchmark(url, options))
+            latencies.sort()
+            self.stdout.write(
+                '{}: {} request ({} bersamaan) dalam {:.2f} detik, {:.1f} request/detik, '
+                'p50 {:.0f} ms, p95 {:.0f} ms, status {}'.format(
+                    label, len(latencies), options['concurrency'], elapsed, len(latencies) / elapsed,
+                    latencies[len(latencies) // 2] * 1000, latencies[int(len(latencies) * 0.95)] * 1000,
+                    dict(statuses)
+                )
+            )
+
+    async def benchmark(self, url, options):
+        semaphore = asyncio.Semaphore(options['concurrency'])
+        headers = {'Authorization': 'Bearer {}'.format(options['token'])}
+        latencies, statuses = [], Counter()
+
+        async def request(client, destination):
+            async with semaphore:
+                started_at = time.monotonic()
+                try:
+                    response = await client.post(url, json={'destination': destination, 'courier': options['courier']})
+                    statuses[response.status_code] += 1
+                except httpx.HTTPError as e:
+                    statuses[type(e).__name__] += 1
+                latencies.append(time.monotonic() - started_at)
+
+        limits = httpx.Limits(max_connections=options['concurrency'])
+        async with httpx.AsyncClient(headers=headers, limits=limits, timeout=options['timeout']) as client:
+            started_at = time.monotonic()
+            await asyncio.gather(*[
+                request(client, options['destination'] + i) for i in range(options['requests'])
+            ])
+
+        return time.monotonic() - started_at, latencies, statuses
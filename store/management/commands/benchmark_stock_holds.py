@@ -0,0 +1,97 @@
+import threading
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection
+
+from store.models import Cart, Product, StockHold
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark hold stok (StockHold.objects.hold) dan checkout (Product.objects.decrement_stock) '
+        'dengan banyak thread yang berebut satu produk, lalu memastikan stok tidak oversell. '
+        'Data diisi ke database test sementara yang dihapus setelah selesai.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=16, help='Jumlah thread.')
+        parser.add_argument('--buyers', type=int, default=500, help='Jumlah pembeli (satu baris cart per pembeli).')
+        parser.add_argument('--stock', type=int, default=100, help='Stok produk yang diperebutkan.')
+
+    def handle(self, *args, **options):
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            self.run(options['workers'], options['buyers'], options['stock'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def run(self, workers, buyers, stock):
+        Product.objects.bulk_create([
+            Product(name='Benchmark', slug='benchmark', description='benchmark', stock=stock,
+                    weight=1, price=1000, image='images/benchmark.jpg')
+        ])
+        product = Product.objects.get(slug='benchmark')
+        User.objects.bulk_create([User(username='benchmark-{}'.format(i)) for i in range(buyers)])
+        Cart.objects.bulk_create([
+            Cart(user=user, product=product, quantity=1) for user in User.objects.filter(username__startswith='benchmark-')
+        ])
+        carts = list(Cart.objects.all())
+        expected = min(buyers, stock)
+
+        held, retries, elapsed = self.benchmark(workers, StockHold.objects.hold, [(cart,) for cart in carts])
+        self.report('hold', buyers, held, retries, elapsed)
+        if held != expected or StockHold.objects.count() != expected:
+            raise CommandError('Oversell pada hold: {} hold untuk stok {}.'.format(StockHold.objects.count(), stock))
+
+        # checkout setiap pembeli dengan holdnya sendiri tidak dibatasi hold pembeli lain
+        StockHold.objects.all().delete()
+        sold, retries, elapsed = self.benchmark(
+            workers, Product.objects.decrement_stock, [({product.pk: 1},)] * buyers
+        )
+        self.report('decrement_stock', buyers, sold, retries, elapsed)
+        product.refresh_from_db()
+        if sold != expected or product.stock != stock - expected:
+            raise CommandError('Oversell pada checkout: {} terjual, sisa stok {}.'.format(sold, product.stock))
+
+    def benchmark(self, workers, func, args_list):
+        """Mengembalikan (jumlah berhasil, jumlah retry karena lock/deadlock, detik)."""
+        pending = iter(args_list)
+        lock = threading.Lock()
+        results, retries = [], []
+
+        def worker():
+            try:
+                while True:
+                    with lock:
+                        args = next(pending, None)
+                    if args is None:
+                        return
+
+                    while True:
+                        try:
+                            results.append(func(*args))
+                            break
+                        except OperationalError:
+                            retries.append(1)
+                            time.sleep(0.001)
+            finally:
+                # koneksi per thread harus ditutup sebelum database test dihapus
+                connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(workers)]
+        started_at = time.monotonic()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.monotonic() - started_at
+
+        return results.count(True), len(retries), elapsed
+
+    def report(self, label, calls, succeeded, retries, elapsed):
+        self.stdout.write('{}: {} panggilan dalam {:.2f} detik ({} /detik), {} berhasil, {} retry.'.format(
+            label, calls, elapsed, int(calls / elapsed) if elapsed else 0, succeeded, retries
+        ))
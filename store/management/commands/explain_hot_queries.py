@@ -0,0 +1,187 @@
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import RequestFactory
+from rest_framework.request import Request
+
+from store.api.pagination import KeysetPagination
+from store.api.views import OrderView, ProductListView
+from store.models import Product, ProductSearchToken, Order, Cart, City, State
+
+
+class Command(BaseCommand):
+    help = 'Menjalankan EXPLAIN pada query utama setiap endpoint dan memastikan query tersebut memakai index.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--seed', type=int, default=0,
+            help=(
+                'Isi data contoh sebanyak N baris per tabel sebelum EXPLAIN. Data diisi ke database '
+                'test sementara (seperti `manage.py test`) yang dihapus setelah selesai.'
+            )
+        )
+
+    def handle(self, *args, **options):
+        if not options['seed']:
+            return self.run_checks()
+
+        # ANALYZE TABLE di MySQL melakukan commit implisit, sehingga data contoh tidak bisa
+        # di-rollback; karena itu data diisi ke database sementara, bukan database utama
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            self.seed(options['seed'])
+            self.run_checks()
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def run_checks(self):
+        failures = []
+
+        for label, queryset, table, columns in self.get_checks():
+            plan = queryset.explain()
+            index = self.find_index(table, columns, plan)
+
+            if index:
+                self.stdout.write(self.style.SUCCESS('OK    {} ({})'.format(label, index)))
+            else:
+                failures.append(label)
+                self.stdout.write(self.style.ERROR('FAIL  {}'.format(label)))
+                self.stdout.write('      ' + plan.replace('\n', '\n      '))
+
+        if failures:
+            raise CommandError('{} query tidak memakai index.'.format(len(failures)))
+
+    def make_request(self, user, params=None):
+        request = Request(RequestFactory().get('/', params or {}))
+        # tanpa authentication class, user dipasang langsung
+        request.user = user
+        return request
+
+    def endpoint_queryset(self, view_class, user, params=None):
+        """Queryset yang dibangun endpoint sendiri (get_queryset + filter backend)."""
+        view = view_class(request=self.make_request(user, params), args=(), kwargs={}, format_kwarg=None)
+        return view, view.filter_queryset(view.get_queryset())
+
+    def keyset_page(self, view, queryset):
+        """Query halaman kedua mode ?pagination=cursor (seek dari baris pertama)."""
+        paginator = KeysetPagination()
+        paginator.ordering = paginator.get_ordering(view.request, queryset, view)
+        queryset = queryset.order_by(*paginator.ordering)
+
+        first = queryset.first()
+        if first is None:
+            return None
+
+        position = paginator._get_position_from_instance(first, paginator.ordering)
+        return queryset.filter(paginator._seek_filter(position, False))[:paginator.page_size]
+
+    def get_checks(self):
+        user = User.objects.order_by('pk').first() or User(pk=0)
+        staff = User(is_active=True, is_staff=True, is_superuser=True)
+        product = Product.objects.order_by('pk').first()
+        page_size = settings.REST_FRAMEWORK['PAGE_SIZE']
+        order_admin = admin.site._registry[Order]
+
+        view, products = self.endpoint_queryset(ProductListView, user)
+        checks = [
+            ('GET /api/product', products[:page_size], Product, ('created_at',)),
+        ]
+
+        view, products = self.endpoint_queryset(ProductListView, user, {'ordering': 'price'})
+        checks.append(('GET /api/product?ordering=price', products[:page_size], Product, ('price',)))
+
+        view, products = self.endpoint_queryset(ProductListView, user, {'ordering': 'price', 'pagination': 'cursor'})
+        page = self.keyset_page(view, products)
+        if page is not None:
+            checks.append(('GET /api/product?ordering=price&pagination=cursor (seek)', page, Product, ('price',)))
+
+        view, products = self.endpoint_queryset(ProductListView, user, {'search': 'seed'})
+        checks.append(('GET /api/product?search=', products[:page_size], ProductSearchToken, ('term',)))
+
+        # query ini di-GROUP BY untuk annotate total item, planner bisa memilih index (user_id)
+        # atau (user_id, created_at) tergantung statistik; yang dicek adalah tidak ada full scan
+        view, orders = self.endpoint_queryset(OrderView, user)
+        checks.append(('GET /api/order', orders[:page_size], Order, ('user_id',)))
+
+        checks.append(('POST /api/cart (lookup user, product)',
+                       Cart.objects.filter(user=user, product=product), Cart, ('user_id', 'product_id')))
+
+        orders, _ = order_admin.get_search_results(self.make_request(staff), Order.objects.all(), 'INV00001')
+        checks.append(('OrderAdmin search invoice_number', orders, Order, ('invoice_number',)))
+
+        if connection.vendor == 'mysql':
+            # prefix LIKE hanya bisa memakai index dengan collation case-insensitive (MySQL)
+            orders, _ = order_admin.get_search_results(self.make_request(staff), Order.objects.all(), 'Seed')
+            checks.append(('OrderAdmin search customer_name', orders, Order, ('customer_name',)))
+
+        request = RequestFactory().get('/', {'status__exact': Order.PENDING_STATUS})
+        request.user = staff
+        changelist = order_admin.get_changelist_instance(request)
+        checks.append(('OrderAdmin filter status', changelist.queryset[:changelist.list_per_page],
+                       Order, ('status', 'created_at')))
+
+        return [(label, queryset, model._meta.db_table, columns) for label, queryset, model, columns in checks]
+
+    def find_index(self, table, columns, plan):
+        for name, index_columns in self.get_indexes(table):
+            if tuple(index_columns[:len(columns)]) == columns and name in plan:
+                return name
+
+        return None
+
+    def get_indexes(self, table):
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, table)
+            indexes = [
+                (name, constraint['columns']) for name, constraint in constraints.items()
+                if constraint['index'] or constraint['unique']
+            ]
+
+            if connection.vendor == 'sqlite':
+                # unique constraint di SQLite dibuat sebagai "sqlite_autoindex_*"
+                # yang tidak ikut dilaporkan oleh introspection Django
+                cursor.execute('PRAGMA index_list({})'.format(connection.ops.quote_name(table)))
+                for row in cursor.fetchall():
+                    name = row[1]
+                    cursor.execute('PRAGMA index_info({})'.format(connection.ops.quote_name(name)))
+                    indexes.append((name, [info[2] for info in cursor.fetchall()]))
+
+        return indexes
+
+    def seed(self, size):
+        state = State.objects.create(name='Seed')
+        city = City.objects.create(name='Seed', state=state)
+        User.objects.bulk_create([User(username='explain-seed-{}'.format(i)) for i in range(10)])
+        users = list(User.objects.filter(username__startswith='explain-seed-'))
+
+        Product.objects.bulk_create([
+            Product(name='Seed {}'.format(i), slug='seed-{}'.format(i), description='seed', stock=i,
+                    weight=1, price=1000 + i, image='images/seed.jpg')
+            for i in range(size)
+        ])
+        ProductSearchToken.objects.index_products(Product.objects.all())
+        products = list(Product.objects.filter(slug__startswith='seed-')[:len(users)])
+
+        Order.objects.bulk_create([
+            Order(invoice_number='SEED{:07d}'.format(i), user=users[i % len(users)], payment_method=Order.MANUAL_PAYMENT,
+                  shipping_courier=Order.JNE_COURIER, shipping_service='REG', customer_name='Seed',
+                  customer_phone='0', customer_address='Seed', customer_city=city, customer_state=state,
+                  status=i % len(Order.STATUS_CHOICES), sub_total=0, total_shipping=0, total=0)
+            for i in range(size)
+        ])
+        Cart.objects.bulk_create([
+            Cart(user=user, product=product, quantity=1) for user in users for product in products
+        ])
+
+        # perbarui statistik tabel agar query planner melihat data contoh
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                cursor.execute('ANALYZE')
+            else:
+                for model in (Product, ProductSearchToken, Order, Cart):
+                    table = connection.ops.quote_name(model._meta.db_table)
+                    statement = 'ANALYZE {}' if connection.vendor == 'postgresql' else 'ANALYZE TABLE {}'
+                    cursor.execute(statement.format(table))
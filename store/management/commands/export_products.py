@@ -0,0 +1,72 @@
+import csv
+import json
+import sys
+import time
+from itertools import islice
+
+from django.core.management.base import BaseCommand
+
+from store.models import Category, Product
+
+from .import_products import CATEGORY_SEPARATOR, FORMATS, PRODUCT_COLUMNS, detect_format
+
+
+class Command(BaseCommand):
+    help = (
+        'Export semua produk ke file CSV atau JSONL. Produk dibaca per chunk dengan '
+        'iterator() sehingga memori tidak bertambah mengikuti jumlah produk.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File CSV/JSONL, atau - untuk stdout.')
+        parser.add_argument('--format', choices=FORMATS, help='Default: dari ekstensi file.')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = detect_format(path, options['format'])
+        chunk_size = options['chunk_size']
+
+        category_names = dict(Category.objects.values_list('pk', 'name'))
+        products = Product.objects.order_by('pk') \
+            .values_list('pk', *PRODUCT_COLUMNS[:-1]) \
+            .iterator(chunk_size=chunk_size)
+
+        started_at = time.monotonic()
+        rows = 0
+
+        f = sys.stdout if path == '-' else open(path, 'w', encoding='utf-8', newline='')
+        try:
+            writer = csv.writer(f) if file_format == 'csv' else None
+            if writer:
+                writer.writerow(PRODUCT_COLUMNS)
+
+            while True:
+                chunk = list(islice(products, chunk_size))
+                if not chunk:
+                    break
+
+                # kategori per chunk dalam satu query (prefetch_related tidak berlaku untuk iterator())
+                categories = {}
+                for product_id, category_id in Product.categories.through.objects \
+                        .filter(product_id__in=[row[0] for row in chunk]) \
+                        .order_by('pk').values_list('product_id', 'category_id'):
+                    categories.setdefault(product_id, []).append(category_names[category_id])
+
+                for pk, *values in chunk:
+                    names = categories.get(pk, [])
+                    if writer:
+                        writer.writerow(values + [CATEGORY_SEPARATOR.join(names)])
+                    else:
+                        f.write(json.dumps(dict(zip(PRODUCT_COLUMNS, values + [names])), ensure_ascii=False))
+                        f.write('\n')
+
+                rows += len(chunk)
+        finally:
+            if f is not sys.stdout:
+                f.close()
+
+        elapsed = time.monotonic() - started_at
+        self.stderr.write(self.style.SUCCESS('{} produk diekspor dalam {:.2f} detik ({} baris/detik).'.format(
+            rows, elapsed, int(rows / elapsed) if elapsed else 0
+        )))
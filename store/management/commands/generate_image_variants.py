@@ -0,0 +1,57 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from store.cache import CATALOG_VERSION, bump_version
+from store.images import render_image_variants, save_image_variants
+from store.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Membuat thumbnail dan varian gambar produk secara paralel dengan process pool.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count())
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Buat ulang varian untuk semua produk, bukan hanya yang belum punya varian.'
+        )
+
+    def handle(self, *args, **options):
+        queryset = Product.objects.exclude(image='')
+        if not options['all']:
+            queryset = queryset.filter(image_thumbnail_jpeg='')
+        products = list(queryset.order_by('pk').values_list('pk', 'image'))
+
+        # koneksi database tidak boleh ikut terbagi ke proses anak
+        connections.close_all()
+
+        started_at = time.monotonic()
+        processed, failed = 0, 0
+
+        # proses anak hanya mengolah file gambar, update database dilakukan di proses ini
+        with ProcessPoolExecutor(max_workers=options['workers'], initializer=django.setup) as pool:
+            futures = {pool.submit(render_image_variants, image): (pk, image) for pk, image in products}
+
+            for future in as_completed(futures):
+                pk, image = futures[future]
+                try:
+                    variants = future.result()
+                except Exception as e:
+                    failed += 1
+                    self.stderr.write('Gagal membuat varian gambar produk {} ({}): {}'.format(pk, image, e))
+                    continue
+
+                if save_image_variants(pk, image, variants):
+                    processed += 1
+
+        if processed:
+            bump_version(CATALOG_VERSION)
+
+        self.stdout.write('{} gambar diproses, {} gagal dalam {:.2f} detik.'.format(
+            processed, failed, time.monotonic() - started_at
+        ))
@@ -0,0 +1,264 @@
+import csv
+import json
+import sys
+import time
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.text import slugify
+
+from store.cache import CATALOG_VERSION, bump_version
+from store.models import Category, Product, ProductSearchToken
+from store.reference_data import categories_cache
+
+
+# kolom file import/export; `categories` berisi nama kategori dipisah CATEGORY_SEPARATOR
+# (CSV) atau list nama (JSONL). Produk dicocokkan berdasarkan slug dari `name`.
+PRODUCT_COLUMNS = ('name', 'description', 'stock', 'weight', 'price', 'image', 'categories')
+PRODUCT_FIELDS = ('name', 'description', 'stock', 'weight', 'price', 'image')
+CATEGORY_SEPARATOR = '|'
+FORMATS = ('csv', 'jsonl')
+
+
+def detect_format(path, file_format):
+    if file_format:
+        return file_format
+    if path.endswith('.jsonl'):
+        return 'jsonl'
+    if path.endswith('.csv'):
+        return 'csv'
+    raise CommandError('Format file tidak dikenali, gunakan --format.')
+
+
+def update_rows(model, instances, fields):
+    """
+    UPDATE per baris berdasarkan pk dengan satu executemany. bulk_update() membangun
+    CASE WHEN untuk setiap baris dan field, yang lambat untuk batch besar.
+    """
+    if not instances:
+        return
+
+    quote_name = connection.ops.quote_name
+    fields = [model._meta.get_field(name) for name in fields]
+    sql = 'UPDATE {} SET {} WHERE {} = %s'.format(
+        quote_name(model._meta.db_table),
+        ', '.join('{} = %s'.format(quote_name(field.column)) for field in fields),
+        quote_name(model._meta.pk.column),
+    )
+    params = [
+        [field.get_db_prep_save(getattr(instance, field.attname), connection) for field in fields] + [instance.pk]
+        for instance in instances
+    ]
+
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, params)
+
+
+def read_rows(f, file_format):
+    """
+    Menghasilkan (nomor baris, row). Baris JSONL yang rusak menghasilkan ValidationError
+    sebagai row, sehingga bisa dilaporkan dan dilewati tanpa menghentikan import.
+    """
+    if file_format == 'csv':
+        reader = csv.DictReader(f)
+        for row in reader:
+            yield reader.line_num, row
+        return
+
+    for line_number, line in enumerate(f, start=1):
+        if not line.strip():
+            continue
+
+        try:
+            row = json.loads(line.rstrip('\r\n'))
+        except json.JSONDecodeError as e:
+            row = ValidationError('JSON tidak valid: {} (kolom {}).'.format(e.msg, e.colno))
+        else:
+            if not isinstance(row, dict):
+                row = ValidationError('Baris harus berupa objek JSON.')
+        yield line_number, row
+
+
+class Command(BaseCommand):
+    help = (
+        'Import produk dari file CSV atau JSONL secara bertahap (batch). Produk dengan '
+        'slug yang sama diperbarui, selain itu dibuat baru.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File CSV/JSONL, atau - untuk stdin.')
+        parser.add_argument('--format', choices=FORMATS, help='Default: dari ekstensi file.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = detect_format(path, options['format'])
+        batch_size = options['batch_size']
+
+        # nama kategori -> id, dibangun sekali di awal
+        self.category_ids = {name.lower(): pk for pk, name in Category.objects.values_list('pk', 'name')}
+        self.categories_created = 0
+        self.images_changed = 0
+
+        started_at = time.monotonic()
+        rows, created, updated, failed = 0, 0, 0, 0
+        batch = {}
+
+        f = sys.stdin if path == '-' else open(path, encoding='utf-8', newline='')
+        try:
+            for line, row in read_rows(f, file_format):
+                try:
+                    if isinstance(row, ValidationError):
+                        raise row
+                    values, categories = self.clean_row(row)
+                except ValidationError as e:
+                    failed += 1
+                    self.stderr.write('Baris {} dilewati: {}'.format(line, '; '.join(e.messages)))
+                    continue
+
+                rows += 1
+                # slug yang sama dalam satu batch: baris terakhir yang dipakai
+                batch[values['slug']] = (values, categories)
+
+                if len(batch) >= batch_size:
+                    result = self.upsert(batch)
+                    created, updated = created + result[0], updated + result[1]
+                    batch = {}
+
+            if batch:
+                result = self.upsert(batch)
+                created, updated = created + result[0], updated + result[1]
+        finally:
+            if f is not sys.stdin:
+                f.close()
+
+        # bulk insert/update tidak mengirim signal
+        if self.categories_created:
+            categories_cache.invalidate()
+        if created or updated:
+            bump_version(CATALOG_VERSION)
+
+        elapsed = time.monotonic() - started_at
+        self.stdout.write(self.style.SUCCESS(
+            '{} baris diproses dalam {:.2f} detik ({} baris/detik): {} dibuat, {} diubah, {} gagal, '
+            '{} kategori baru.'.format(
+                rows, elapsed, int(rows / elapsed) if elapsed else 0,
+                created, updated, failed, self.categories_created
+            )
+        ))
+        if self.images_changed:
+            self.stdout.write('{} gambar produk berubah, jalankan generate_image_variants untuk membuat thumbnail.'.format(
+                self.images_changed
+            ))
+
+    def clean_row(self, row):
+        values = {}
+        for name in PRODUCT_FIELDS:
+            if name == 'image':
+                # kosong: gambar produk yang sudah ada tidak diubah
+                if row.get(name):
+                    values[name] = row[name]
+                continue
+            values[name] = Product._meta.get_field(name).clean(row.get(name), None)
+
+        values['slug'] = slugify(values['name'])
+
+        categories = row.get('categories')
+        if categories is None:
+            # kolom tidak ada: kategori produk yang sudah ada tidak diubah
+            return values, None
+        if isinstance(categories, str):
+            categories = categories.split(CATEGORY_SEPARATOR)
+        if not isinstance(categories, list) or not all(isinstance(name, str) for name in categories):
+            raise ValidationError('categories harus berupa list nama kategori.')
+
+        return values, [name.strip() for name in categories if name.strip()]
+
+    def resolve_categories(self, names):
+        """Mengembalikan id kategori untuk `names`, kategori yang belum ada dibuat."""
+        missing = {name.lower(): name for name in names if name.lower() not in self.category_ids}
+
+        if missing:
+            Category.objects.bulk_create([Category(name=name) for name in missing.values()])
+            # bulk_create tidak mengembalikan pk di semua database, ambil ulang berdasarkan nama
+            for pk, name in Category.objects.filter(name__in=missing.values()).values_list('pk', 'name'):
+                self.category_ids.setdefault(name.lower(), pk)
+            self.categories_created += len(missing)
+
+        return list(dict.fromkeys(self.category_ids[name.lower()] for name in names))
+
+    @transaction.atomic
+    def upsert(self, batch):
+        now = timezone.now()
+        existing = {}
+        for row in Product.objects.filter(slug__in=batch).order_by('pk').values_list('pk', 'slug', *PRODUCT_FIELDS):
+            existing.setdefault(row[1], (row[0], dict(zip(PRODUCT_FIELDS, row[2:]))))
+
+        existing_categories = {}
+        for product_id, category_id in Product.categories.through.objects \
+                .filter(product_id__in=[pk for pk, _ in existing.values()]).values_list('product_id', 'category_id'):
+            existing_categories.setdefault(product_id, set()).add(category_id)
+
+        new, changed, categories_changed, reindex = [], [], [], []
+        # produk yang diubah dikelompokkan berdasarkan field yang di-update
+        changed_fields = {}
+        for slug, (values, categories) in batch.items():
+            if slug not in existing:
+                product = Product(**values)
+                new.append(product)
+                self.images_changed += bool(product.image)
+                categories_changed.append(product)
+                reindex.append(product)
+                continue
+
+            pk, current = existing[slug]
+            product = Product(pk=pk, updated_at=now, **values)
+
+            if categories is not None \
+                    and set(self.resolve_categories(categories)) != existing_categories.get(pk, set()):
+                categories_changed.append(product)
+
+            # perubahan kategori saja tetap memperbarui updated_at (dipakai ETag daftar produk)
+            fields = [name for name in PRODUCT_FIELDS if name in values and values[name] != current[name]]
+            if not fields and categories_changed[-1:] != [product]:
+                continue
+
+            if 'image' in fields:
+                # varian lama tidak dipakai lagi, dibuat ulang oleh generate_image_variants
+                fields.extend(Product.IMAGE_VARIANT_FIELDS)
+                self.images_changed += 1
+
+            changed.append(product)
+            if 'name' in fields or 'description' in fields:
+                reindex.append(product)
+            changed_fields.setdefault(tuple(fields) + ('updated_at',), []).append(product)
+
+        Product.objects.bulk_create(new)
+        for fields, products in changed_fields.items():
+            update_rows(Product, products, fields)
+
+        # pk produk baru diambil ulang berdasarkan slug
+        new_ids = dict(Product.objects.filter(slug__in=[product.slug for product in new]).values_list('slug', 'pk'))
+        for product in new:
+            product.pk = new_ids[product.slug]
+
+        self.update_categories(categories_changed, batch)
+        # hanya produk baru dan yang nama/deskripsinya berubah yang diindeks ulang
+        ProductSearchToken.objects.index_products(reindex)
+
+        return len(new), len(changed)
+
+    def update_categories(self, products, batch):
+        products = [product for product in products if batch[product.slug][1] is not None]
+        if not products:
+            return
+
+        through = Product.categories.through
+        through.objects.filter(product_id__in=[product.pk for product in products]).delete()
+        through.objects.bulk_create([
+            through(product_id=product.pk, category_id=category_id)
+            for product in products
+            for category_id in self.resolve_categories(batch[product.slug][1])
+        ])
@@ -0,0 +1,166 @@
+import json
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+
+from store.reference_data import locations_cache, shop_cache
+
+
+# urutan file mengikuti foreign key: kota butuh provinsi, toko butuh kota
+DEFAULT_FIXTURES = ('data/states.json', 'data/cities.json', 'data/shop.json')
+
+
+def iter_fixture(path, chunk_size=64 * 1024):
+    """
+    Membaca fixture JSON (array objek) secara bertahap dan menghasilkan objeknya
+    satu per satu, tanpa memuat seluruh file ke memori.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    started = False
+
+    with open(path, encoding='utf-8') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            buffer += chunk
+
+            while True:
+                buffer = buffer.lstrip()
+                if not started:
+                    if not buffer:
+                        break
+                    if buffer[0] != '[':
+                        raise CommandError('{} bukan array JSON.'.format(path))
+                    buffer = buffer[1:]
+                    started = True
+                    continue
+
+                buffer = buffer.lstrip(',').lstrip()
+                if not buffer or buffer[0] == ']':
+                    break
+
+                try:
+                    item, end = decoder.raw_decode(buffer)
+                except ValueError:
+                    # objek terpotong di akhir chunk, tunggu chunk berikutnya
+                    if not chunk:
+                        raise CommandError('{} tidak lengkap atau rusak.'.format(path))
+                    break
+
+                buffer = buffer[end:]
+                yield item
+
+            if not chunk:
+                return
+
+
+class Command(BaseCommand):
+    help = (
+        'Memuat data referensi (provinsi, kota, toko) dari fixture JSON secara cepat '
+        'dengan bulk insert/update. Bisa dijalankan berulang kali.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'fixtures', nargs='*', default=DEFAULT_FIXTURES,
+            help='File fixture, relatif terhadap BASE_DIR. Default: {}.'.format(' '.join(DEFAULT_FIXTURES))
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        started_at = time.monotonic()
+        models = []
+        total = 0
+
+        with transaction.atomic():
+            for fixture in options['fixtures']:
+                path = settings.BASE_DIR / fixture
+                fixture_started_at = time.monotonic()
+
+                rows, created, updated, loaded_models = self.load_fixture(path, options['batch_size'])
+                models.extend(model for model in loaded_models if model not in models)
+                total += rows
+
+                elapsed = time.monotonic() - fixture_started_at
+                self.stdout.write('{}: {} baris, {} dibuat, {} diubah ({} baris/detik).'.format(
+                    fixture, rows, created, updated, int(rows / elapsed) if elapsed else 0
+                ))
+
+            # pk diisi dari fixture, sequence (PostgreSQL, Oracle) harus disesuaikan
+            sequence_sql = connection.ops.sequence_reset_sql(no_style(), models)
+            if sequence_sql:
+                with connection.cursor() as cursor:
+                    for sql in sequence_sql:
+                        cursor.execute(sql)
+
+        # bulk insert/update tidak mengirim signal
+        locations_cache.invalidate()
+        shop_cache.invalidate()
+
+        elapsed = time.monotonic() - started_at
+        self.stdout.write(self.style.SUCCESS('{} baris diproses dalam {:.3f} detik ({} baris/detik).'.format(
+            total, elapsed, int(total / elapsed) if elapsed else 0
+        )))
+
+    def load_fixture(self, path, batch_size):
+        rows, created, updated = 0, 0, 0
+        models = []
+        batches = {}
+
+        for item in iter_fixture(path):
+            model = apps.get_model(item['model'])
+            if model not in models:
+                models.append(model)
+
+            batch = batches.setdefault(model, [])
+            batch.append(self.build_instance(model, item))
+            rows += 1
+
+            if len(batch) >= batch_size:
+                result = self.upsert(model, batch)
+                created, updated = created + result[0], updated + result[1]
+                batch.clear()
+
+        for model, batch in batches.items():
+            if batch:
+                result = self.upsert(model, batch)
+                created, updated = created + result[0], updated + result[1]
+
+        return rows, created, updated, models
+
+    def build_instance(self, model, item):
+        values = {}
+        for name, value in item['fields'].items():
+            # foreign key pada fixture berupa pk, disimpan langsung ke <field>_id
+            values[model._meta.get_field(name).attname] = value
+
+        return model(pk=item['pk'], **values)
+
+    def upsert(self, model, instances):
+        """
+        Insert baris baru dan update baris yang isinya berbeda berdasarkan pk.
+        Baris yang sudah sama dilewati, sehingga pemanggilan ulang tidak menulis apa pun.
+        """
+        fields = [field.attname for field in model._meta.concrete_fields if not field.primary_key]
+        existing = {
+            row[0]: row[1:]
+            for row in model.objects.filter(pk__in=[instance.pk for instance in instances]).values_list('pk', *fields)
+        }
+
+        new, changed = [], []
+        for instance in instances:
+            values = tuple(getattr(instance, field) for field in fields)
+            if instance.pk not in existing:
+                new.append(instance)
+            elif existing[instance.pk] != values:
+                changed.append(instance)
+
+        model.objects.bulk_create(new)
+        if changed:
+            model.objects.bulk_update(changed, fields)
+
+        return len(new), len(changed)
@@ -0,0 +1,32 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from store.tasks import pending_payment_token_ids, fetch_payment_token, run_task
+
+
+class Command(BaseCommand):
+    help = 'Worker pengambil token pembayaran Midtrans untuk order online yang masih pending.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument(
+            '--interval', type=int, default=0,
+            help='Jalankan terus-menerus dengan jeda N detik antar putaran.'
+        )
+
+    def handle(self, *args, **options):
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            while True:
+                order_ids = pending_payment_token_ids(limit=options['batch_size'])
+                list(pool.map(lambda order_id: run_task(fetch_payment_token, order_id), order_ids))
+
+                if order_ids:
+                    self.stdout.write('{} order diproses.'.format(len(order_ids)))
+
+                if not options['interval']:
+                    break
+                if not order_ids:
+                    time.sleep(options['interval'])
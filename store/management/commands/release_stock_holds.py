@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from store.models import StockHold
+
+
+class Command(BaseCommand):
+    help = 'Menghapus hold stok cart yang sudah kedaluwarsa secara bertahap (batch).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--interval', type=int, default=0,
+            help='Jalankan terus-menerus dengan jeda N detik antar putaran.'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            released = StockHold.objects.release_expired(batch_size=options['batch_size'])
+            self.stdout.write('{} hold kedaluwarsa dilepas.'.format(released))
+
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
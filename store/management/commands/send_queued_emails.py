@@ -0,0 +1,42 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from store.tasks import pending_email_ids, send_queued_emails, email_outbox_stats
+
+
+class Command(BaseCommand):
+    help = 'Worker pengirim email dari tabel email_outbox, dengan retry dan backoff.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50)
+        parser.add_argument(
+            '--interval', type=int, default=0,
+            help='Jalankan terus-menerus dengan jeda N detik antar putaran.'
+        )
+        parser.add_argument('--stats', action='store_true', help='Hanya tampilkan metrik antrean.')
+
+    def handle(self, *args, **options):
+        if options['stats']:
+            self.write_stats()
+            return
+
+        while True:
+            outbox_ids = pending_email_ids(limit=options['batch_size'])
+
+            if outbox_ids:
+                started = time.monotonic()
+                sent, failed = send_queued_emails(outbox_ids)
+                self.stdout.write('{} terkirim, {} gagal dalam {:.2f} detik.'.format(
+                    sent, failed, time.monotonic() - started
+                ))
+                self.write_stats()
+
+            if not options['interval']:
+                break
+            if not outbox_ids:
+                time.sleep(options['interval'])
+
+    def write_stats(self):
+        stats = email_outbox_stats()
+        self.stdout.write('queue_depth={depth} oldest_age_seconds={oldest_age:.0f} failed={failed}'.format(**stats))
@@ -0,0 +1,72 @@
+# Generated by Django 3.2.4 on 2026-10-19 01:04
+
+import re
+from collections import Counter
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+# salinan tokenizer store.helpers.product_search_terms saat migration ini dibuat,
+# agar menjalankan ulang migration selalu menghasilkan index yang sama
+SEARCH_TERM_MAX_LENGTH = 50
+SEARCH_NAME_WEIGHT = 3
+
+_search_token_re = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize_search_text(text):
+    if not text:
+        return []
+
+    return [token[:SEARCH_TERM_MAX_LENGTH] for token in _search_token_re.findall(text.lower())]
+
+
+def product_search_terms(name, description):
+    terms = Counter()
+    for token in tokenize_search_text(name):
+        terms[token] += SEARCH_NAME_WEIGHT
+    for token in tokenize_search_text(description):
+        terms[token] += 1
+
+    return terms
+
+
+def build_search_index(apps, schema_editor):
+    Product = apps.get_model('store', 'Product')
+    ProductSearchToken = apps.get_model('store', 'ProductSearchToken')
+
+    tokens = []
+    for product in Product.objects.only('id', 'name', 'description').iterator(chunk_size=1000):
+        for term, weight in product_search_terms(product.name, product.description).items():
+            tokens.append(ProductSearchToken(product_id=product.id, term=term, weight=weight))
+
+        if len(tokens) >= 1000:
+            ProductSearchToken.objects.bulk_create(tokens)
+            tokens = []
+
+    ProductSearchToken.objects.bulk_create(tokens)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0006_auto_20211031_1137'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductSearchToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=50)),
+                ('weight', models.PositiveIntegerField(default=1)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_tokens', to='store.product')),
+            ],
+            options={
+                'db_table': 'product_search_tokens',
+                'unique_together': {('term', 'product')},
+            },
+        ),
+        migrations.RunPython(build_search_index, migrations.RunPython.noop),
+    ]
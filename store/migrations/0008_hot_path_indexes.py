@@ -0,0 +1,52 @@
+# Generated by Django 3.2.4 on 2026-10-19 01:20
+
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+
+def merge_duplicate_carts(apps, schema_editor):
+    # gabungkan baris cart ganda (user, product) sebelum unique constraint dibuat
+    Cart = apps.get_model('store', 'Cart')
+
+    duplicates = Cart.objects.filter(user__isnull=False, product__isnull=False) \
+        .values('user', 'product') \
+        .annotate(rows=Count('id'), first_id=Min('id'), quantity=Sum('quantity')) \
+        .filter(rows__gt=1)
+
+    for duplicate in duplicates:
+        Cart.objects.filter(id=duplicate['first_id']).update(quantity=duplicate['quantity'])
+        Cart.objects.filter(user=duplicate['user'], product=duplicate['product']) \
+            .exclude(id=duplicate['first_id']) \
+            .delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0007_productsearchtoken'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='order',
+            name='invoice_number',
+            field=models.CharField(db_index=True, max_length=11, verbose_name='nomor pesanan'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', 'created_at'], name='orders_user_created_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['created_at', 'id'], name='products_created_at_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['price', 'id'], name='products_price_id_idx'),
+        ),
+        migrations.RunPython(merge_duplicate_carts, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='cart',
+            constraint=models.UniqueConstraint(fields=('user', 'product'), name='carts_user_product_uniq'),
+        ),
+    ]
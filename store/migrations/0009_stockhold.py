@@ -0,0 +1,36 @@
+# Generated by Django 3.2.4 on 2026-10-19 02:10
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0008_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockHold',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.IntegerField(verbose_name='jumlah')),
+                ('expires_at', models.DateTimeField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('cart', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='stock_hold', to='store.cart')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_holds', to='store.product')),
+            ],
+            options={
+                'db_table': 'stock_holds',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='stockhold',
+            index=models.Index(fields=['product', 'expires_at'], name='stock_holds_product_exp_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stockhold',
+            index=models.Index(fields=['expires_at'], name='stock_holds_expires_at_idx'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 3.2.4 on 2026-10-19 02:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0009_stockhold'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='payment_token_attempts',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='payment_token_retry_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='payment_token_status',
+            field=models.IntegerField(blank=True, choices=[(0, 'pending'), (1, 'ready'), (2, 'failed')], null=True, verbose_name='payment token status'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['payment_token_status', 'payment_token_retry_at'], name='orders_payment_token_idx'),
+        ),
+    ]
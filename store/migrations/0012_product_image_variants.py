@@ -0,0 +1,33 @@
+# Generated by Django 3.2.4 on 2026-10-19 10:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0011_emailoutbox'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='image_thumbnail_jpeg',
+            field=models.ImageField(blank=True, editable=False, upload_to='images/variants'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='image_thumbnail_webp',
+            field=models.ImageField(blank=True, editable=False, upload_to='images/variants'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='image_medium_jpeg',
+            field=models.ImageField(blank=True, editable=False, upload_to='images/variants'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='image_medium_webp',
+            field=models.ImageField(blank=True, editable=False, upload_to='images/variants'),
+        ),
+    ]
@@ -1,12 +1,23 @@
-from django.db import models
+from datetime import timedelta
+from functools import reduce
+from operator import or_
+
+from django.db import models, transaction
+from django.db.models import (
+    Case, Count, ExpressionWrapper, F, OuterRef, Prefetch, Q, Subquery, Sum, Value, When, prefetch_related_objects
+)
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 from django.utils.translation import gettext
 from django.utils.text import slugify
 from django.contrib.auth.models import User
 from django.conf import settings
 from django.core.mail import EmailMessage
-from django.dispatch import receiver, Signal
+from django.dispatch import Signal
 from django.template.loader import get_template
 
+from store.helpers import tokenize_search_text, product_search_terms
+
 
 class Category(models.Model):
     name = models.CharField(max_length=100, verbose_name=gettext('name'))
@@ -69,12 +80,73 @@ class Shop(models.Model):
         return self.name
 
 
+class ProductManager(models.Manager):
+
+    def decrement_stock(self, quantities, user=None):
+        """
+        Mengurangi stok beberapa produk sekaligus dalam satu UPDATE.
+        `quantities` berisi {product_id: jumlah}. Baris hanya diubah jika
+        stoknya cukup setelah dikurangi hold aktif milik user lain, sehingga
+        jumlah baris yang ter-update kurang dari jumlah produk berarti ada
+        produk yang stoknya tidak mencukupi.
+        """
+        if not quantities:
+            return True
+
+        held = Coalesce(StockHold.objects.held_quantity_subquery(OuterRef('pk'), exclude_user=user), 0)
+        enough_stock = reduce(or_, (
+            Q(pk=pk, stock__gte=ExpressionWrapper(Value(quantity) + held, output_field=models.IntegerField()))
+            for pk, quantity in quantities.items()
+        ))
+        new_stock = Case(
+            *[When(pk=pk, then=F('stock') - quantity) for pk, quantity in quantities.items()],
+            default=F('stock')
+        )
+        updated = self.filter(enough_stock).update(stock=new_stock, updated_at=timezone.now())
+
+        return updated == len(quantities)
+
+    def bulk_update_fields(self, changes, expected_stock=None):
+        """
+        Mengubah field beberapa produk sekaligus dalam satu UPDATE.
+        `changes` berisi {product_id: {field: nilai}}. Produk yang ada di
+        `expected_stock` ({product_id: stok}) hanya diubah jika stoknya masih
+        sama, sehingga jumlah baris yang ter-update kurang dari jumlah produk
+        berarti stok sudah berubah (misalnya oleh checkout). Pemanggil yang
+        membatalkan transaksi jika hasilnya False.
+        """
+        if not changes:
+            return True
+
+        expected_stock = expected_stock or {}
+        fields = dict.fromkeys(name for values in changes.values() for name in values)
+        new_values = {
+            name: Case(
+                *[When(pk=pk, then=Value(values[name])) for pk, values in changes.items() if name in values],
+                default=F(name)
+            )
+            for name in fields
+        }
+        unchanged_stock = reduce(or_, (
+            Q(pk=pk, stock=expected_stock[pk]) if pk in expected_stock else Q(pk=pk)
+            for pk in changes
+        ))
+        updated = self.filter(unchanged_stock).update(updated_at=timezone.now(), **new_values)
+
+        return updated == len(changes)
+
+
 class Product(models.Model):
     class Meta:
         db_table = 'products'
         ordering = ['created_at']
         verbose_name = gettext('product')
         verbose_name_plural = gettext('products')
+        indexes = [
+            # seek/scan untuk ordering default dan ordering harga (lihat KeysetPagination)
+            models.Index(fields=['created_at', 'id'], name='products_created_at_id_idx'),
+            models.Index(fields=['price', 'id'], name='products_price_id_idx'),
+        ]
 
     name = models.CharField(max_length=100, verbose_name=gettext('name'))
     slug = models.SlugField(null=True, blank=True, verbose_name=gettext('slug'))
@@ -83,18 +155,99 @@ class Product(models.Model):
     weight = models.FloatField(verbose_name=gettext('weight'))
     price = models.FloatField(verbose_name=gettext('price'))
     image = models.ImageField(upload_to='images', verbose_name=gettext('image'))
+    # varian gambar yang dibuat di background dari `image` (lihat store/images.py)
+    image_thumbnail_jpeg = models.ImageField(upload_to='images/variants', blank=True, editable=False)
+    image_thumbnail_webp = models.ImageField(upload_to='images/variants', blank=True, editable=False)
+    image_medium_jpeg = models.ImageField(upload_to='images/variants', blank=True, editable=False)
+    image_medium_webp = models.ImageField(upload_to='images/variants', blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     # relationship fields
     categories = models.ManyToManyField(Category, verbose_name=gettext('categories'))
 
+    objects = ProductManager()
+
+    IMAGE_VARIANT_FIELDS = ('image_thumbnail_jpeg', 'image_thumbnail_webp', 'image_medium_jpeg', 'image_medium_webp')
+
     def __str__(self):
         return self.name
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # nama gambar saat dimuat, untuk mendeteksi gambar yang diganti (None jika field di-defer)
+        instance._loaded_image = dict(zip(field_names, values)).get('image')
+
+        return instance
+
     def save(self, *args, **kwargs):
         self.slug = slugify(self.name)
 
+        loaded_image = getattr(self, '_loaded_image', '')
+        update_fields = kwargs.get('update_fields')
+        self._image_changed = loaded_image is not None \
+            and (update_fields is None or 'image' in update_fields) and (
+            not self.image._committed or (self.image.name or '') != (loaded_image or '')
+        )
+        # varian lama tidak dipakai lagi, varian baru dibuat setelah commit (lihat store/signals.py)
+        if self._image_changed:
+            for field in self.IMAGE_VARIANT_FIELDS:
+                setattr(self, field, '')
+
         super(Product, self).save(*args, **kwargs)
+        self._loaded_image = self.image.name
+
+        # perbarui inverted index pencarian untuk produk ini
+        ProductSearchToken.objects.index_product(self)
+
+
+class ProductSearchTokenManager(models.Manager):
+
+    def index_product(self, product):
+        self.index_products([product])
+
+    def index_products(self, products, batch_size=1000):
+        products = list(products)
+        self.filter(product__in=products).delete()
+
+        tokens = [
+            self.model(product=product, term=term, weight=weight)
+            for product in products
+            for term, weight in product_search_terms(product.name, product.description).items()
+        ]
+        self.bulk_create(tokens, batch_size=batch_size)
+
+    def search(self, query):
+        """
+        Mengembalikan queryset `product` dan `score` yang diurutkan berdasarkan
+        relevansi. Semua kata pada query harus ada pada produk (AND), sama
+        seperti perilaku SearchFilter. Mengembalikan None jika query kosong.
+        """
+        terms = list(dict.fromkeys(tokenize_search_text(query)))
+
+        if not terms:
+            return None
+
+        return self.filter(term__in=terms) \
+            .values('product') \
+            .annotate(score=Sum('weight'), matched=Count('term')) \
+            .filter(matched=len(terms)) \
+            .order_by('-score', 'product_id')
+
+
+class ProductSearchToken(models.Model):
+    class Meta:
+        db_table = 'product_search_tokens'
+        unique_together = ('term', 'product')
+
+    term = models.CharField(max_length=50)
+    weight = models.PositiveIntegerField(default=1)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='search_tokens')
+
+    objects = ProductSearchTokenManager()
+
+    def __str__(self):
+        return self.term
 
 
 class Order(models.Model):
@@ -103,6 +256,18 @@ class Order(models.Model):
         ordering = ['created_at']
         verbose_name = gettext('order')
         verbose_name_plural = gettext('orders')
+        indexes = [
+            # daftar order milik user diurutkan berdasarkan tanggal
+            models.Index(fields=['user', 'created_at'], name='orders_user_created_at_idx'),
+            # antrean token pembayaran yang menunggu diproses worker
+            models.Index(fields=['payment_token_status', 'payment_token_retry_at'], name='orders_payment_token_idx'),
+            # filter changelist OrderAdmin, diurutkan berdasarkan tanggal
+            models.Index(fields=['status', 'created_at'], name='orders_status_created_idx'),
+            models.Index(fields=['payment_method', 'created_at'], name='orders_payment_created_idx'),
+            models.Index(fields=['shipping_courier', 'created_at'], name='orders_courier_created_idx'),
+            # pencarian prefix nama customer di OrderAdmin
+            models.Index(fields=['customer_name'], name='orders_customer_name_idx'),
+        ]
 
     MANUAL_PAYMENT = 'manual'
     ONLINE_PAYMENT = 'online'
@@ -136,12 +301,27 @@ class Order(models.Model):
         (CANCELED_STATUS, gettext('canceled')),
     ]
 
-    invoice_number = models.CharField(max_length=11, verbose_name=gettext('invoice number'))
+    PAYMENT_TOKEN_PENDING = 0
+    PAYMENT_TOKEN_READY = 1
+    PAYMENT_TOKEN_FAILED = 2
+
+    PAYMENT_TOKEN_STATUS_CHOICES = [
+        (PAYMENT_TOKEN_PENDING, gettext('pending')),
+        (PAYMENT_TOKEN_READY, gettext('ready')),
+        (PAYMENT_TOKEN_FAILED, gettext('failed')),
+    ]
+
+    invoice_number = models.CharField(max_length=11, db_index=True, verbose_name=gettext('invoice number'))
     user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
     # Payment method fields
     payment_method = models.CharField(max_length=10, choices=PAYMENT_METHOD_CHOICES, verbose_name=gettext('payment method'))
     payment_proof = models.ImageField(upload_to='images', null=True, blank=True, verbose_name=gettext('proof of payment'))
     payment_token = models.CharField(max_length=255, null=True, blank=True, verbose_name=gettext('payment token'))
+    # status pembuatan token Midtrans (hanya untuk online payment), diproses oleh worker di luar transaksi checkout
+    payment_token_status = models.IntegerField(choices=PAYMENT_TOKEN_STATUS_CHOICES, null=True, blank=True,
+                                               verbose_name=gettext('payment token status'))
+    payment_token_attempts = models.IntegerField(default=0)
+    payment_token_retry_at = models.DateTimeField(null=True, blank=True)
     # Shipping courier fields
     shipping_courier = models.CharField(max_length=20, choices=SHIPPING_COURIER_CHOICES, verbose_name=gettext('shipping courier'))
     shipping_service = models.CharField(max_length=100, verbose_name=gettext('shipping service'))
@@ -197,6 +377,9 @@ class Cart(models.Model):
         db_table = 'carts'
         ordering = ('created_at',)
         verbose_name = gettext('cart')
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'product'], name='carts_user_product_uniq'),
+        ]
 
     quantity = models.IntegerField(verbose_name=gettext('quantity'))
     product = models.ForeignKey(Product, on_delete=models.SET_NULL, null=True, verbose_name=gettext('product'))
@@ -205,26 +388,149 @@ class Cart(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
 
 
+class StockHoldManager(models.Manager):
+
+    def active(self):
+        return self.filter(expires_at__gt=timezone.now())
+
+    def _holds_for(self, product, exclude_user=None):
+        holds = self.active().filter(product=product)
+        if exclude_user is not None:
+            holds = holds.exclude(cart__user=exclude_user)
+        return holds
+
+    def held_quantity(self, product, exclude_user=None):
+        holds = self._holds_for(product, exclude_user)
+
+        return holds.aggregate(total=Sum('quantity'))['total'] or 0
+
+    def held_quantity_subquery(self, product, exclude_user=None):
+        holds = self._holds_for(product, exclude_user)
+
+        return Subquery(holds.order_by().values('product').annotate(total=Sum('quantity')).values('total'))
+
+    def available_stock(self, product, exclude_user=None):
+        return product.stock - self.held_quantity(product, exclude_user=exclude_user)
+
+    def hold(self, cart):
+        """
+        Membuat atau memperpanjang hold stok untuk satu baris cart selama
+        STOCK_HOLD_TTL detik. Baris produk dikunci selama pengecekan agar dua
+        request bersamaan tidak bisa menahan stok yang sama. Mengembalikan
+        False jika stok yang tersedia tidak cukup.
+        """
+        with transaction.atomic():
+            product = Product.objects.select_for_update().get(pk=cart.product_id)
+
+            if self.available_stock(product, exclude_user=cart.user_id) < cart.quantity:
+                return False
+
+            self.update_or_create(cart=cart, defaults={
+                'product': product,
+                'quantity': cart.quantity,
+                'expires_at': timezone.now() + timedelta(seconds=settings.STOCK_HOLD_TTL),
+            })
+
+        return True
+
+    def release_expired(self, batch_size=1000):
+        released = 0
+
+        while True:
+            expired = list(self.filter(expires_at__lte=timezone.now()).values_list('pk', flat=True)[:batch_size])
+            if not expired:
+                return released
+
+            released += self.filter(pk__in=expired).delete()[0]
+
+
+class StockHold(models.Model):
+    class Meta:
+        db_table = 'stock_holds'
+        indexes = [
+            models.Index(fields=['product', 'expires_at'], name='stock_holds_product_exp_idx'),
+            models.Index(fields=['expires_at'], name='stock_holds_expires_at_idx'),
+        ]
+
+    quantity = models.IntegerField(verbose_name=gettext('quantity'))
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    # relationship fields
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='stock_holds')
+    cart = models.OneToOneField(Cart, on_delete=models.CASCADE, related_name='stock_hold')
+
+    objects = StockHoldManager()
+
+
+class EmailOutboxManager(models.Manager):
+
+    def enqueue_order_invoice(self, order):
+        return self.create(kind=self.model.ORDER_INVOICE, order=order, next_attempt_at=timezone.now())
+
+
+class EmailOutbox(models.Model):
+    class Meta:
+        db_table = 'email_outbox'
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='email_outbox_queue_idx'),
+        ]
+
+    ORDER_INVOICE = 'order_invoice'
+
+    KIND_CHOICES = [
+        (ORDER_INVOICE, gettext('order invoice')),
+    ]
+
+    PENDING_STATUS = 0
+    SENT_STATUS = 1
+    FAILED_STATUS = 2
+
+    STATUS_CHOICES = [
+        (PENDING_STATUS, gettext('pending')),
+        (SENT_STATUS, gettext('sent')),
+        (FAILED_STATUS, gettext('failed')),
+    ]
+
+    kind = models.CharField(max_length=50, choices=KIND_CHOICES)
+    status = models.IntegerField(choices=STATUS_CHOICES, default=PENDING_STATUS)
+    attempts = models.IntegerField(default=0)
+    last_error = models.TextField(blank=True, default='')
+    next_attempt_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    # relationship fields
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, null=True)
+
+    objects = EmailOutboxManager()
+
+    def build_message(self):
+        if self.kind == self.ORDER_INVOICE:
+            return build_order_invoice_email(self.order)
+        raise ValueError('Unknown email kind: {}'.format(self.kind))
+
+
 # Custom signal ketika ada order baru
 new_order_signal = Signal(providing_args=['order'])
 
 
-@receiver(new_order_signal)
-def send_order_invoice(sender, **kwargs):
-    if kwargs['order']:
-        order = kwargs['order']
-        template = get_template("store/email/new_order_invoice.html")
-        context = {'order': order}
-        body = template.render(context)
-        to = order.user.email
-        subject = 'Order Invoice #' + order.invoice_number
-
-        mail = EmailMessage(
-            subject=subject,
-            from_email=settings.ADMIN_EMAIL,
-            to=[to],
-            body=body,
-            reply_to=[settings.ADMIN_EMAIL]
-        )
-        mail.content_subtype = "html"
-        mail.send()
\ No newline at end of file
+def build_order_invoice_email(order):
+    prefetch_related_objects(
+        [order], Prefetch('orderproduct_set', queryset=OrderProduct.objects.select_related('product'))
+    )
+    template = get_template("store/email/new_order_invoice.html")
+    context = {'order': order}
+    body = template.render(context)
+    to = order.user.email
+    subject = 'Order Invoice #' + order.invoice_number
+
+    mail = EmailMessage(
+        subject=subject,
+        from_email=settings.ADMIN_EMAIL,
+        to=[to],
+        body=body,
+        reply_to=[settings.ADMIN_EMAIL]
+    )
+    mail.content_subtype = "html"
+
+    return mail
@@ -0,0 +1,97 @@
+from django.utils.functional import cached_property
+
+from store.cache import VersionedCache
+from store.helpers import PrecompiledJSON
+from store.models import Category, City, Shop, State
+
+
+# Data referensi (provinsi, kota, toko, kategori) jarang berubah, sehingga
+# dimuat sekali per worker dan hanya dimuat ulang jika version stamp-nya
+# di-bump oleh signal (lihat store/signals.py). Objek yang dikembalikan
+# dipakai bersama antar request, jangan diubah oleh pemanggil.
+
+LOCATIONS_VERSION = 'locations'
+SHOP_VERSION = 'shop'
+CATEGORIES_VERSION = 'categories'
+
+
+class Locations:
+
+    def __init__(self, states, cities):
+        self.states = tuple(states)
+        self.states_by_id = {state.id: state for state in self.states}
+        self.cities = tuple(cities)
+        self.cities_by_id = {city.id: city for city in self.cities}
+
+        cities_by_state = {}
+        for city in self.cities:
+            cities_by_state.setdefault(city.state_id, []).append(city)
+        self.cities_by_state = {state_id: tuple(items) for state_id, items in cities_by_state.items()}
+
+    @cached_property
+    def city_lists(self):
+        """
+        {(state_id, envelope): PrecompiledJSON} daftar kota (id, name) per provinsi,
+        state_id None untuk semua kota. `envelope` 'data' untuk format {"data": [...]}.
+        Dibuat sekali per snapshot, sehingga ikut dibuat ulang saat data lokasi berubah.
+        """
+        city_lists = {}
+        groups = [(None, self.cities)] + list(self.cities_by_state.items())
+
+        for state_id, cities in groups:
+            data = [{'id': city.id, 'name': city.name} for city in cities]
+            city_lists[state_id, None] = PrecompiledJSON(data)
+            city_lists[state_id, 'data'] = PrecompiledJSON({'data': data})
+
+        return city_lists
+
+
+def load_locations():
+    return Locations(states=State.objects.all(), cities=City.objects.all())
+
+
+def load_shop():
+    return [Shop.objects.select_related('state', 'city').first()]
+
+
+def load_categories():
+    return tuple(Category.objects.order_by('pk'))
+
+
+locations_cache = VersionedCache(LOCATIONS_VERSION, load_locations)
+# dibungkus list agar toko yang belum dibuat (None) tetap bisa di-cache
+shop_cache = VersionedCache(SHOP_VERSION, load_shop)
+categories_cache = VersionedCache(CATEGORIES_VERSION, load_categories)
+
+
+def get_states():
+    return locations_cache.get().states
+
+
+def get_cities(state_id=None):
+    locations = locations_cache.get()
+
+    if state_id is None:
+        return locations.cities
+
+    return locations.cities_by_state.get(int(state_id), ())
+
+
+EMPTY_CITY_LISTS = {None: PrecompiledJSON([]), 'data': PrecompiledJSON({'data': []})}
+
+
+def get_city_list_json(state_id=None, envelope=None):
+    locations = locations_cache.get()
+    if state_id is not None:
+        state_id = int(state_id)
+
+    # provinsi tanpa kota (atau tidak dikenal) mendapat daftar kosong
+    return locations.city_lists.get((state_id, envelope), EMPTY_CITY_LISTS[envelope])
+
+
+def get_shop():
+    return shop_cache.get()[0]
+
+
+def get_categories():
+    return categories_cache.get()
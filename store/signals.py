@@ -0,0 +1,56 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from store.cache import CATALOG_VERSION, bump_version
+from store.images import update_product_image_variants
+from store.models import Category, City, Product, Shop, State
+from store.reference_data import categories_cache, locations_cache, shop_cache
+from store.tasks import submit_on_commit
+
+
+# Invalidasi dijalankan setelah commit agar worker lain tidak memuat ulang
+# data sebelum perubahan terlihat. Operasi bulk (queryset.update, bulk_create)
+# tidak mengirim signal dan harus memanggil invalidate() sendiri.
+
+@receiver(post_save, sender=State)
+@receiver(post_delete, sender=State)
+@receiver(post_save, sender=City)
+@receiver(post_delete, sender=City)
+def invalidate_locations(sender, **kwargs):
+    transaction.on_commit(locations_cache.invalidate)
+    # data toko ikut memuat nama provinsi dan kota
+    transaction.on_commit(shop_cache.invalidate)
+
+
+@receiver(post_save, sender=Shop)
+@receiver(post_delete, sender=Shop)
+def invalidate_shop(sender, **kwargs):
+    transaction.on_commit(shop_cache.invalidate)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_categories(sender, **kwargs):
+    transaction.on_commit(categories_cache.invalidate)
+
+
+# version katalog dipakai oleh response cache produk; menghapus kategori
+# ikut menghapus relasi produk-kategori tanpa mengirim m2m_changed
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(m2m_changed, sender=Product.categories.through)
+@receiver(post_delete, sender=Category)
+def bump_catalog_version(sender, action=None, **kwargs):
+    if action is not None and action.startswith('pre_'):
+        return
+
+    transaction.on_commit(lambda: bump_version(CATALOG_VERSION))
+
+
+@receiver(post_save, sender=Product)
+def generate_image_variants(sender, instance, **kwargs):
+    # thumbnail dan varian lain dibuat di thread background setelah commit
+    if getattr(instance, '_image_changed', False) and instance.image:
+        submit_on_commit(update_product_image_variants, instance.pk)
@@ -0,0 +1,237 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.mail import get_connection
+from django.db import close_old_connections, transaction
+from django.db.models import Count, F, Min
+from django.utils import timezone
+
+from store.helpers import async_generate_payment_token, build_payment_token_params, generate_payment_token
+from store.models import Order, EmailOutbox
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=settings.BACKGROUND_WORKERS,
+                                           thread_name_prefix='store-background')
+    return _executor
+
+
+def run_task(func, *args):
+    close_old_connections()
+    try:
+        func(*args)
+    except Exception:
+        logger.exception('Background task %s gagal.', func.__name__)
+    finally:
+        close_old_connections()
+
+
+def submit_on_commit(func, *args):
+    """
+    Menjalankan `func(*args)` di thread background setelah transaksi aktif
+    berhasil di-commit. Pekerjaan yang hilang karena proses mati tetap
+    diambil ulang oleh management command worker dari database.
+    """
+    transaction.on_commit(lambda: get_executor().submit(run_task, func, *args))
+
+
+# Token pembayaran Midtrans
+# -------------------------
+# Order online dibuat dengan payment_token_status PENDING (transactional outbox).
+# Token diambil di luar transaksi checkout, oleh thread background setelah commit
+# atau oleh command `process_payment_tokens` untuk retry dan pemulihan.
+
+PAYMENT_TOKEN_LEASE = 60
+
+
+def pending_payment_token_ids(limit=100):
+    return list(
+        Order.objects.filter(payment_token_status=Order.PAYMENT_TOKEN_PENDING,
+                             payment_token_retry_at__lte=timezone.now())
+        .order_by('payment_token_retry_at')
+        .values_list('pk', flat=True)[:limit]
+    )
+
+
+def claim_payment_token(order_id):
+    now = timezone.now()
+
+    # klaim order dengan conditional UPDATE agar hanya satu worker yang memprosesnya,
+    # retry_at dipakai sebagai lease jika worker mati di tengah jalan
+    claimed = Order.objects.filter(
+        pk=order_id,
+        payment_token_status=Order.PAYMENT_TOKEN_PENDING,
+        payment_token_retry_at__lte=now
+    ).update(
+        payment_token_attempts=F('payment_token_attempts') + 1,
+        payment_token_retry_at=now + timedelta(seconds=PAYMENT_TOKEN_LEASE)
+    )
+
+    if not claimed:
+        return None
+
+    return Order.objects.select_related('user').get(pk=order_id)
+
+
+def save_payment_token(order, token):
+    Order.objects.filter(pk=order.pk).update(
+        payment_token=token,
+        payment_token_status=Order.PAYMENT_TOKEN_READY,
+        payment_token_retry_at=None
+    )
+
+
+def reschedule_payment_token(order):
+    if order.payment_token_attempts >= settings.PAYMENT_TOKEN_MAX_ATTEMPTS:
+        Order.objects.filter(pk=order.pk).update(payment_token_status=Order.PAYMENT_TOKEN_FAILED)
+    else:
+        delay = settings.PAYMENT_TOKEN_RETRY_DELAY * 2 ** (order.payment_token_attempts - 1)
+        Order.objects.filter(pk=order.pk).update(
+            payment_token_retry_at=timezone.now() + timedelta(seconds=delay)
+        )
+
+
+def fetch_payment_token(order_id):
+    order = claim_payment_token(order_id)
+    if order is None:
+        return None
+
+    try:
+        token = generate_payment_token(order)
+    except Exception:
+        logger.exception('Gagal membuat payment token untuk order %s (percobaan ke-%s).',
+                         order.pk, order.payment_token_attempts)
+        reschedule_payment_token(order)
+        return None
+
+    save_payment_token(order, token)
+    return token
+
+
+async def async_fetch_payment_token(order_id):
+    """
+    Versi async dari `fetch_payment_token` untuk view ASGI: hanya query yang
+    dijalankan lewat sync_to_async, request ke Midtrans memakai httpx.
+    """
+    order = await sync_to_async(claim_payment_token)(order_id)
+    if order is None:
+        return None
+
+    try:
+        param = await sync_to_async(build_payment_token_params)(order)
+        token = await async_generate_payment_token(param)
+    except Exception:
+        logger.exception('Gagal membuat payment token untuk order %s (percobaan ke-%s).',
+                         order.pk, order.payment_token_attempts)
+        await sync_to_async(reschedule_payment_token)(order)
+        return None
+
+    await sync_to_async(save_payment_token)(order, token)
+    return token
+
+
+# Email outbox
+# ------------
+# Request checkout hanya menyimpan baris EmailOutbox. Email dirender dan dikirim
+# oleh thread background setelah commit atau oleh command `send_queued_emails`.
+
+EMAIL_OUTBOX_LEASE = 120
+
+
+def pending_email_ids(limit=50):
+    return list(
+        EmailOutbox.objects.filter(status=EmailOutbox.PENDING_STATUS, next_attempt_at__lte=timezone.now())
+        .order_by('next_attempt_at')
+        .values_list('pk', flat=True)[:limit]
+    )
+
+
+def send_queued_emails(outbox_ids):
+    """
+    Mengirim email outbox dengan satu koneksi SMTP untuk seluruh batch.
+    Mengembalikan tuple (jumlah terkirim, jumlah gagal).
+    """
+    now = timezone.now()
+    claimed_ids = [
+        outbox_id for outbox_id in outbox_ids
+        if EmailOutbox.objects.filter(
+            pk=outbox_id,
+            status=EmailOutbox.PENDING_STATUS,
+            next_attempt_at__lte=now
+        ).update(attempts=F('attempts') + 1, next_attempt_at=now + timedelta(seconds=EMAIL_OUTBOX_LEASE))
+    ]
+
+    if not claimed_ids:
+        return 0, 0
+
+    outboxes = EmailOutbox.objects.filter(pk__in=claimed_ids).select_related(
+        'order', 'order__user', 'order__customer_city', 'order__customer_state'
+    )
+    sent, failed = 0, 0
+    connection = get_connection()
+
+    try:
+        connection.open()
+    except Exception as e:
+        logger.exception('Gagal membuka koneksi email.')
+        for outbox in outboxes:
+            _reschedule_email(outbox, e)
+        return 0, len(outboxes)
+
+    try:
+        for outbox in outboxes:
+            try:
+                message = outbox.build_message()
+                message.connection = connection
+                message.send()
+            except Exception as e:
+                failed += 1
+                logger.exception('Gagal mengirim email outbox %s (percobaan ke-%s).', outbox.pk, outbox.attempts)
+                _reschedule_email(outbox, e)
+            else:
+                sent += 1
+                EmailOutbox.objects.filter(pk=outbox.pk).update(
+                    status=EmailOutbox.SENT_STATUS,
+                    sent_at=timezone.now(),
+                    last_error=''
+                )
+    finally:
+        connection.close()
+
+    return sent, failed
+
+
+def _reschedule_email(outbox, error):
+    if outbox.attempts >= settings.EMAIL_OUTBOX_MAX_ATTEMPTS:
+        EmailOutbox.objects.filter(pk=outbox.pk).update(status=EmailOutbox.FAILED_STATUS, last_error=str(error))
+    else:
+        delay = settings.EMAIL_OUTBOX_RETRY_DELAY * 2 ** (outbox.attempts - 1)
+        EmailOutbox.objects.filter(pk=outbox.pk).update(
+            next_attempt_at=timezone.now() + timedelta(seconds=delay),
+            last_error=str(error)
+        )
+
+
+def email_outbox_stats():
+    pending = EmailOutbox.objects.filter(status=EmailOutbox.PENDING_STATUS) \
+        .aggregate(depth=Count('id'), oldest=Min('created_at'))
+    oldest_age = (timezone.now() - pending['oldest']).total_seconds() if pending['oldest'] else 0
+
+    return {
+        'depth': pending['depth'],
+        'oldest_age': oldest_age,
+        'failed': EmailOutbox.objects.filter(status=EmailOutbox.FAILED_STATUS).count(),
+    }
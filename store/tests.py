@@ -1,3 +1,1496 @@
-from django.test import TestCase
+import gzip
+import json
+import tempfile
+import threading
+import time
+from base64 import b64encode
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.contrib.admin.models import LogEntry
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.test import AsyncClient, Client, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from store.admin import EstimatedCountPaginator
+from store.api.mixins import response_cache_stats
+from store.cache import CATALOG_VERSION, TTLCache, VersionedCache, bump_version, get_version
+from store.forms import ShopAdminForm
+from store.helpers import (
+    convert_rupiah_to_float, get_shipping_cost, normalize_shipping_weight, rupiah_formatting, rupiah_formatting_many,
+    shipping_cost_cache
+)
+from store.images import render_image_variants, save_image_variants, update_product_image_variants
+from store.models import (
+    Product, ProductSearchToken, Category, Cart, EmailOutbox, Order, OrderProduct, StockHold, State, City, Shop
+)
+from store.reference_data import get_cities, get_states, locations_cache
+from store.tasks import (
+    PAYMENT_TOKEN_LEASE, claim_payment_token, fetch_payment_token, pending_email_ids, send_queued_emails
+)
+
+
+class StoreTestCase(TestCase):
+
+    def setUp(self):
+        # reference data dan response di-cache, query count harus dihitung dari cache kosong
+        cache.clear()
+
+        self.state = State.objects.create(name='Jawa Barat')
+        self.city = City.objects.create(name='Bandung', state=self.state)
+        self.user = User.objects.create_user('buyer', 'buyer@example.com', 'secret')
+
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create_products(self, count, stock=100):
+        offset = Product.objects.count()
+        slugs = ['buku-{}'.format(i) for i in range(offset, offset + count)]
+        Product.objects.bulk_create([
+            Product(name=slug.replace('-', ' ').title(), slug=slug, description='Buku', stock=stock,
+                    weight=0.25, price=50000, image='images/{}.jpg'.format(slug))
+            for slug in slugs
+        ])
+        # bulk_create tidak mengisi pk di semua database
+        return list(Product.objects.filter(slug__in=slugs).order_by('pk'))
+
+    def create_order(self, products=(), user=None, **fields):
+        values = dict(
+            user=user or self.user, invoice_number='INV{:05d}'.format(Order.objects.count() + 1),
+            payment_method=Order.MANUAL_PAYMENT, shipping_courier=Order.JNE_COURIER, shipping_service='REG',
+            customer_name='Budi', customer_phone='0812', customer_address='Jl. Braga', customer_city=self.city,
+            customer_state=self.state, customer_postal_code='40111', sub_total=0, total_shipping=0, total=0
+        )
+        values.update(fields)
+        order = Order.objects.create(**values)
+        OrderProduct.objects.bulk_create([
+            OrderProduct(order=order, product=product, quantity=2, weight=product.weight,
+                         price=product.price, total=product.price * 2)
+            for product in products
+        ])
+        return order
+
+
+class CheckoutTest(StoreTestCase):
+
+    def fill_cart(self, count):
+        Cart.objects.bulk_create([
+            Cart(user=self.user, product=product, quantity=2) for product in self.create_products(count)
+        ])
+
+    def checkout(self):
+        return self.client.post(reverse('api-order-list-create'), {
+            'payment_method': Order.MANUAL_PAYMENT, 'shipping_courier': Order.JNE_COURIER, 'shipping_service': 'REG',
+            'customer_name': 'Budi', 'customer_phone': '0812', 'customer_address': 'Jl. Braga',
+            'customer_city': self.city.pk, 'customer_state': self.state.pk, 'total_shipping': 10000,
+        }, format='json')
+
+    def test_query_count_does_not_depend_on_cart_size(self):
+        self.fill_cart(3)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.checkout()
+        self.assertEqual(response.status_code, 201, response.data)
+
+        self.fill_cart(30)
+        with self.assertNumQueries(len(queries)):
+            response = self.checkout()
+        self.assertEqual(response.status_code, 201, response.data)
+
+        order = Order.objects.get(pk=response.data['id'])
+        self.assertEqual(order.orderproduct_set.count(), 30)
+        self.assertFalse(Cart.objects.filter(user=self.user).exists())
+        self.assertEqual(set(Product.objects.filter(name__in=[
+            line.product.name for line in order.orderproduct_set.select_related('product')
+        ]).values_list('stock', flat=True)), {98})
+
+    def test_oversell_rolls_back_whole_checkout(self):
+        self.fill_cart(3)
+        product = Cart.objects.filter(user=self.user).order_by('pk')[1].product
+        Product.objects.filter(pk=product.pk).update(stock=1)
+
+        response = self.checkout()
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(Cart.objects.filter(user=self.user).count(), 3)
+        self.assertEqual(sorted(Product.objects.values_list('stock', flat=True)), [1, 100, 100])
+
+
+class ProductSearchTest(StoreTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.novel = Category.objects.create(name='Novel')
+        self.python = self.create_product('Belajar Python', 'Buku pemrograman python untuk pemula', 80000)
+        self.django = self.create_product('Django untuk Pemula', 'Membuat web dengan python dan django', 120000)
+        self.laskar = self.create_product('Laskar Pelangi', 'Novel tentang sekolah di Belitung', 60000)
+        self.laskar.categories.add(self.novel)
+
+    def create_product(self, name, description, price):
+        return Product.objects.create(name=name, description=description, stock=10, weight=0.25, price=price,
+                                      image='images/buku.jpg')
+
+    def search(self, **params):
+        response = self.client.get(reverse('api-product-list'), params)
+        self.assertEqual(response.status_code, 200)
+        return [product['id'] for product in response.json()['results']]
+
+    def test_all_terms_must_match(self):
+        self.assertEqual(self.search(search='python pemula'), [self.python.pk, self.django.pk])
+        self.assertEqual(self.search(search='python django'), [self.django.pk])
+        self.assertEqual(self.search(search='python belitung'), [])
+
+    def test_results_are_ordered_by_relevance(self):
+        # "python" di nama produk bernilai lebih tinggi dari di deskripsi
+        self.assertEqual(self.search(search='python'), [self.python.pk, self.django.pk])
+        self.assertEqual(self.search(search='django'), [self.django.pk])
+
+    def test_whole_tokens_are_matched_case_insensitively(self):
+        self.assertEqual(self.search(search='LASKAR'), [self.laskar.pk])
+        # tidak ada partial match seperti icontains
+        self.assertEqual(self.search(search='lask'), [])
+
+    def test_combined_with_filters(self):
+        self.assertEqual(self.search(search='python', price_max=100000), [self.python.pk])
+        self.assertEqual(self.search(search='novel', categories=self.novel.pk), [self.laskar.pk])
+        self.assertEqual(self.search(search='python', categories=self.novel.pk), [])
+        self.assertEqual(self.search(search='python', ordering='-price'), [self.django.pk, self.python.pk])
+
+    def test_product_is_reindexed_on_save(self):
+        self.laskar.name = 'Sang Pemimpi'
+        self.laskar.save()
+
+        self.assertEqual(self.search(search='laskar'), [])
+        self.assertEqual(self.search(search='pemimpi'), [self.laskar.pk])
+
+    def test_tokens_are_removed_on_delete(self):
+        pk = self.laskar.pk
+        self.laskar.delete()
+
+        self.assertFalse(ProductSearchToken.objects.filter(product_id=pk).exists())
+        self.assertEqual(self.search(search='laskar'), [])
+
+
+class KeysetPaginationTest(StoreTestCase):
+    orderings = {
+        'price': ('price', 'pk'),
+        '-price': ('-price', '-pk'),
+        'price,-created_at': ('price', '-created_at', '-pk'),
+    }
+
+    def setUp(self):
+        super().setUp()
+        # harga dan created_at sengaja banyak yang sama agar tie-breaker ikut diuji
+        products = self.create_products(25)
+        now = timezone.now()
+        for i, product in enumerate(products):
+            Product.objects.filter(pk=product.pk).update(
+                price=1000 + i % 4 * 500, created_at=now - timedelta(minutes=i % 3)
+            )
+
+    def get(self, url, params=None):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def page_forward(self, params):
+        pages = [self.get(reverse('api-product-list'), dict(params, pagination='cursor'))]
+        while pages[-1]['next']:
+            pages.append(self.get(pages[-1]['next']))
+        return pages
+
+    def ids(self, pages):
+        return [product['id'] for page in pages for product in page['results']]
+
+    def test_forward_and_backward_paging(self):
+        for ordering, order_by in self.orderings.items():
+            with self.subTest(ordering=ordering):
+                expected = list(Product.objects.order_by(*order_by).values_list('pk', flat=True))
+
+                pages = self.page_forward({'ordering': ordering})
+                self.assertEqual(self.ids(pages), expected)
+                self.assertEqual([len(page['results']) for page in pages], [10, 10, 5])
+                self.assertIsNone(pages[0]['previous'])
+
+                backward = [pages[-1]]
+                while backward[-1]['previous']:
+                    backward.append(self.get(backward[-1]['previous']))
+                self.assertEqual(self.ids(reversed(backward)), expected)
+
+    def test_rows_inserted_between_pages(self):
+        first = self.get(reverse('api-product-list'), {'pagination': 'cursor', 'ordering': 'price'})
+        seen = self.ids([first])
+
+        # satu produk sebelum posisi cursor (tidak muncul lagi), satu sesudahnya (muncul)
+        before, after = self.create_products(2)
+        Product.objects.filter(pk=before.pk).update(price=500)
+        Product.objects.filter(pk=after.pk).update(price=9000)
+
+        pages = [first]
+        while pages[-1]['next']:
+            pages.append(self.get(pages[-1]['next']))
+        ids = self.ids(pages)
+
+        self.assertEqual(len(ids), len(set(ids)))
+        self.assertEqual(set(ids), set(Product.objects.exclude(pk=before.pk).values_list('pk', flat=True)))
+        self.assertEqual(ids[:len(seen)], seen)
+        self.assertEqual(ids[-1], after.pk)
+
+    def test_invalid_cursor_is_not_found(self):
+        def cursor(tokens):
+            return b64encode(json.dumps(tokens).encode('utf-8')).decode('ascii')
+
+        cursors = [
+            'bukan-cursor',
+            cursor({'r': 0}),
+            cursor({'r': 0, 'p': [1000]}),
+            cursor({'r': 0, 'p': ['mahal', 1]}),
+            cursor({'r': 0, 'p': [1000, {'id': 1}]}),
+            cursor({'r': 0, 'p': [None, 1]}),
+            cursor({'r': 0, 'p': '1000,1'}),
+        ]
+        for value in cursors:
+            with self.subTest(cursor=value):
+                response = self.client.get(reverse('api-product-list'), {'cursor': value, 'ordering': 'price'})
+                self.assertEqual(response.status_code, 404)
+
+        response = self.client.get(reverse('api-product-list'), {'cursor': cursor({'r': 0, 'p': ['kemarin', 1]})})
+        self.assertEqual(response.status_code, 404)
+
+
+class OrderListTest(StoreTestCase):
+
+    def test_query_count_does_not_depend_on_page_content(self):
+        products = self.create_products(7)
+        self.create_order(products[:1])
+
+        # mode cursor tidak menjalankan COUNT(*), jumlah query dibandingkan per mode
+        expected = {}
+        for mode in ('page', 'cursor'):
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get(reverse('api-order-list-create'), {'pagination': mode})
+            expected[mode] = len(queries)
+
+        for size in (0, 3, 5, 7) * 5:
+            self.create_order(products[:size])
+
+        for mode, params in (('page', {}), ('page', {'page': 2}), ('cursor', {'pagination': 'cursor'})):
+            with self.subTest(params=params), self.assertNumQueries(expected[mode]):
+                response = self.client.get(reverse('api-order-list-create'), params)
+            self.assertEqual(response.status_code, 200)
+
+    def test_annotated_fields(self):
+        products = self.create_products(3)
+        order = self.create_order(products)
+        self.create_order()
+
+        row, empty = self.client.get(reverse('api-order-list-create')).json()['results']
+
+        self.assertEqual(row['id'], order.pk)
+        self.assertEqual(row['total_item'], 3)
+        self.assertEqual(row['total_weight'], '750 gram')
+        self.assertEqual(row['image'], 'http://testserver' + products[0].image.url)
+        self.assertEqual(empty['total_item'], 0)
+        self.assertIsNone(empty['image'])
+
+
+class OrderDetailTest(StoreTestCase):
+
+    def test_query_count_does_not_depend_on_item_count(self):
+        products = self.create_products(30)
+        small, large = self.create_order(products[:1]), self.create_order(products)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('api-order-detail', args=[small.pk]))
+        self.assertEqual(len(response.json()['products']), 1)
+
+        with self.assertNumQueries(len(queries)):
+            response = self.client.get(reverse('api-order-detail', args=[large.pk]))
+        self.assertEqual(len(response.json()['products']), 30)
+        self.assertEqual(response.json()['customer_city'], self.city.name)
+
+    def test_other_users_order_is_not_found(self):
+        order = self.create_order(user=User.objects.create_user('other', 'other@example.com', 'secret'))
+
+        response = self.client.get(reverse('api-order-detail', args=[order.pk]))
+
+        self.assertEqual(response.status_code, 404)
+
+
+class FakeSnapHandler(BaseHTTPRequestHandler):
+    """Server Snap Midtrans palsu: `failures` request pertama dijawab 500, berikutnya token."""
+    failures = 0
+    requests = []
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        FakeSnapHandler.requests.append(body)
+
+        if FakeSnapHandler.failures:
+            FakeSnapHandler.failures -= 1
+            status, data = 500, {'error_messages': ['Internal error']}
+        else:
+            status, data = 201, {'token': 'token-' + body['transaction_details']['order_id'], 'redirect_url': ''}
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.end_headers()
+        self.wfile.write(json.dumps(data).encode('utf-8'))
+
+    def log_message(self, *args):
+        pass
+
+
+class PaymentTokenTest(StoreTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), FakeSnapHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.settings = override_settings(
+            MIDTRANS_SNAP_BASE_URL='http://127.0.0.1:{}/snap/v1'.format(cls.server.server_port),
+            PAYMENT_TOKEN_MAX_ATTEMPTS=3,
+            PAYMENT_TOKEN_RETRY_DELAY=10,
+        )
+        cls.settings.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.settings.disable()
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        super().setUp()
+        FakeSnapHandler.failures = 0
+        FakeSnapHandler.requests = []
+        self.order = self.create_order(
+            self.create_products(1), payment_method=Order.ONLINE_PAYMENT, total_shipping=10000, total=110000,
+            payment_token_status=Order.PAYMENT_TOKEN_PENDING, payment_token_retry_at=timezone.now()
+        )
+
+    def test_token_is_stored(self):
+        token = fetch_payment_token(self.order.pk)
+
+        self.order.refresh_from_db()
+        self.assertEqual(token, 'token-skbookstore-{}'.format(self.order.pk))
+        self.assertEqual(self.order.payment_token, token)
+        self.assertEqual(self.order.payment_token_status, Order.PAYMENT_TOKEN_READY)
+        self.assertIsNone(self.order.payment_token_retry_at)
+        self.assertEqual(FakeSnapHandler.requests[0]['transaction_details']['gross_amount'], 110000)
+
+    def test_claim_takes_a_lease(self):
+        self.assertIsNotNone(claim_payment_token(self.order.pk))
+        # worker lain tidak bisa mengklaim order yang sama selama lease berlaku
+        self.assertIsNone(claim_payment_token(self.order.pk))
+        self.assertIsNone(fetch_payment_token(self.order.pk))
+
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.payment_token_attempts, 1)
+        self.assertAlmostEqual(
+            (self.order.payment_token_retry_at - timezone.now()).total_seconds(), PAYMENT_TOKEN_LEASE, delta=5
+        )
+        self.assertEqual(FakeSnapHandler.requests, [])
+
+    def test_retry_with_backoff_until_failed(self):
+        FakeSnapHandler.failures = 3
+
+        for attempt, delay in ((1, 10), (2, 20)):
+            with self.assertLogs('store.tasks', 'ERROR'):
+                self.assertIsNone(fetch_payment_token(self.order.pk))
+
+            self.order.refresh_from_db()
+            self.assertEqual(self.order.payment_token_status, Order.PAYMENT_TOKEN_PENDING)
+            self.assertEqual(self.order.payment_token_attempts, attempt)
+            self.assertAlmostEqual(
+                (self.order.payment_token_retry_at - timezone.now()).total_seconds(), delay, delta=5
+            )
+            # belum waktunya retry
+            self.assertIsNone(fetch_payment_token(self.order.pk))
+            Order.objects.filter(pk=self.order.pk).update(payment_token_retry_at=timezone.now())
+
+        with self.assertLogs('store.tasks', 'ERROR'):
+            self.assertIsNone(fetch_payment_token(self.order.pk))
+
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.payment_token_status, Order.PAYMENT_TOKEN_FAILED)
+        self.assertEqual(len(FakeSnapHandler.requests), 3)
+
+    def test_view_long_polls_while_pending(self):
+        url = reverse('api-order-payment-token', args=[self.order.pk])
+
+        started_at = time.monotonic()
+        response = self.client.get(url, {'wait': 60})
+        elapsed = time.monotonic() - started_at
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['payment_token_status'], 'pending')
+        self.assertEqual(response['Retry-After'], '2')
+        # wait dibatasi max_wait agar worker tidak tertahan lama
+        self.assertGreaterEqual(elapsed, 1.5)
+        self.assertLess(elapsed, 4)
+
+        fetch_payment_token(self.order.pk)
+        response = self.client.get(url, {'wait': 60})
+
+        self.assertEqual(response.data['payment_token_status'], 'ready')
+        self.assertEqual(response.data['payment_token'], 'token-skbookstore-{}'.format(self.order.pk))
+        self.assertNotIn('Retry-After', response)
+
+
+@override_settings(PAYMENT_PROOF_MAX_DIMENSION=400)
+class PaymentProofTest(StoreTestCase):
+
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        media = override_settings(MEDIA_ROOT=media_root.name)
+        media.enable()
+        self.addCleanup(media.disable)
+
+        self.order = self.create_order()
+        self.url = reverse('api-order-proof-payment', args=[self.order.pk])
+
+    def image(self, size, image_format='JPEG', name='bukti.jpg'):
+        buffer = BytesIO()
+        Image.new('RGB', size, (200, 30, 30)).save(buffer, image_format)
+        return SimpleUploadedFile(name, buffer.getvalue(), 'image/' + image_format.lower())
+
+    def upload(self, payment_proof):
+        return self.client.patch(self.url, {'payment_proof': payment_proof}, format='multipart')
+
+    def test_large_image_is_downscaled_before_response(self):
+        response = self.upload(self.image((1600, 900)))
+
+        self.assertEqual(response.status_code, 200, response.data)
+        self.order.refresh_from_db()
+        self.assertTrue(response.data['payment_proof'].endswith(self.order.payment_proof.url))
+        with default_storage.open(self.order.payment_proof.name) as f, Image.open(f) as image:
+            self.assertEqual(image.size, (400, 225))
+
+    def test_small_image_is_kept(self):
+        response = self.upload(self.image((300, 200), 'PNG', 'bukti.png'))
+
+        self.assertEqual(response.status_code, 200, response.data)
+        self.order.refresh_from_db()
+        self.assertTrue(self.order.payment_proof.name.endswith('.png'))
+
+    def test_non_image_is_rejected(self):
+        response = self.upload(SimpleUploadedFile('bukti.jpg', b'bukan gambar' * 100, 'image/jpeg'))
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('payment_proof', response.data)
+        self.order.refresh_from_db()
+        self.assertFalse(self.order.payment_proof)
+
+    @override_settings(PAYMENT_PROOF_MAX_UPLOAD_SIZE=10 * 1024)
+    def test_upload_size_is_capped(self):
+        response = self.upload(SimpleUploadedFile('bukti.bmp', b'BM' + b'0' * 50 * 1024, 'image/bmp'))
+
+        self.assertEqual(response.status_code, 413)
+        self.order.refresh_from_db()
+        self.assertFalse(self.order.payment_proof)
+
+    @override_settings(PAYMENT_PROOF_MAX_PIXELS=1000 * 1000)
+    def test_pixel_count_is_capped_for_formats_decoded_at_full_size(self):
+        response = self.upload(self.image((1200, 1000), 'PNG', 'bukti.png'))
+        self.assertEqual(response.status_code, 400)
+
+        # JPEG di-decode pada skala kecil, tidak dibatasi jumlah pixel
+        response = self.upload(self.image((1200, 1000)))
+        self.assertEqual(response.status_code, 200, response.data)
+
+
+class OrderAdminConcurrencyTest(TransactionTestCase):
+
+    def setUp(self):
+        state = State.objects.create(name='Jawa Barat')
+        city = City.objects.create(name='Bandung', state=state)
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'secret')
+        self.order = Order.objects.create(
+            user=self.admin, invoice_number='INV00001', payment_method=Order.MANUAL_PAYMENT,
+            shipping_courier=Order.JNE_COURIER, shipping_service='REG', customer_name='Budi', customer_phone='0812',
+            customer_address='Jl. Braga', customer_city=city, customer_state=state, customer_postal_code='40111',
+            sub_total=0, total_shipping=0, total=0
+        )
+
+    def test_detail_view_does_not_leak_read_only_state(self):
+        """Detail view (read-only) dan change view diakses bersamaan dari beberapa thread."""
+        urls = {
+            'detail': reverse('admin:store_order_detail', args=[self.order.pk]),
+            'change': reverse('admin:store_order_change', args=[self.order.pk]),
+        }
+        errors = []
+        start = threading.Barrier(8)
+
+        def worker(kind, client):
+            start.wait()
+            try:
+                for _ in range(10):
+                    response = client.get(urls[kind])
+                    editable = 'name="_save"' in response.content.decode()
+                    if response.status_code != 200 or editable != (kind == 'change'):
+                        errors.append((kind, response.status_code, editable))
+            finally:
+                connection.close()
+
+        # login (tulis session) sebelum thread dimulai
+        workers = []
+        for kind in ('detail', 'change') * 4:
+            client = Client()
+            client.force_login(self.admin)
+            workers.append(threading.Thread(target=worker, args=(kind, client)))
+
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+
+        self.assertEqual(errors, [])
+
+
+class CityListTest(StoreTestCase):
+
+    def setUp(self):
+        super().setUp()
+        other = State.objects.create(name='Jawa Tengah')
+        City.objects.create(name='Semarang', state=other)
+
+    def test_filter_by_state(self):
+        for params in ({'state': self.state.pk}, {'state': self.state.pk, 'pagination': 'none'}):
+            with self.subTest(params=params):
+                response = self.client.get(reverse('api-city-list'), params)
+                data = response.json()
+                cities = data if params.get('pagination') == 'none' else data['results']
+                self.assertEqual([city['name'] for city in cities], ['Bandung'])
+
+    def test_invalid_state_is_rejected(self):
+        for params in ({'state': 'abc'}, {'state': 'abc', 'pagination': 'none'}, {'state': '²', 'pagination': 'none'}):
+            with self.subTest(params=params):
+                response = self.client.get(reverse('api-city-list'), params)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('state', response.json())
+
+    def test_precompiled_list_is_gzipped(self):
+        url = reverse('api-city-list')
+        params = {'state': self.state.pk, 'pagination': 'none'}
+
+        response = self.client.get(url, params, HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertTrue(response['ETag'].endswith('-gzip"'))
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(json.loads(gzip.decompress(response.content)), [{'id': self.city.pk, 'name': 'Bandung'}])
+        etag = response['ETag']
+
+        response = self.client.get(url, params, HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+        # client tanpa gzip mendapat body biasa dengan ETag berbeda
+        response = self.client.get(url, params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Content-Encoding', response)
+        self.assertEqual(response['ETag'], etag.replace('-gzip', ''))
+        self.assertEqual(response.json(), [{'id': self.city.pk, 'name': 'Bandung'}])
+
+
+class ShopAdminFormTest(StoreTestCase):
+
+    def test_city_choices_follow_state(self):
+        shop = Shop(name='Toko Buku', owner='Budi', email='toko@example.com', state=self.state, city=self.city)
+
+        choices = ShopAdminForm(instance=shop).fields['city'].widget.choices
+
+        self.assertEqual(choices, [(self.city.pk, self.city.name)])
+
+    def test_shop_without_state_has_no_city_choices(self):
+        for form in (ShopAdminForm(), ShopAdminForm(instance=Shop(name='Toko Buku'))):
+            self.assertEqual(form.fields['city'].widget.choices, [('', '---------')])
+
+
+class ImportProductsTest(TestCase):
+
+    def test_malformed_lines_are_reported_and_skipped(self):
+        lines = [
+            '{"name": "Buku A", "description": "a", "stock": 1, "weight": 1, "price": 100}',
+            '{"name": "Buku B", "description": "b", "stock": ',
+            '[1, 2]',
+            '{"name": "Buku C", "description": "c", "stock": 2, "weight": 1, "price": 100}',
+        ]
+        with tempfile.NamedTemporaryFile('w', suffix='.jsonl') as f:
+            f.write('\n'.join(lines) + '\n')
+            f.flush()
+
+            stdout, stderr = StringIO(), StringIO()
+            call_command('import_products', f.name, stdout=stdout, stderr=stderr)
+
+        self.assertEqual(list(Product.objects.order_by('name').values_list('name', flat=True)), ['Buku A', 'Buku C'])
+        self.assertIn('Baris 2 dilewati', stderr.getvalue())
+        self.assertIn('Baris 3 dilewati', stderr.getvalue())
+        self.assertIn('2 gagal', stdout.getvalue())
+
+    def product_rows(self):
+        return [
+            (product.name, product.description, product.stock, product.weight, product.price, product.image.name,
+             sorted(category.name for category in product.categories.all()))
+            for product in Product.objects.order_by('name').prefetch_related('categories')
+        ]
+
+    def run_command(self, *args):
+        stdout, stderr = StringIO(), StringIO()
+        call_command(*args, stdout=stdout, stderr=stderr)
+        return stdout.getvalue()
+
+    def test_export_import_round_trip(self):
+        for file_format in ('csv', 'jsonl'):
+            with self.subTest(file_format=file_format), tempfile.TemporaryDirectory() as tmp:
+                Product.objects.all().delete()
+                Category.objects.all().delete()
+                novel, komputer = Category.objects.create(name='Novel'), Category.objects.create(name='Komputer')
+                products = [
+                    ('Laskar Pelangi', 'Cerita, "kutipan"\nbaris dua é', [novel]),
+                    ('Belajar Python', 'Pemrograman', [komputer, novel]),
+                    ('Buku Tanpa Kategori', 'Tanpa kategori', []),
+                ]
+                for i, (name, description, categories) in enumerate(products):
+                    product = Product.objects.create(name=name, description=description, stock=i, weight=0.25 * i,
+                                                     price=10000.5 * i, image='images/{}.jpg'.format(i))
+                    product.categories.set(categories)
+                expected = self.product_rows()
+                path = '{}/products.{}'.format(tmp, file_format)
+
+                # chunk kecil agar kategori dibaca per chunk
+                self.run_command('export_products', path, '--chunk-size', '2')
+                Product.objects.all().delete()
+                Category.objects.all().delete()
+                output = self.run_command('import_products', path, '--batch-size', '2')
+
+                self.assertIn('3 dibuat, 0 diubah, 0 gagal, 2 kategori baru', output)
+                self.assertEqual(self.product_rows(), expected)
+
+                # import ulang file yang sama tidak mengubah apa pun, produk dicocokkan dari slug
+                Product.objects.filter(name='Belajar Python').update(stock=99)
+                output = self.run_command('import_products', path)
+                self.assertIn('0 dibuat, 1 diubah, 0 gagal, 0 kategori baru', output)
+                self.assertEqual(self.product_rows(), expected)
+
+
+def run_concurrently(func, args_list, attempts=50):
+    """
+    Menjalankan func(*args) untuk setiap args di thread terpisah secara bersamaan dan
+    mengembalikan hasilnya. Error lock/deadlock dari database diulang seperti retry
+    transaksi di aplikasi.
+    """
+    results = [None] * len(args_list)
+    start = threading.Barrier(len(args_list))
+
+    def worker(index, args):
+        start.wait()
+        try:
+            for _ in range(attempts):
+                try:
+                    results[index] = func(*args)
+                    return
+                except OperationalError:
+                    time.sleep(0.01)
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=worker, args=(index, args)) for index, args in enumerate(args_list)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return results
+
+
+class StockConcurrencyTest(TransactionTestCase):
+    stock = 5
+    buyers = 12
+
+    def setUp(self):
+        Product.objects.bulk_create([
+            Product(name='Buku Laris', slug='buku-laris', description='Buku', stock=self.stock,
+                    weight=0.25, price=50000, image='images/buku-laris.jpg')
+        ])
+        self.product = Product.objects.get(slug='buku-laris')
+
+    def test_concurrent_holds_do_not_oversell(self):
+        users = [User.objects.create_user('buyer-{}'.format(i)) for i in range(self.buyers)]
+        Cart.objects.bulk_create([Cart(user=user, product=self.product, quantity=1) for user in users])
+
+        results = run_concurrently(StockHold.objects.hold, [(cart,) for cart in Cart.objects.all()])
+
+        self.assertEqual(results.count(True), self.stock)
+        self.assertEqual(results.count(False), self.buyers - self.stock)
+        self.assertEqual(StockHold.objects.filter(product=self.product).count(), self.stock)
+
+    def test_concurrent_decrement_stock_does_not_oversell(self):
+        results = run_concurrently(Product.objects.decrement_stock, [({self.product.pk: 1},)] * self.buyers)
+
+        self.assertEqual(results.count(True), self.stock)
+        self.assertEqual(results.count(False), self.buyers - self.stock)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 0)
+
+
+def wait_until(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise AssertionError('Kondisi tidak terpenuhi dalam {} detik.'.format(timeout))
+        time.sleep(0.005)
+
+
+class TTLCacheTest(SimpleTestCase):
+    def blocking_loader(self, value):
+        """Loader yang baru selesai setelah `release` di-set, jumlah panggilan dicatat di `calls`."""
+        calls, release = [], threading.Event()
+
+        def loader():
+            calls.append(1)
+            release.wait(5)
+            return value
+
+        return loader, calls, release
+
+    def test_concurrent_misses_call_loader_once(self):
+        ttl_cache = TTLCache(max_entries=10, ttl=60)
+        loader, calls, release = self.blocking_loader('ongkir')
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(ttl_cache.get_or_load('key', loader)))
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+
+        # semua thread sudah tercatat miss (menunggu future leader) sebelum loader selesai
+        wait_until(lambda: ttl_cache.misses == len(threads))
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ['ongkir'] * len(threads))
+        self.assertEqual(ttl_cache.stats()['loads'], 1)
+
+    def test_stale_value_is_returned_while_refreshing(self):
+        ttl_cache = TTLCache(max_entries=10, ttl=0.05, stale_ttl=60)
+        ttl_cache.get_or_load('key', lambda: 'lama')
+        time.sleep(0.06)
+
+        loader, calls, release = self.blocking_loader('baru')
+        self.assertEqual(ttl_cache.get_or_load('key', loader), 'lama')
+        wait_until(lambda: calls)
+        # refresh masih berjalan: request berikutnya tetap dapat nilai lama tanpa refresh kedua
+        self.assertEqual(ttl_cache.get_or_load('key', loader), 'lama')
+        self.assertEqual(ttl_cache.stats()['stale_hits'], 2)
+
+        release.set()
+        wait_until(lambda: ttl_cache.lookup('key') == ('baru', TTLCache.HIT))
+        self.assertEqual(len(calls), 1)
+
+    def test_entry_expires_after_ttl(self):
+        ttl_cache = TTLCache(max_entries=10, ttl=0.05)
+        ttl_cache.store('key', 'ongkir')
+        self.assertEqual(ttl_cache.lookup('key'), ('ongkir', TTLCache.HIT))
+
+        time.sleep(0.06)
+
+        self.assertEqual(ttl_cache.lookup('key'), (None, TTLCache.MISS))
+        self.assertEqual(ttl_cache.get_or_load('key', lambda: 'baru'), 'baru')
+
+    def test_least_recently_used_entry_is_evicted(self):
+        ttl_cache = TTLCache(max_entries=2, ttl=60)
+        ttl_cache.store('a', 1)
+        ttl_cache.store('b', 2)
+        ttl_cache.lookup('a')
+        ttl_cache.store('c', 3)
+
+        self.assertEqual(ttl_cache.lookup('b'), (None, TTLCache.MISS))
+        self.assertEqual(ttl_cache.lookup('a'), (1, TTLCache.HIT))
+        self.assertEqual(ttl_cache.lookup('c'), (3, TTLCache.HIT))
+        self.assertEqual(ttl_cache.stats()['entries'], 2)
+
+    def test_empty_result_is_not_cached(self):
+        ttl_cache = TTLCache(max_entries=10, ttl=60, should_cache=bool)
+        ttl_cache.get_or_load('key', lambda: [])
+
+        self.assertEqual(ttl_cache.lookup('key'), (None, TTLCache.MISS))
+
+
+class ShippingCostCacheTest(StoreTestCase):
+    def setUp(self):
+        super().setUp()
+        shipping_cost_cache.clear()
+        self.addCleanup(shipping_cost_cache.clear)
+
+    def test_weight_is_rounded_up_to_whole_kilograms(self):
+        self.assertEqual(normalize_shipping_weight(0), 1000)
+        self.assertEqual(normalize_shipping_weight(250), 1000)
+        self.assertEqual(normalize_shipping_weight(1000), 1000)
+        self.assertEqual(normalize_shipping_weight(1000.0004), 1000)
+        self.assertEqual(normalize_shipping_weight(1001), 2000)
+
+    def test_weights_in_the_same_kilogram_share_one_request(self):
+        hits = shipping_cost_cache.stats()['hits']
+        with mock.patch('store.helpers.fetch_shipping_cost', return_value=[{'service': 'REG'}]) as fetch:
+            for weight in (250, 999.5, 1000):
+                get_shipping_cost('jne', 1, 2, weight)
+            get_shipping_cost('jne', '1', '2', 1001)
+
+        self.assertEqual(fetch.call_args_list, [mock.call('jne', 1, 2, 1000), mock.call('jne', '1', '2', 2000)])
+        self.assertEqual(shipping_cost_cache.stats()['hits'] - hits, 2)
+
+    def test_stats_are_staff_only(self):
+        # counter dihitung sejak proses berjalan, tidak ikut direset oleh clear()
+        before = shipping_cost_cache.stats()
+        with mock.patch('store.helpers.fetch_shipping_cost', return_value=[{'service': 'REG'}]):
+            get_shipping_cost('jne', 1, 2, 250)
+            get_shipping_cost('jne', 1, 2, 250)
+
+        self.assertEqual(self.client.get(reverse('api-cache-stats')).status_code, 403)
+
+        self.user.is_staff = True
+        self.user.save()
+        response = self.client.get(reverse('api-cache-stats'))
+
+        self.assertEqual(response.status_code, 200)
+        stats = response.data['shipping_cost']
+        self.assertEqual(stats['hits'] - before['hits'], 1)
+        self.assertEqual(stats['misses'] - before['misses'], 1)
+        self.assertEqual(stats['entries'], 1)
+
+
+class ResponseCacheTest(StoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.product = self.create_products(1)[0]
+
+    def test_second_request_is_served_from_cache(self):
+        url = reverse('api-product-detail', args=[self.product.pk])
+
+        first = self.client.get(url)
+        second = self.client.get(url)
+
+        self.assertEqual(first['X-Cache'], 'MISS')
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertEqual(second.data, first.data)
+
+    def test_product_save_invalidates_cached_responses(self):
+        url = reverse('api-product-list')
+        self.assertEqual(self.client.get(url)['X-Cache'], 'MISS')
+        self.assertEqual(self.client.get(url)['X-Cache'], 'HIT')
+
+        # version katalog baru di-bump setelah commit
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.name = 'Buku Baru'
+            self.product.save()
+        response = self.client.get(url)
+
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['results'][0]['name'], 'Buku Baru')
+        self.assertEqual(self.client.get(url)['X-Cache'], 'HIT')
+
+    def test_stats_count_hits_and_misses_per_view(self):
+        before = response_cache_stats().get('ProductListView', {'hit': 0, 'miss': 0})
+        for _ in range(3):
+            self.client.get(reverse('api-product-list'))
+
+        self.user.is_staff = True
+        self.user.save()
+        stats = self.client.get(reverse('api-cache-stats')).data['response']['ProductListView']
+
+        self.assertEqual(stats['miss'] - before['miss'], 1)
+        self.assertEqual(stats['hit'] - before['hit'], 2)
+
+
+class ProductAdminTest(StoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'secret')
+        self.client = Client()
+        self.client.force_login(self.admin)
+        self.url = reverse('admin:store_product_changelist')
+        self.products = self.create_products(2, stock=10)
+
+    def changelist_data(self, rows):
+        """POST changelist list_editable, `rows` berisi (produk, harga, stok, stok hidden initial)."""
+        data = {
+            'form-TOTAL_FORMS': len(rows), 'form-INITIAL_FORMS': len(rows),
+            'form-MIN_NUM_FORMS': 0, 'form-MAX_NUM_FORMS': 1000, '_save': 'Save',
+        }
+        for i, (product, price, stock, initial_stock) in enumerate(rows):
+            data.update({
+                'form-{}-id'.format(i): product.pk,
+                'form-{}-price'.format(i): price,
+                'form-{}-stock'.format(i): stock,
+                'initial-form-{}-stock'.format(i): initial_stock,
+            })
+        return data
+
+    def messages(self, response):
+        return [str(message) for message in response.context['messages']]
+
+    def test_list_editable_changes_are_saved_and_logged(self):
+        first, second = self.products
+        data = self.changelist_data([(first, 60000, 10, 10), (second, 50000, 7, 10)])
+
+        response = self.client.post(self.url, data, follow=True)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            list(Product.objects.order_by('pk').values_list('price', 'stock')), [(60000, 10), (50000, 7)]
+        )
+        self.assertEqual(
+            sorted(LogEntry.objects.values_list('object_id', flat=True)), sorted([str(first.pk), str(second.pk)])
+        )
+
+    def test_stale_stock_rejects_all_changes(self):
+        first, second = self.products
+        # checkout mengurangi stok setelah halaman changelist dibuka
+        Product.objects.filter(pk=second.pk).update(stock=8)
+        data = self.changelist_data([(first, 60000, 10, 10), (second, 50000, 15, 10)])
+
+        response = self.client.post(self.url, data, follow=True)
+
+        self.assertEqual(len(self.messages(response)), 1)
+        self.assertIn('Stock changed while you were editing ({})'.format(second.name), self.messages(response)[0])
+        self.assertEqual(
+            list(Product.objects.order_by('pk').values_list('price', 'stock')), [(50000, 10), (50000, 8)]
+        )
+        self.assertFalse(LogEntry.objects.exists())
+
+    def test_only_submitted_products_are_edited(self):
+        first, second = self.products
+        data = self.changelist_data([(second, 70000, 10, 10)])
+
+        self.client.post(self.url, data)
+
+        self.assertEqual(
+            list(Product.objects.order_by('pk').values_list('price', flat=True)), [50000, 70000]
+        )
+
+    def test_actions_log_each_product(self):
+        first, second = self.products
+        selected = [first.pk, second.pk]
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.client.post(self.url, {'action': 'adjust_price', '_selected_action': selected, 'percent': '10'})
+        self.client.post(self.url, {'action': 'mark_out_of_stock', '_selected_action': [first.pk]})
+
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(
+            list(Product.objects.order_by('pk').values_list('price', 'stock')), [(55000, 0), (55000, 10)]
+        )
+        logs = [
+            (int(entry.object_id), json.loads(entry.change_message))
+            for entry in LogEntry.objects.order_by('pk')
+        ]
+        self.assertEqual(logs, [
+            (first.pk, [{'changed': {'fields': ['Price']}}]),
+            (second.pk, [{'changed': {'fields': ['Price']}}]),
+            (first.pk, [{'changed': {'fields': ['Stock']}}]),
+        ])
+
+
+class RupiahFormattingTest(SimpleTestCase):
+    # hasil yang sama dengan locale.format_string('%.*f', (decimal, amount), True) pada locale id_ID
+    cases = [
+        (0, 0, 'Rp. 0'),
+        (0.0, 2, 'Rp. 0,00'),
+        (-0.0, 0, 'Rp. -0'),
+        (-0.0, 2, 'Rp. -0,00'),
+        (-0.001, 2, 'Rp. -0,00'),
+        (-1500, 0, 'Rp. -1.500'),
+        (-1234567.5, 2, 'Rp. -1.234.567,50'),
+        (1234.5, 0, 'Rp. 1.234'),
+        (1235.5, 0, 'Rp. 1.236'),
+        (2.675, 2, 'Rp. 2,67'),
+        (1234567.891, 2, 'Rp. 1.234.567,89'),
+        (999999999, 0, 'Rp. 999.999.999'),
+        (1e9, 0, 'Rp. 1.000.000.000'),
+        (12345678901.5, 1, 'Rp. 12.345.678.901,5'),
+    ]
+
+    def test_format(self):
+        for amount, decimal, expected in self.cases:
+            with self.subTest(amount=amount, decimal=decimal):
+                self.assertEqual(rupiah_formatting(amount, decimal=decimal), expected)
+                self.assertEqual(rupiah_formatting(amount, with_prefix=False, decimal=decimal), expected[4:])
+
+        amounts = [amount for amount, decimal, expected in self.cases if decimal == 0]
+        self.assertEqual(
+            rupiah_formatting_many(amounts), [expected for amount, decimal, expected in self.cases if decimal == 0]
+        )
+
+    def test_int_and_float_share_cached_result(self):
+        # 1500 dan 1500.0 adalah key cache yang sama, urutan pemanggilan tidak boleh berpengaruh
+        for first, second in ((1500, 1500.0), (2500.0, 2500)):
+            for amount in (first, second):
+                with self.subTest(amount=amount):
+                    expected = '1.500' if amount == 1500 else '2.500'
+                    self.assertEqual(rupiah_formatting(amount), 'Rp. {}'.format(expected))
+                    self.assertEqual(rupiah_formatting(amount, decimal=2), 'Rp. {},00'.format(expected))
+
+        # 0 dan -0.0 juga sama sebagai key cache
+        self.assertEqual([rupiah_formatting(0), rupiah_formatting(-0.0), rupiah_formatting(0)],
+                         ['Rp. 0', 'Rp. -0', 'Rp. 0'])
+
+    def test_convert_rupiah_to_float(self):
+        for text, expected in (('Rp. 1.234.567,89', 1234567.89), ('Rp. -1.500', -1500.0), ('0', 0.0)):
+            with self.subTest(text=text):
+                self.assertEqual(convert_rupiah_to_float(text), expected)
+
+        for amount in (0, 1500, -1500, 1e9):
+            with self.subTest(amount=amount):
+                self.assertEqual(convert_rupiah_to_float(rupiah_formatting(amount)), amount)
+
+
+class ConditionalGetTest(StoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.product = self.create_products(1)[0]
+        self.list_url = reverse('api-product-list')
+        self.detail_url = reverse('api-product-detail', args=[self.product.pk])
+
+    def test_matching_etag_returns_not_modified(self):
+        for url in (self.list_url, self.detail_url):
+            with self.subTest(url=url):
+                etag = self.client.get(url)['ETag']
+
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response.content, b'')
+                self.assertEqual(response['ETag'], etag)
+
+    def test_list_not_modified_without_queries(self):
+        etag = self.client.get(self.list_url)['ETag']
+
+        # ETag list hanya dari version katalog di cache
+        with self.assertNumQueries(0):
+            response = self.client.get(self.list_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_product_update_changes_etag(self):
+        etags = {url: self.client.get(url)['ETag'] for url in (self.list_url, self.detail_url)}
+
+        # version katalog di-bump setelah commit; updated_at dimajukan agar berbeda dari detik sebelumnya
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.name = 'Buku Baru'
+            self.product.save()
+        Product.objects.filter(pk=self.product.pk).update(updated_at=timezone.now() + timedelta(minutes=1))
+
+        for url, etag in etags.items():
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+                self.assertEqual(response.status_code, 200)
+                self.assertNotEqual(response['ETag'], etag)
+                self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+    def test_detail_if_modified_since(self):
+        last_modified = self.client.get(self.detail_url)['Last-Modified']
+        self.assertNotIn('Last-Modified', self.client.get(self.list_url))
+
+        response = self.client.get(self.detail_url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+
+        Product.objects.filter(pk=self.product.pk).update(updated_at=timezone.now() + timedelta(minutes=1))
+        response = self.client.get(self.detail_url, HTTP_IF_MODIFIED_SINCE=last_modified)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['Last-Modified'], last_modified)
+
+
+@override_settings(REFERENCE_DATA_CHECK_INTERVAL=0)
+class AsyncViewTest(StoreTestCase):
+    costs = [{'service': 'REG', 'description': 'Layanan Reguler', 'cost': {'value': 10000, 'label': 'Rp. 10.000'}}]
+
+    def setUp(self):
+        super().setUp()
+        shipping_cost_cache.clear()
+        self.addCleanup(shipping_cost_cache.clear)
+        Shop.objects.create(name='Toko Buku', owner='Budi', email='toko@example.com', state=self.state, city=self.city)
+        Cart.objects.create(user=self.user, product=self.create_products(1)[0], quantity=2)
+
+        self.async_client = AsyncClient()
+        self.headers = {'authorization': 'Bearer {}'.format(AccessToken.for_user(self.user))}
+
+    def post(self, name, data, headers=None):
+        return async_to_sync(self.async_client.post)(
+            reverse(name), data, content_type='application/json', **(self.headers if headers is None else headers)
+        )
+
+    def test_unauthenticated_request_is_rejected(self):
+        for name in ('api-async-shipping-cost', 'api-async-order-create'):
+            for headers in ({}, {'authorization': 'Bearer token-tidak-valid'}):
+                with self.subTest(name=name, headers=headers):
+                    response = self.post(name, {'destination': 1, 'courier': 'jne'}, headers)
+
+                    self.assertEqual(response.status_code, 401)
+                    self.assertIn('detail', response.json())
+                    self.assertTrue(response.has_header('WWW-Authenticate'))
+
+        self.assertFalse(Order.objects.exists())
+
+    def test_shipping_cost(self):
+        fetch = mock.AsyncMock(return_value=self.costs)
+        with mock.patch('store.helpers.async_fetch_shipping_cost', fetch):
+            response = self.post('api-async-shipping-cost', {'destination': 2, 'courier': 'jne'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'results': self.costs})
+        # 2 x 250 gram dibulatkan ke 1 kg
+        fetch.assert_called_once_with('jne', self.city.pk, 2, 1000)
+
+    def test_all_couriers_match_sync_view(self):
+        def fetch(courier, origin, destination, weight):
+            if courier == Order.POS_INDONESIA_COURIER:
+                raise OSError('timeout')
+            return self.costs
+
+        async def async_fetch(*args):
+            return fetch(*args)
+
+        with mock.patch('store.helpers.async_fetch_shipping_cost', async_fetch):
+            response = self.post('api-async-shipping-cost', {'destination': 2, 'courier': 'all'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {
+            'results': [
+                {'courier': Order.JNE_COURIER, 'name': 'JNE', 'costs': self.costs},
+                {'courier': Order.TIKI_COURIER, 'name': 'Tiki', 'costs': self.costs},
+            ],
+            'missing': [Order.POS_INDONESIA_COURIER],
+        })
+
+        # view sync memakai helper dan cache ongkir yang sama
+        with mock.patch('store.helpers.fetch_shipping_cost', fetch):
+            sync_response = self.client.post(reverse('api-shipping-cost'), {'destination': 2, 'courier': 'all'},
+                                             format='json')
+        self.assertEqual(sync_response.status_code, 200)
+        self.assertEqual(sync_response.json(), response.json())
+
+    def test_order_create(self):
+        fetch_payment_token = mock.AsyncMock()
+        with mock.patch('store.api.async_views.async_fetch_payment_token', fetch_payment_token):
+            response = self.post('api-async-order-create', {
+                'payment_method': Order.ONLINE_PAYMENT, 'shipping_courier': Order.JNE_COURIER,
+                'shipping_service': 'REG', 'customer_name': 'Budi', 'customer_phone': '0812',
+                'customer_address': 'Jl. Braga', 'customer_city': self.city.pk, 'customer_state': self.state.pk,
+                'total_shipping': 10000,
+            })
+
+        self.assertEqual(response.status_code, 201, response.content)
+        order = Order.objects.get(pk=response.json()['id'])
+        self.assertEqual(order.user, self.user)
+        self.assertEqual(order.orderproduct_set.get().quantity, 2)
+        self.assertFalse(Cart.objects.filter(user=self.user).exists())
+        # token Midtrans diambil di event loop, bukan lewat thread background
+        fetch_payment_token.assert_called_once_with(order.pk)
+
+
+class CartSummaryTest(StoreTestCase):
+    def test_totals_are_computed_in_database(self):
+        first, second = self.create_products(2)
+        Product.objects.filter(pk=first.pk).update(price=1000)
+        Product.objects.filter(pk=second.pk).update(price=1001)
+        Cart.objects.create(user=self.user, product=first, quantity=5)
+        Cart.objects.create(user=self.user, product=second, quantity=3)
+        # cart user lain tidak ikut dihitung
+        other = User.objects.create_user('other')
+        Cart.objects.create(user=other, product=first, quantity=10)
+
+        # satu query list cart dan satu query aggregate, tidak bergantung jumlah item
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('api-cart-list_create'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['meta'], {'amount': 'Rp. 8.003', 'amount_value': 8003, 'item': 2})
+        self.assertEqual(len(response.data['results']), 2)
+
+    def test_empty_cart(self):
+        response = self.client.get(reverse('api-cart-list_create'))
+
+        self.assertEqual(response.data, {'meta': {'amount': 'Rp. 0', 'amount_value': 0, 'item': 0}, 'results': []})
+
+
+class StockHoldTest(StoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.product = self.create_products(1, stock=3)[0]
+        self.other = User.objects.create_user('other')
+        self.other_client = APIClient()
+        self.other_client.force_authenticate(self.other)
+
+    def add_to_cart(self, client, quantity):
+        return client.post(reverse('api-cart-list_create'), {'product_id': self.product.pk, 'quantity': quantity},
+                           format='json')
+
+    def test_cart_holds_stock_for_other_buyers(self):
+        self.assertEqual(self.add_to_cart(self.client, 2).status_code, 201)
+        hold = StockHold.objects.get(cart__user=self.user)
+        self.assertEqual(hold.quantity, 2)
+
+        self.assertEqual(self.add_to_cart(self.other_client, 2).status_code, 400)
+        self.assertEqual(self.add_to_cart(self.other_client, 1).status_code, 201)
+        self.assertEqual(StockHold.objects.available_stock(self.product), 0)
+        # hold milik sendiri tidak mengurangi stok yang tersedia untuk user tersebut
+        self.assertEqual(StockHold.objects.available_stock(self.product, exclude_user=self.user), 2)
+
+    def test_checkout_cannot_take_stock_held_by_others(self):
+        self.add_to_cart(self.client, 2)
+
+        self.assertFalse(Product.objects.decrement_stock({self.product.pk: 2}, user=self.other))
+        self.assertTrue(Product.objects.decrement_stock({self.product.pk: 2}, user=self.user))
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 1)
+
+    def test_expired_hold_is_ignored_and_released(self):
+        self.add_to_cart(self.client, 1)
+        self.add_to_cart(self.other_client, 1)
+        third = User.objects.create_user('third')
+        StockHold.objects.hold(Cart.objects.create(user=third, product=self.product, quantity=1))
+        StockHold.objects.exclude(cart__user=self.other).update(expires_at=timezone.now() - timedelta(seconds=1))
+
+        self.assertEqual(StockHold.objects.available_stock(self.product, exclude_user=self.other), 3)
+
+        # dua hold kedaluwarsa dihapus dalam dua batch
+        out = StringIO()
+        call_command('release_stock_holds', '--batch-size', '1', stdout=out)
+
+        self.assertEqual(out.getvalue(), '2 hold kedaluwarsa dilepas.\n')
+        self.assertEqual(list(StockHold.objects.values_list('cart__user', flat=True)), [self.other.pk])
+        # baris cart tetap ada, hanya hold-nya yang dilepas
+        self.assertTrue(Cart.objects.filter(user=self.user).exists())
+
+
+@override_settings(EMAIL_OUTBOX_MAX_ATTEMPTS=2, EMAIL_OUTBOX_RETRY_DELAY=60)
+class EmailOutboxTest(StoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.order = self.create_order(self.create_products(1))
+        self.outbox = EmailOutbox.objects.enqueue_order_invoice(self.order)
+
+    def retry_now(self):
+        EmailOutbox.objects.filter(pk=self.outbox.pk).update(next_attempt_at=timezone.now())
+
+    def test_send(self):
+        self.assertEqual(pending_email_ids(), [self.outbox.pk])
+
+        self.assertEqual(send_queued_emails([self.outbox.pk]), (1, 0))
+
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['buyer@example.com'])
+        self.assertEqual(mail.outbox[0].subject, 'Order Invoice #' + self.order.invoice_number)
+        self.outbox.refresh_from_db()
+        self.assertEqual((self.outbox.status, self.outbox.attempts), (EmailOutbox.SENT_STATUS, 1))
+        # email yang sudah terkirim tidak dikirim ulang
+        self.assertEqual(send_queued_emails([self.outbox.pk]), (0, 0))
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_failed_send_is_retried_with_backoff(self):
+        with mock.patch('django.core.mail.EmailMessage.send', side_effect=OSError('SMTP mati')):
+            started = timezone.now()
+            self.assertEqual(send_queued_emails([self.outbox.pk]), (0, 1))
+
+        self.outbox.refresh_from_db()
+        self.assertEqual((self.outbox.status, self.outbox.attempts), (EmailOutbox.PENDING_STATUS, 1))
+        self.assertEqual(self.outbox.last_error, 'SMTP mati')
+        self.assertGreaterEqual(self.outbox.next_attempt_at, started + timedelta(seconds=60))
+        # belum waktunya dicoba ulang
+        self.assertEqual(pending_email_ids(), [])
+        self.assertEqual(send_queued_emails([self.outbox.pk]), (0, 0))
+
+        self.retry_now()
+        with mock.patch('django.core.mail.EmailMessage.send', side_effect=OSError('SMTP mati')):
+            self.assertEqual(send_queued_emails([self.outbox.pk]), (0, 1))
+
+        # EMAIL_OUTBOX_MAX_ATTEMPTS tercapai
+        self.outbox.refresh_from_db()
+        self.assertEqual((self.outbox.status, self.outbox.attempts), (EmailOutbox.FAILED_STATUS, 2))
+        self.assertEqual(mail.outbox, [])
+
+    def test_command(self):
+        out = StringIO()
+        call_command('send_queued_emails', stdout=out)
+
+        lines = out.getvalue().splitlines()
+        self.assertRegex(lines[0], r'^1 terkirim, 0 gagal dalam [\d.]+ detik\.$')
+        self.assertEqual(lines[1], 'queue_depth=0 oldest_age_seconds=0 failed=0')
+        self.assertEqual(len(mail.outbox), 1)
+
+
+class VersionedCacheTest(StoreTestCase):
+    def counting_loader(self):
+        calls = []
+
+        def loader():
+            calls.append(1)
+            return len(calls)
+
+        return loader, calls
+
+    def test_data_is_reloaded_only_when_version_changes(self):
+        loader, calls = self.counting_loader()
+        versioned = VersionedCache('test', loader, check_interval=0)
+
+        self.assertEqual([versioned.get(), versioned.get()], [1, 1])
+        bump_version('test')
+        self.assertEqual([versioned.get(), versioned.get()], [2, 2])
+        self.assertEqual(len(calls), 2)
+
+    def test_version_is_checked_once_per_interval(self):
+        loader, calls = self.counting_loader()
+        versioned = VersionedCache('test', loader, check_interval=60)
+        versioned.get()
+
+        # perubahan dari proses lain baru terlihat setelah interval, invalidate() lokal langsung terlihat
+        bump_version('test')
+        self.assertEqual(versioned.get(), 1)
+        versioned.invalidate()
+        self.assertEqual(versioned.get(), 2)
+
+    @override_settings(REFERENCE_DATA_CHECK_INTERVAL=60)
+    def test_location_changes_are_visible_after_commit(self):
+        locations_cache.invalidate()
+        self.assertEqual([city.name for city in get_cities(self.state.pk)], ['Bandung'])
+
+        # data warm dibaca tanpa query
+        with self.assertNumQueries(0):
+            get_states()
+            get_cities(self.state.pk)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            City.objects.create(name='Bogor', state=self.state)
+
+        self.assertEqual([city.name for city in get_cities(self.state.pk)], ['Bandung', 'Bogor'])
+        self.assertEqual(get_cities(self.state.pk + 100), ())
+
+
+class ImageVariantsTest(StoreTestCase):
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        media = override_settings(MEDIA_ROOT=media_root.name)
+        media.enable()
+        self.addCleanup(media.disable)
+
+        self.product = self.create_products(1)[0]
+        buffer = BytesIO()
+        Image.new('RGB', (1000, 1500), (30, 120, 200)).save(buffer, 'JPEG')
+        default_storage.save(self.product.image.name, BytesIO(buffer.getvalue()))
+
+    def image_size(self, name):
+        with default_storage.open(name) as f, Image.open(f) as image:
+            return image.size
+
+    def test_variants_are_generated_and_served(self):
+        version = get_version(CATALOG_VERSION)
+
+        self.assertTrue(update_product_image_variants(self.product.pk))
+
+        product = Product.objects.get(pk=self.product.pk)
+        self.assertEqual(self.image_size(product.image_thumbnail_jpeg.name), (160, 240))
+        self.assertEqual(self.image_size(product.image_medium_jpeg.name), (480, 720))
+        self.assertNotEqual(get_version(CATALOG_VERSION), version)
+
+        result = self.client.get(reverse('api-product-list')).data['results'][0]
+        self.assertTrue(result['image'].endswith(product.image_thumbnail_jpeg.url))
+        self.assertIn(product.image_medium_jpeg.url + ' 480w', result['image_srcset'])
+        self.assertIn(product.image_thumbnail_jpeg.url + ' 160w', result['image_srcset'])
+
+    def test_replacing_image_clears_variants(self):
+        update_product_image_variants(self.product.pk)
+        product = Product.objects.get(pk=self.product.pk)
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            product.image = 'images/sampul-baru.jpg'
+            product.save()
+
+        product.refresh_from_db()
+        self.assertEqual([getattr(product, field).name for field in Product.IMAGE_VARIANT_FIELDS], [''] * 4)
+        # setelah commit: bump version katalog dan pembuatan varian baru di background
+        self.assertEqual(len(callbacks), 2)
+
+        # hasil render untuk gambar lama tidak disimpan dan filenya dihapus
+        variants = render_image_variants(self.product.image.name)
+        self.assertEqual(save_image_variants(product.pk, self.product.image.name, variants), 0)
+        self.assertFalse(any(default_storage.exists(name) for name in variants.values()))
+
+    def test_command_processes_products_without_variants(self):
+        out = StringIO()
+        call_command('generate_image_variants', '--workers', '1', stdout=out)
+
+        self.assertRegex(out.getvalue(), r'^1 gambar diproses, 0 gagal')
+        self.assertTrue(Product.objects.get(pk=self.product.pk).image_thumbnail_jpeg)
+
+        out = StringIO()
+        call_command('generate_image_variants', '--workers', '1', stdout=out)
+        self.assertRegex(out.getvalue(), r'^0 gambar diproses, 0 gagal')
+
+
+@override_settings(ADMIN_ESTIMATED_COUNT_THRESHOLD=2)
+class OrderAdminListTest(StoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'secret')
+        self.client = Client()
+        self.client.force_login(self.admin)
+        self.url = reverse('admin:store_order_changelist')
+        for name in ('Budi Santoso', 'Budiman', 'Siti', 'Abudi'):
+            self.create_order(customer_name=name)
+
+    def changelist(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.context['cl']
+
+    def test_search_by_invoice_number_or_customer_name_prefix(self):
+        cases = [
+            ('INV00003', ['Siti']),
+            ('inv00003 ', ['Siti']),
+            # nomor invoice dicari exact, bukan contains
+            ('INV0000', []),
+            ('bud', ['Budi Santoso', 'Budiman']),
+            ('udi', []),
+        ]
+        for q, expected in cases:
+            with self.subTest(q=q):
+                names = [order.customer_name for order in self.changelist(q=q).result_list]
+                self.assertEqual(sorted(names), expected)
+
+    def test_count_uses_table_estimate_above_threshold(self):
+        # SQLite tidak punya statistik jumlah baris, COUNT(*) dipakai
+        self.assertIsNone(EstimatedCountPaginator.estimated_count(Order.objects.all()))
+        self.assertEqual(self.changelist().result_count, 4)
+
+        with mock.patch.object(EstimatedCountPaginator, 'estimated_count', return_value=250000):
+            self.assertEqual(self.changelist().result_count, 250000)
+            # queryset yang difilter tetap dihitung dengan COUNT(*)
+            self.assertEqual(self.changelist(q='bud').result_count, 2)
+
+        # estimasi di bawah threshold tidak dipakai
+        with mock.patch.object(EstimatedCountPaginator, 'estimated_count', return_value=1):
+            self.assertEqual(self.changelist().result_count, 4)
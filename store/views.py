@@ -1,8 +1,7 @@
 from django.http import HttpResponse
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse
 
-from .models import City
+from .reference_data import get_city_list_json
 
 
 def hello_view(request):
@@ -12,5 +11,6 @@ def hello_view(request):
 
 @login_required
 def city_list_view(request, state_id):
-    cities = City.objects.filter(state=state_id)
-    return JsonResponse({'data': [{'id': city.id, 'name': city.name} for city in cities]})
+    # JSON (dan versi gzip) sudah disiapkan di memori, tanpa query dan serialisasi per request
+    city_list = get_city_list_json(state_id, envelope='data')
+    return city_list.response(request, cache_control={'private': True, 'max_age': 3600})